@@ -7,7 +7,7 @@
 // or update the generator (and submit a pull request
 // with your fix!), as appropriate.
 //
-// Generated by command: `python baler.py assets/ Classes/ --overwrite-delay 0 -z -c CardIOBundle`
+// Generated by command: `generate_asset_bundle.py assets/ Classes/ -c CardIOBundle`
 //
 
 #import <UIKit/UIKit.h>
@@ -15,17 +15,24 @@
 @interface CardIOBundle : NSObject
 
 /// Get the CardIOBundle instance.
-/// Expands and saves the bundle to the filesystem on first invocation.
+/// Assets are decoded one at a time, when first asked for; nothing is written to the filesystem
+/// unless -NSBundle is used.
 + (CardIOBundle *)sharedInstance;
 
+/// The contents of the asset at path (e.g., @"strings/en.strings"), or nil if there is no such asset.
+- (NSData *)dataForPath:(NSString *)path;
+
 /// Analogous to UIImage's +imageNamed:
 - (UIImage *)imageNamed:(NSString *)name;
 
-/// Use as you would any NSBundle
+/// Use as you would any NSBundle.
+/// Expands and saves every asset to the filesystem on first invocation, so prefer -dataForPath: and -imageNamed:.
+/// The expanded copy is stamped with the bundle's digest; later launches reuse it, and after an update only the
+/// assets that changed are written again.
 - (NSBundle *)NSBundle;
 
 #if BALER_DEBUG
 - (BOOL)passesSelfTest:(NSError **)error;
 #endif
 
-@end
\ No newline at end of file
+@end
@@ -6,14 +6,233 @@
 #import "CardIOLocalizer.h"
 #import "CardIOBundle.h"
 
+#pragma mark String tables
+
+// strings/strings.table from the CardIOBundle, compiled at build time from every strings/<language>.strings
+// by scripts/string_scripts/string_tables.py (see there for the details). Integers are little-endian.
+//   header     magic "CIST", u16 version, u16 header size, u32 language count, u32 name count, u32 names offset,
+//              u32 languages offset, u32 entries offset, u32 buckets offset, u32 strings offset, u32 strings length
+//   names      sorted: u32 name offset, u32 name length, u32 language index (languages, and aliases such as zh_CN)
+//   languages  u32 name offset, u32 name length, u32 base language index, u32 first entry, u32 entry count,
+//              u32 first bucket, u32 bucket count
+//   entries    per language, sorted by key: u32 FNV-1a hash of the key, u32 key offset, u32 key length,
+//              u32 value offset (kCardIOStringTableAbsent if the language lacks a key its base has), u32 value length
+//   buckets    per language, u32 each: 1 + the index of an entry, or 0 if empty (a power-of-two count; linear probing)
+//   strings    UTF-8 names, keys and values, each stored once and followed by a NUL
+// A regional language (e.g., en_AU) holds only the values that differ from its base's (en). The values have
+// already been through the fixups that filterOutCommonErrors: used to apply on every lookup.
+// The table is stored uncompressed in the bundle, so it is read in place, never parsed or copied.
+
+#define kCardIOStringTableVersion 2
+#define kCardIOStringTableHeaderSize 40
+#define kCardIOStringTableNameSize 12
+#define kCardIOStringTableLanguageSize 28
+#define kCardIOStringTableEntrySize 20
+#define kCardIOStringTableNone 0xFFFFFFFF // no base language; no such language
+#define kCardIOStringTableAbsent 0xFFFFFFFF
+
+typedef struct {
+  const uint8_t *bytes;
+  uint32_t languageCount;
+  uint32_t nameCount;
+  uint32_t namesOffset;
+  uint32_t languagesOffset;
+  uint32_t entriesOffset;
+  uint32_t bucketsOffset;
+  uint32_t stringsOffset;
+  uint32_t stringsLength;
+} CardIOStringTable;
+
+static uint32_t CardIOStringTableReadUInt32(const uint8_t *bytes) {
+  return ((uint32_t)bytes[0] |
+          ((uint32_t)bytes[1] << 8) |
+          ((uint32_t)bytes[2] << 16) |
+          ((uint32_t)bytes[3] << 24));
+}
+
+static BOOL CardIOStringTableOpen(NSData *data, CardIOStringTable *table) {
+  const uint8_t *bytes = [data bytes];
+  uint64_t length = [data length];
+  if (length < kCardIOStringTableHeaderSize || memcmp(bytes, "CIST", 4) != 0) {
+    return NO;
+  }
+  if ((bytes[4] | (bytes[5] << 8)) != kCardIOStringTableVersion || (bytes[6] | (bytes[7] << 8)) != kCardIOStringTableHeaderSize) {
+    return NO;
+  }
+
+  table->bytes = bytes;
+  table->languageCount = CardIOStringTableReadUInt32(bytes + 8);
+  table->nameCount = CardIOStringTableReadUInt32(bytes + 12);
+  table->namesOffset = CardIOStringTableReadUInt32(bytes + 16);
+  table->languagesOffset = CardIOStringTableReadUInt32(bytes + 20);
+  table->entriesOffset = CardIOStringTableReadUInt32(bytes + 24);
+  table->bucketsOffset = CardIOStringTableReadUInt32(bytes + 28);
+  table->stringsOffset = CardIOStringTableReadUInt32(bytes + 32);
+  table->stringsLength = CardIOStringTableReadUInt32(bytes + 36);
+
+  // quick safety/sanity checks
+  if ((uint64_t)table->namesOffset + (uint64_t)table->nameCount * kCardIOStringTableNameSize > length ||
+      (uint64_t)table->languagesOffset + (uint64_t)table->languageCount * kCardIOStringTableLanguageSize > length ||
+      table->entriesOffset > table->bucketsOffset ||
+      table->bucketsOffset > table->stringsOffset ||
+      (uint64_t)table->stringsOffset + table->stringsLength > length) {
+    return NO;
+  }
+  return YES;
+}
+
+static uint32_t CardIOStringTableHash(const char *key, size_t length) {
+  uint32_t hash = 0x811C9DC5; // FNV-1a
+  for (size_t i = 0; i < length; i++) {
+    hash = (hash ^ (uint8_t)key[i]) * 0x01000193;
+  }
+  return hash;
+}
+
+static BOOL CardIOStringTableStringEquals(const CardIOStringTable *table, uint32_t offset, uint32_t length, const char *string, size_t stringLength) {
+  return (length == stringLength &&
+          (uint64_t)offset + length <= table->stringsLength &&
+          memcmp(table->bytes + table->stringsOffset + offset, string, length) == 0);
+}
+
+// The index of the language with that name (or alias), or kCardIOStringTableNone.
+static uint32_t CardIOStringTableFindName(const CardIOStringTable *table, NSString *name) {
+  const char *nameBytes = [name UTF8String];
+  if (nameBytes == NULL) {
+    return kCardIOStringTableNone;
+  }
+  size_t nameLength = strlen(nameBytes);
+
+  uint32_t low = 0;
+  uint32_t high = table->nameCount;
+  while (low < high) {
+    uint32_t middle = low + (high - low) / 2;
+    const uint8_t *record = table->bytes + table->namesOffset + middle * kCardIOStringTableNameSize;
+    uint32_t offset = CardIOStringTableReadUInt32(record);
+    uint32_t length = CardIOStringTableReadUInt32(record + 4);
+    if ((uint64_t)offset + length > table->stringsLength) {
+      return kCardIOStringTableNone;
+    }
+    int comparison = memcmp(nameBytes, table->bytes + table->stringsOffset + offset, MIN(nameLength, length));
+    if (comparison == 0) {
+      comparison = (nameLength < length) ? -1 : (nameLength > length ? 1 : 0);
+    }
+    if (comparison == 0) {
+      uint32_t language = CardIOStringTableReadUInt32(record + 8);
+      return language < table->languageCount ? language : kCardIOStringTableNone;
+    } else if (comparison < 0) {
+      high = middle;
+    } else {
+      low = middle + 1;
+    }
+  }
+  return kCardIOStringTableNone;
+}
+
+static NSString *CardIOStringTableLanguageName(const CardIOStringTable *table, uint32_t language) {
+  const uint8_t *record = table->bytes + table->languagesOffset + language * kCardIOStringTableLanguageSize;
+  uint32_t offset = CardIOStringTableReadUInt32(record);
+  uint32_t length = CardIOStringTableReadUInt32(record + 4);
+  if ((uint64_t)offset + length > table->stringsLength) {
+    return nil;
+  }
+  return [[NSString alloc] initWithBytes:table->bytes + table->stringsOffset + offset length:length encoding:NSUTF8StringEncoding];
+}
+
+// The language that serves languageOrLocale: the exact name, an alias (regardless of case),
+// just the language (for <language>_<COUNTRY>), or else American English.
+static uint32_t CardIOStringTableResolve(const CardIOStringTable *table, NSString *languageOrLocale) {
+  uint32_t language = CardIOStringTableFindName(table, languageOrLocale);
+
+  if (language == kCardIOStringTableNone) {
+    NSString *lowercased = [languageOrLocale lowercaseString];
+    language = CardIOStringTableFindName(table, lowercased);
+    if (language != kCardIOStringTableNone && [CardIOStringTableLanguageName(table, language) isEqualToString:lowercased]) {
+      language = kCardIOStringTableNone; // only aliases match regardless of case
+    }
+  }
+
+  if (language == kCardIOStringTableNone) {
+    NSRange range = [languageOrLocale rangeOfString:@"_"];
+    if (range.location != NSNotFound) {
+      language = CardIOStringTableFindName(table, [languageOrLocale substringToIndex:range.location]);
+    }
+  }
+
+  if (language == kCardIOStringTableNone) {
+    language = CardIOStringTableFindName(table, @"en");
+  }
+  return language;
+}
+
+// The value for key in language or (if the language does not have its own) its base, or nil.
+static NSString *CardIOStringTableLookup(const CardIOStringTable *table, uint32_t language, NSString *key) {
+  const char *keyBytes = [key UTF8String];
+  if (keyBytes == NULL) {
+    return nil;
+  }
+  size_t keyLength = strlen(keyBytes);
+  uint32_t hash = CardIOStringTableHash(keyBytes, keyLength);
+  uint32_t entriesEnd = (table->bucketsOffset - table->entriesOffset) / kCardIOStringTableEntrySize;
+  uint32_t bucketsEnd = (table->stringsOffset - table->bucketsOffset) / 4;
+
+  for (uint32_t depth = 0; depth < table->languageCount && language < table->languageCount; depth++) {
+    const uint8_t *record = table->bytes + table->languagesOffset + language * kCardIOStringTableLanguageSize;
+    uint32_t base = CardIOStringTableReadUInt32(record + 8);
+    uint32_t firstEntry = CardIOStringTableReadUInt32(record + 12);
+    uint32_t entryCount = CardIOStringTableReadUInt32(record + 16);
+    uint32_t firstBucket = CardIOStringTableReadUInt32(record + 20);
+    uint32_t bucketCount = CardIOStringTableReadUInt32(record + 24);
+    if ((uint64_t)firstEntry + entryCount > entriesEnd || (uint64_t)firstBucket + bucketCount > bucketsEnd ||
+        bucketCount == 0 || (bucketCount & (bucketCount - 1)) != 0) {
+      return nil;
+    }
+
+    uint32_t bucket = hash & (bucketCount - 1);
+    for (uint32_t probe = 0; probe < bucketCount; probe++) {
+      uint32_t slot = CardIOStringTableReadUInt32(table->bytes + table->bucketsOffset + (firstBucket + bucket) * 4);
+      if (slot == 0 || slot > entryCount) {
+        break;
+      }
+      const uint8_t *entry = table->bytes + table->entriesOffset + (firstEntry + slot - 1) * kCardIOStringTableEntrySize;
+      if (CardIOStringTableReadUInt32(entry) == hash &&
+          CardIOStringTableStringEquals(table, CardIOStringTableReadUInt32(entry + 4), CardIOStringTableReadUInt32(entry + 8), keyBytes, keyLength)) {
+        uint32_t valueOffset = CardIOStringTableReadUInt32(entry + 12);
+        uint32_t valueLength = CardIOStringTableReadUInt32(entry + 16);
+        if (valueOffset == kCardIOStringTableAbsent || (uint64_t)valueOffset + valueLength > table->stringsLength) {
+          return nil;
+        }
+        return [[NSString alloc] initWithBytes:table->bytes + table->stringsOffset + valueOffset length:valueLength encoding:NSUTF8StringEncoding];
+      }
+      bucket = (bucket + 1) & (bucketCount - 1);
+    }
+
+    language = base;
+  }
+  return nil;
+}
+
+// The string table, opened once; NULL if the bundle has none.
+static const CardIOStringTable *CardIOSharedStringTable(void) {
+  static dispatch_once_t once;
+  static NSData *sStringTableData = nil; // keeps the table's bytes alive
+  static CardIOStringTable sStringTable;
+  static const CardIOStringTable *sSharedStringTable = NULL;
+  dispatch_once(&once, ^{
+    sStringTableData = [[CardIOBundle sharedInstance] dataForPath:@"strings/strings.table"];
+    if (sStringTableData != nil && CardIOStringTableOpen(sStringTableData, &sStringTable)) {
+      sSharedStringTable = &sStringTable;
+    }
+  });
+  return sSharedStringTable;
+}
+
 #pragma mark CardIOLocalizer
 
 @interface CardIOLocalizer ()
 
 @property (nonatomic, copy, readwrite)   NSString *languageOrLocale;
-@property (nonatomic, strong, readwrite) NSBundle *bundle;
-@property (nonatomic, strong, readwrite) NSDictionary *stringsDictionary;
-@property (nonatomic, strong, readwrite) NSArray *sortedKeys;
+@property (nonatomic, assign, readwrite) uint32_t language; // in the shared string table
 
 @end
 
@@ -22,69 +241,30 @@
 static CardIOLocalizer *sLocalizer = nil; // hang onto the most recently created CardIOLocalizer, since it will usually be used repeatedly
 static CardIOLocalizer *sFallbackLocalizer = nil;
 
-+ (CardIOLocalizer *)localizerForLanguageOrLocale:(NSString *)languageOrLocale forBundle:(NSBundle *)bundle {
-  if (sLocalizer != nil && [sLocalizer.languageOrLocale isEqualToString:languageOrLocale] && [sLocalizer.bundle isEqual:bundle]) {
++ (CardIOLocalizer *)localizerForLanguageOrLocale:(NSString *)languageOrLocale {
+  if (sLocalizer != nil && [sLocalizer.languageOrLocale isEqualToString:languageOrLocale]) {
     return sLocalizer;
   }
 
-  sLocalizer = [[CardIOLocalizer alloc] initWithLanguageOrLocale:languageOrLocale forBundle:bundle];
+  sLocalizer = [[CardIOLocalizer alloc] initWithLanguageOrLocale:languageOrLocale];
   return sLocalizer;
 }
 
-+ (CardIOLocalizer *)fallbackLocalizerForBundle:(NSBundle *)bundle {
++ (CardIOLocalizer *)fallbackLocalizer {
   if (sFallbackLocalizer == nil) {
-    sFallbackLocalizer = [[CardIOLocalizer alloc] initWithLanguageOrLocale:@"en_US" forBundle:bundle];
+    sFallbackLocalizer = [[CardIOLocalizer alloc] initWithLanguageOrLocale:@"en_US"];
   }
   
   return sFallbackLocalizer;
 }
 
-- (CardIOLocalizer *)initWithLanguageOrLocale:(NSString*)languageOrLocale forBundle:(NSBundle *)bundle {
+- (CardIOLocalizer *)initWithLanguageOrLocale:(NSString*)languageOrLocale {
   if ((self = [self init])) {
-    self.bundle = bundle;
-    
-    NSString* filename = nil;
-
-    // Deal with a few special cases:
-    if ([languageOrLocale caseInsensitiveCompare:@"zh_CN"] == NSOrderedSame) {
-      filename = @"zh-Hans";
-    }
-    else if ([languageOrLocale caseInsensitiveCompare:@"zh_TW"] == NSOrderedSame) {
-      filename = @"zh-Hant_TW";
-    }
-    else if ([languageOrLocale caseInsensitiveCompare:@"zh_HK"] == NSOrderedSame) {
-      filename = @"zh-Hant";
-    }
-    else if ([languageOrLocale caseInsensitiveCompare:@"en_UK"] == NSOrderedSame || [languageOrLocale caseInsensitiveCompare:@"en_IE"] == NSOrderedSame) {
-      filename = @"en_GB";
-    }
-    else if ([languageOrLocale caseInsensitiveCompare:@"no"] == NSOrderedSame) {
-      filename = @"nb";
-    }
-    else {
-      filename = languageOrLocale;
-    }
-
-    // First try for <language>_<COUNTRY>:
-    NSString *path = [self.bundle pathForResource:[NSString stringWithFormat:@"strings/%@", filename] ofType:@"strings"];
-
-    // Next, fall back to just <language>:
-    if ([path length] == 0) {
-      NSRange range = [languageOrLocale rangeOfString:@"_"];
-      if (range.location != NSNotFound) {
-        filename = [languageOrLocale substringToIndex:range.location];
-        path = [self.bundle pathForResource:[NSString stringWithFormat:@"strings/%@", filename] ofType:@"strings"];
-      }
-    }
-
-    // Finally, fall back to American English:
-    if ([path length] == 0) {
-      path = [self.bundle pathForResource:@"strings/en" ofType:@"strings"];
-    }
-
+    // The string table resolves the special cases (e.g., zh_CN is zh-Hans, no is nb) and falls back to
+    // just <language>, then to American English.
+    const CardIOStringTable *stringTable = CardIOSharedStringTable();
     self.languageOrLocale = languageOrLocale;
-    self.stringsDictionary = [NSDictionary dictionaryWithContentsOfFile:path];
-    self.sortedKeys = [[self.stringsDictionary allKeys] sortedArrayUsingSelector:@selector(compare:)];
+    self.language = stringTable ? CardIOStringTableResolve(stringTable, languageOrLocale) : kCardIOStringTableNone;
   }
 
   return self;
@@ -95,17 +275,11 @@ static CardIOLocalizer *sFallbackLocalizer = nil;
     return @"";
   }
 	
-  return [self filterOutCommonErrors:self.stringsDictionary[key]];
-}
-
-- (NSString *)filterOutCommonErrors:(NSString *)value {
-  NSString *filteredValue = value;
-  
-  filteredValue = [filteredValue stringByTrimmingCharactersInSet:[NSCharacterSet whitespaceCharacterSet]];
-  filteredValue = [filteredValue stringByReplacingOccurrencesOfString:@"  " withString:@" "];
-  filteredValue = [filteredValue stringByReplacingOccurrencesOfString:@"..." withString:@"…"];
-  
-  return filteredValue;
+  const CardIOStringTable *stringTable = CardIOSharedStringTable();
+  if (stringTable == NULL) {
+    return nil;
+  }
+  return CardIOStringTableLookup(stringTable, self.language, key);
 }
 
 #if CARDIO_DEBUG
@@ -122,85 +296,29 @@ static CardIOLocalizer *sFallbackLocalizer = nil;
                                                               forKey:NSLocalizedDescriptionKey]];
 }
 
+// The content of the .strings files, and their consistency with each other and with the string table, are checked
+// before a release by confirm_ready_for_release.py (through validate_strings_for_language.py,
+// check_locale_consistency.py and string_tables.check_strings_directory, the check behind string_tables.py --check),
+// and by scripts/string_scripts/test_string_tables.py. What is left to test here is the runtime side: that the bundled
+// string table opens, and that CardIOLocalizedString resolves languages and locales as expected.
 + (BOOL)passesSelfTest:(NSError **)error {
   bool errorDetected = NO;
-  
-  NSArray *allLanguages = [CardIOLocalizer allLanguages];
 
-  NSDictionary *enDictionary = [NSDictionary dictionaryWithContentsOfFile:[[[CardIOBundle sharedInstance] NSBundle] pathForResource:@"strings/en" ofType:@"strings"]];
-  
-  // First, a few tests for the en strings (the L10n team should be applying these same tests to their files)
-  
-  for (NSString *key in enDictionary) {
-    NSString *value = enDictionary[key];
-    
-    if ([value rangeOfString:@"'"].location != NSNotFound) {
-      if(error) {
-        *error = [self selfTestErrorWithMessage:[NSString stringWithFormat:@"\n******\nEnglish string '%@' contains a non-curly apostophe.\n******\n", key]];
-      }
-      errorDetected = YES;
-    }
-    
-    if ([value rangeOfString:@"\""].location != NSNotFound) {
-      if(error) {
-        *error = [self selfTestErrorWithMessage:[NSString stringWithFormat:@"\n******\nEnglish string '%@' contains a non-curly double-quote.\n******\n", key]];
-      }
-      errorDetected = YES;
-    }
-    
-    if ([value rangeOfString:@"..."].location != NSNotFound) {
-      if(error) {
-        *error = [self selfTestErrorWithMessage:[NSString stringWithFormat:@"\n******\nEnglish string '%@' contains three dots rather than an ellipsis.\n******\n", key]];
-      }
-      errorDetected = YES;
-    }
-    
-    if ([value hasPrefix:@" "]) {
-      if(error) {
-        *error = [self selfTestErrorWithMessage:[NSString stringWithFormat:@"\n******\nEnglish string '%@' contains a leading space.\n******\n", key]];
-      }
-      errorDetected = YES;
-    }
-    
-    if ([value hasSuffix:@" "]) {
-      if(error) {
-        *error = [self selfTestErrorWithMessage:[NSString stringWithFormat:@"\n******\nEnglish string '%@' contains a trailing space.\n******\n", key]];
-      }
-      errorDetected = YES;
-    }
-    
-    NSUInteger firstPercentLocation = [CardIOLocalizer nextPercentLocationIn:value startingAtLocation:0];
-    NSUInteger secondPercentLocation;
-    while (firstPercentLocation != NSNotFound && firstPercentLocation < [value length] - 1) {
-      secondPercentLocation = [CardIOLocalizer nextPercentLocationIn:value startingAtLocation:firstPercentLocation + 1];
-      if (secondPercentLocation == NSNotFound) {
-        break;
-      }
-      if (![CardIOLocalizer isPositionalSpecifier:value atLocation:firstPercentLocation + 1] ||
-          ![CardIOLocalizer isPositionalSpecifier:value atLocation:secondPercentLocation + 1]) {
-        if(error) {
-          *error = [self selfTestErrorWithMessage:[NSString stringWithFormat:@"\n******\nEnglish string '%@' contains multiple substitutions, not all with positional specifiers.\n******\n", key]];
-        }
-        errorDetected = YES;
-        break;
-      }
-      firstPercentLocation = secondPercentLocation;
-    }
-  }
-  
-  // Confirm that all languages are present
-  
-  for (NSString *lang in allLanguages) {
-    NSDictionary *dictionary = [NSDictionary dictionaryWithContentsOfFile:[[[CardIOBundle sharedInstance] NSBundle] pathForResource:[NSString stringWithFormat:@"strings/%@", lang] ofType:@"strings"]];
-    if ([dictionary count] == 0) {
+  // Confirm that the string table opens, and has each language
+
+  const CardIOStringTable *stringTable = CardIOSharedStringTable();
+  for (NSString *lang in [CardIOLocalizer allLanguages]) {
+    uint32_t language = stringTable ? CardIOStringTableResolve(stringTable, lang) : kCardIOStringTableNone;
+    if (language == kCardIOStringTableNone || ![CardIOStringTableLanguageName(stringTable, language) isEqualToString:lang]) {
       if(error) {
-        *error = [self selfTestErrorWithMessage:[NSString stringWithFormat:@"\n******\n'%@.strings' is missing.\n******\n", lang]];
+        *error = [self selfTestErrorWithMessage:[NSString stringWithFormat:@"\n******\nThe string table has no '%@'.\n******\n", lang]];
       }
       errorDetected = YES;
     }
   }
 
   // Test a couple of strings in a few different languages
+  // (check_locale_consistency.py makes the same checks against the compiled table, at build time)
 
   NSDictionary *testTranslations = @{@"en_US" : @[@"camera", @"Camera"],
                                      @"es" : @[@"camera", @"Cámara"],
@@ -223,92 +341,9 @@ static CardIOLocalizer *sFallbackLocalizer = nil;
     }
   }
 
-  // Confirm that each key in the "en" file is also present in each of the other expected language files, and vice-versa
-  //
-  // Exception: if we are between L10n cycles, then the content of en.strings might legitimately differ from all the other *.strings files.
-  // To test for this exceptional case, let's assume that the difference shows up in the *number* of strings in the files.
-  // I.e., all the non-en.strings files have the same number of strings, and that number differs from the count for en.strings.
-
-  bool allOthersStringCountsMatch = YES;
-  NSUInteger enStringCount = [enDictionary count];
-  NSUInteger allOthersStringCount = 0;
-  for (NSString *lang in allLanguages) {
-    if (![lang isEqualToString:@"en"]) {
-      NSDictionary *otherDictionary = [NSDictionary dictionaryWithContentsOfFile:[[[CardIOBundle sharedInstance] NSBundle] pathForResource:[NSString stringWithFormat:@"strings/%@", lang] ofType:@"strings"]];
-      
-      NSUInteger otherStringCount = [otherDictionary count];
-      if (allOthersStringCount == 0) {
-        allOthersStringCount = otherStringCount;
-      }
-      else {
-        if (otherStringCount != allOthersStringCount) {
-          allOthersStringCountsMatch = NO;
-          break;
-        }
-      }
-    }
-  }
-  
-  if (!(allOthersStringCountsMatch && allOthersStringCount != enStringCount)) {
-    for (NSString *lang in allLanguages) {
-      if (![lang isEqualToString:@"en"]) {
-        NSDictionary *otherDictionary = [NSDictionary dictionaryWithContentsOfFile:[[[CardIOBundle sharedInstance] NSBundle] pathForResource:[NSString stringWithFormat:@"strings/%@", lang] ofType:@"strings"]];
-        
-        for (NSString *key in enDictionary) {
-          if ([otherDictionary[key] length] == 0) {
-            if(error) {
-              *error = [self selfTestErrorWithMessage:[NSString stringWithFormat:@"\n******\nMissing key '%@' for '%@'\n******\n", key, lang]];
-            }
-            errorDetected = YES;
-          }
-        }
-        
-        for (NSString *key in otherDictionary) {
-          if ([enDictionary[key] length] == 0) {
-            if(error) {
-              *error = [self selfTestErrorWithMessage:[NSString stringWithFormat:@"\n******\nExtraneous key '%@' for '%@'\n******\n", key, lang]];
-            }
-            errorDetected = YES;
-          }
-        }
-      }
-    }
-  }
-
   return !errorDetected;
 }
 
-+ (NSUInteger)nextPercentLocationIn:(NSString *)string startingAtLocation:(NSUInteger)startingLocation {
-  NSUInteger nextPercentLocation = startingLocation - 1;
-  
-  do {
-    nextPercentLocation = [string rangeOfString:@"%"
-                                         options:0
-                                           range:NSMakeRange(nextPercentLocation + 1, [string length] - (nextPercentLocation + 1))].location;
-  } while (nextPercentLocation != NSNotFound &&
-           nextPercentLocation > 0 &&
-           nextPercentLocation < [string length] - 1 &&
-           [string characterAtIndex:nextPercentLocation - 1] == '\\');
-  
-  return nextPercentLocation;
-}
-
-+ (BOOL)isPositionalSpecifier:(NSString *)string atLocation:(NSUInteger)location {
-  BOOL isPositionalSpecifier = NO;
-  
-  if (location < [string length] - 1 && isdigit([string characterAtIndex:location])) {
-    do {
-      location++;
-    } while (location < [string length] - 1 && isdigit([string characterAtIndex:location]));
-
-    if (location < [string length] && [string characterAtIndex:location] == '$') {
-      isPositionalSpecifier = YES;
-    }
-  }
-  
-  return isPositionalSpecifier;
-}
-
 #endif
 
 #pragma mark - Text Alignment
@@ -331,7 +366,7 @@ static CardIOLocalizer *sFallbackLocalizer = nil;
 
 + (void)preload {
   dispatch_async(dispatch_get_global_queue(DISPATCH_QUEUE_PRIORITY_DEFAULT, 0), ^{
-    [[CardIOBundle sharedInstance] NSBundle];
+    CardIOSharedStringTable();
   });
 }
 
@@ -393,9 +428,7 @@ NSString *CardIOLocalizedStringWithAlert(NSString *key,
     }
   }
   
-  NSBundle *bundle = [[CardIOBundle sharedInstance] NSBundle];
-	
-  NSString *string = [[CardIOLocalizer localizerForLanguageOrLocale:languageOrLocale forBundle:bundle] localizeString:key];
+  NSString *string = [[CardIOLocalizer localizerForLanguageOrLocale:languageOrLocale] localizeString:key];
   if ([string length] == 0) {
     if (showMissingKeyAlert) {
       UIAlertView *alert = [[UIAlertView alloc] initWithTitle:@"Missing Key"
@@ -405,7 +438,7 @@ NSString *CardIOLocalizedStringWithAlert(NSString *key,
                                             otherButtonTitles:nil];
       [alert show];
     }
-    string = [[CardIOLocalizer fallbackLocalizerForBundle:bundle] localizeString:key];
+    string = [[CardIOLocalizer fallbackLocalizer] localizeString:key];
   }
   return string;
 }
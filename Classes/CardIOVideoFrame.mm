@@ -52,7 +52,9 @@
 - (id)initWithSampleBuffer:(CMSampleBufferRef)sampleBuffer interfaceOrientation:(UIInterfaceOrientation)currentOrientation {
   if((self = [super init])) {
     _buffer = sampleBuffer;
-    CFRetain(_buffer);
+    if (_buffer) { // the simulated camera can only supply a buffer when it has a frame container
+      CFRetain(_buffer);
+    }
 
     _orientation = currentOrientation; // not using setters/getters, for performance
     _dmz = NULL;  // use NULL b/c non-object pointer
@@ -61,7 +63,9 @@
 }
 
 - (void)dealloc {
-  CFRelease(_buffer);
+  if (_buffer) {
+    CFRelease(_buffer);
+  }
 }
 
 #if USE_CAMERA
@@ -231,7 +235,30 @@
 - (void)transformCbCrWithFrameOrientation:(FrameOrientation)frameOrientation {}
 
 - (UIImage *)imageWithGrayscale:(BOOL)grayscale {
-  UIImage *image = [UIImage imageNamed:@"simulated_camera_0.png"];
+  // The simulated camera's frames (see SimulatedCameraFrames in CardIOVideoStream.mm) are BGRA or 420v;
+  // a 420v frame is drawn from its Y plane, in gray.
+  UIImage *image = nil;
+  CVImageBufferRef imageBuffer = self.buffer ? CMSampleBufferGetImageBuffer(self.buffer) : NULL;
+  if (imageBuffer) {
+    CVPixelBufferLockBaseAddress(imageBuffer, kCVPixelBufferLock_ReadOnly);
+    BOOL isBGRA = (CVPixelBufferGetPixelFormatType(imageBuffer) == kCVPixelFormatType_32BGRA);
+    void *baseAddress = isBGRA ? CVPixelBufferGetBaseAddress(imageBuffer) : CVPixelBufferGetBaseAddressOfPlane(imageBuffer, 0);
+    size_t bytesPerRow = isBGRA ? CVPixelBufferGetBytesPerRow(imageBuffer) : CVPixelBufferGetBytesPerRowOfPlane(imageBuffer, 0);
+    CGColorSpaceRef colorSpace = isBGRA ? CGColorSpaceCreateDeviceRGB() : CGColorSpaceCreateDeviceGray();
+    CGContextRef ctx = CGBitmapContextCreate(baseAddress, CVPixelBufferGetWidth(imageBuffer), CVPixelBufferGetHeight(imageBuffer), 8, bytesPerRow, colorSpace,
+                                             isBGRA ? (kCGBitmapByteOrder32Little | kCGImageAlphaPremultipliedFirst) : (CGBitmapInfo)kCGImageAlphaNone);
+    if (ctx) {
+      CGImageRef cgImage = CGBitmapContextCreateImage(ctx);
+      image = [UIImage imageWithCGImage:cgImage];
+      CGImageRelease(cgImage);
+      CGContextRelease(ctx);
+    }
+    CGColorSpaceRelease(colorSpace);
+    CVPixelBufferUnlockBaseAddress(imageBuffer, kCVPixelBufferLock_ReadOnly);
+  }
+  if (image == nil) {
+    image = [UIImage imageNamed:@"simulated_camera_0.png"];
+  }
   CGSize  cardSize = CGSizeMake(kCreditCardTargetWidth, kCreditCardTargetHeight);
   UIGraphicsBeginImageContextWithOptions(cardSize, NO, 0.0);
   [image drawInRect:CGRectMake(0, 0, cardSize.width, cardSize.height)];
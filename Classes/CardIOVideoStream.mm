@@ -26,20 +26,200 @@
 
 #define kMinNumberOfFramesScannedToDeclareUnscannable 100
 
-#pragma mark - SimulatedCameraLayer
-
 #if SIMULATE_CAMERA
 
 #import "CardIOBundle.h"
 #import "CardIOCGGeometry.h"
 
+#define kSimulatedCameraFrameInterval 2 // seconds; override with $CARDIO_SIMULATED_CAMERA_INTERVAL
+
+#pragma mark - SimulatedCameraFrames
+
+// Frames packed by scripts/asset_scripts/simulated_camera_frames.py (see there for the format): already decoded,
+// in BGRA or in the camera's 420v layout. The file is mapped, and every pixel buffer and image handed out
+// points into the mapping, so serving a frame decodes and copies nothing.
+// The frames come from $CARDIO_SIMULATED_CAMERA_FRAMES if it is set (e.g., a sequence for a load test),
+// otherwise from the app's simulated_camera.frames.
+
+#define kSimulatedCameraFramesMagic "CISF"
+#define kSimulatedCameraFramesVersion 1
+#define kSimulatedCameraFramesHeaderSize 40
+
+@interface SimulatedCameraFrames : NSObject
++ (SimulatedCameraFrames *)sharedFrames; // nil if there is no (valid) frame container
+- (CVPixelBufferRef)newPixelBufferForFrame:(NSUInteger)index CF_RETURNS_RETAINED;
+- (CMSampleBufferRef)newSampleBufferForFrame:(NSUInteger)index CF_RETURNS_RETAINED;
+- (CGImageRef)newImageForFrame:(NSUInteger)index CF_RETURNS_RETAINED; // the Y plane, in gray, for 420v frames
+@property(nonatomic, assign, readonly) NSUInteger frameCount;
+@end
+
+@interface SimulatedCameraFrames ()
+@property(nonatomic, strong, readwrite) NSData *data;
+@property(nonatomic, assign, readwrite) NSUInteger frameCount;
+@property(nonatomic, assign, readwrite) size_t width;
+@property(nonatomic, assign, readwrite) size_t height;
+@property(nonatomic, assign, readwrite) OSType pixelFormat;
+@property(nonatomic, assign, readwrite) size_t bytesPerRow;
+@property(nonatomic, assign, readwrite) size_t framesOffset;
+@property(nonatomic, assign, readwrite) size_t frameSize;
+@property(nonatomic, assign, readwrite) size_t secondPlaneOffset;
+@end
+
+static uint32_t SimulatedCameraFramesReadUInt32(const uint8_t *bytes) {
+  return (uint32_t)bytes[0] | ((uint32_t)bytes[1] << 8) | ((uint32_t)bytes[2] << 16) | ((uint32_t)bytes[3] << 24);
+}
+
+// Each pixel buffer or image keeps the mapped data alive until it is released.
+static void SimulatedCameraFramesReleasePixelBytes(void *releaseRefCon, const void *baseAddress) {
+  CFRelease(releaseRefCon);
+}
+
+static void SimulatedCameraFramesReleasePlanarBytes(void *releaseRefCon, const void *dataPtr, size_t dataSize, size_t numberOfPlanes, const void *planeAddresses[]) {
+  CFRelease(releaseRefCon);
+}
+
+static void SimulatedCameraFramesReleaseImageBytes(void *info, const void *data, size_t size) {
+  CFRelease(info);
+}
+
+@implementation SimulatedCameraFrames
+
++ (SimulatedCameraFrames *)sharedFrames {
+  static SimulatedCameraFrames *sFrames = nil;
+  static dispatch_once_t onceToken;
+  dispatch_once(&onceToken, ^{
+    NSString *path = [NSProcessInfo processInfo].environment[@"CARDIO_SIMULATED_CAMERA_FRAMES"];
+    if ([path length] == 0) {
+      path = [[NSBundle mainBundle] pathForResource:@"simulated_camera" ofType:@"frames"];
+    }
+    if (path) {
+      sFrames = [[SimulatedCameraFrames alloc] initWithContentsOfFile:path];
+      if (sFrames == nil) {
+        CardIOLog(@"%@ is not a valid simulated camera frame container", path);
+      }
+    }
+  });
+  return sFrames;
+}
+
+- (id)initWithContentsOfFile:(NSString *)path {
+  if ((self = [super init])) {
+    _data = [NSData dataWithContentsOfFile:path options:NSDataReadingMappedAlways error:NULL];
+    const uint8_t *bytes = (const uint8_t *)[_data bytes];
+    if ([_data length] < kSimulatedCameraFramesHeaderSize ||
+        memcmp(bytes, kSimulatedCameraFramesMagic, 4) != 0 ||
+        (bytes[4] | (bytes[5] << 8)) != kSimulatedCameraFramesVersion ||
+        (bytes[6] | (bytes[7] << 8)) != kSimulatedCameraFramesHeaderSize) {
+      return nil;
+    }
+    _width = SimulatedCameraFramesReadUInt32(bytes + 8);
+    _height = SimulatedCameraFramesReadUInt32(bytes + 12);
+    _pixelFormat = SimulatedCameraFramesReadUInt32(bytes + 16);
+    _bytesPerRow = SimulatedCameraFramesReadUInt32(bytes + 20);
+    _frameCount = SimulatedCameraFramesReadUInt32(bytes + 24);
+    _framesOffset = SimulatedCameraFramesReadUInt32(bytes + 28);
+    _frameSize = SimulatedCameraFramesReadUInt32(bytes + 32);
+    _secondPlaneOffset = SimulatedCameraFramesReadUInt32(bytes + 36);
+
+    size_t neededFrameSize;
+    if (_pixelFormat == kCVPixelFormatType_32BGRA) {
+      neededFrameSize = _bytesPerRow * _height;
+      if (_bytesPerRow < _width * 4) {
+        return nil;
+      }
+    }
+    else if (_pixelFormat == kCVPixelFormatType_420YpCbCr8BiPlanarVideoRange) {
+      neededFrameSize = _secondPlaneOffset + _bytesPerRow * _height / 2;
+      if (_bytesPerRow < _width || _secondPlaneOffset < _bytesPerRow * _height) {
+        return nil;
+      }
+    }
+    else {
+      return nil;
+    }
+    if (_frameCount == 0 || _frameSize < neededFrameSize || _framesOffset < kSimulatedCameraFramesHeaderSize ||
+        (uint64_t)_framesOffset + (uint64_t)_frameCount * _frameSize > [_data length]) {
+      return nil;
+    }
+  }
+  return self;
+}
+
+- (uint8_t *)baseAddressForFrame:(NSUInteger)index {
+  // CoreVideo and CoreGraphics only read these bytes, but take them as non-const
+  return (uint8_t *)[self.data bytes] + self.framesOffset + (index % self.frameCount) * self.frameSize;
+}
+
+- (CVPixelBufferRef)newPixelBufferForFrame:(NSUInteger)index {
+  uint8_t *baseAddress = [self baseAddressForFrame:index];
+  CVPixelBufferRef pixelBuffer = NULL;
+  CVReturn status;
+  if (self.pixelFormat == kCVPixelFormatType_32BGRA) {
+    status = CVPixelBufferCreateWithBytes(kCFAllocatorDefault, self.width, self.height, self.pixelFormat,
+                                          baseAddress, self.bytesPerRow,
+                                          SimulatedCameraFramesReleasePixelBytes, (void *)CFBridgingRetain(self.data),
+                                          NULL, &pixelBuffer);
+  }
+  else {
+    void *planeBaseAddresses[2] = {baseAddress, baseAddress + self.secondPlaneOffset};
+    size_t planeWidths[2] = {self.width, self.width / 2};
+    size_t planeHeights[2] = {self.height, self.height / 2};
+    size_t planeBytesPerRow[2] = {self.bytesPerRow, self.bytesPerRow};
+    status = CVPixelBufferCreateWithPlanarBytes(kCFAllocatorDefault, self.width, self.height, self.pixelFormat,
+                                                NULL, 0, 2, planeBaseAddresses, planeWidths, planeHeights, planeBytesPerRow,
+                                                SimulatedCameraFramesReleasePlanarBytes, (void *)CFBridgingRetain(self.data),
+                                                NULL, &pixelBuffer);
+  }
+  if (status != kCVReturnSuccess) {
+    CardIOLog(@"Could not make a pixel buffer for simulated camera frame %lu (%d)", (unsigned long)index, status);
+    return NULL;
+  }
+  return pixelBuffer;
+}
+
+- (CMSampleBufferRef)newSampleBufferForFrame:(NSUInteger)index {
+  CVPixelBufferRef pixelBuffer = [self newPixelBufferForFrame:index];
+  if (pixelBuffer == NULL) {
+    return NULL;
+  }
+  CMSampleBufferRef sampleBuffer = NULL;
+  CMVideoFormatDescriptionRef formatDescription = NULL;
+  if (CMVideoFormatDescriptionCreateForImageBuffer(kCFAllocatorDefault, pixelBuffer, &formatDescription) == noErr) {
+    CMSampleTimingInfo timing = {kCMTimeInvalid, CMClockGetTime(CMClockGetHostTimeClock()), kCMTimeInvalid};
+    CMSampleBufferCreateForImageBuffer(kCFAllocatorDefault, pixelBuffer, true, NULL, NULL, formatDescription, &timing, &sampleBuffer);
+    CFRelease(formatDescription);
+  }
+  CVPixelBufferRelease(pixelBuffer);
+  return sampleBuffer;
+}
+
+- (CGImageRef)newImageForFrame:(NSUInteger)index {
+  BOOL isBGRA = (self.pixelFormat == kCVPixelFormatType_32BGRA);
+  CGDataProviderRef provider = CGDataProviderCreateWithData((void *)CFBridgingRetain(self.data), [self baseAddressForFrame:index],
+                                                            self.bytesPerRow * self.height, SimulatedCameraFramesReleaseImageBytes);
+  CGColorSpaceRef colorSpace = isBGRA ? CGColorSpaceCreateDeviceRGB() : CGColorSpaceCreateDeviceGray();
+  CGImageRef image = CGImageCreate(self.width, self.height, 8, isBGRA ? 32 : 8, self.bytesPerRow, colorSpace,
+                                   isBGRA ? (kCGBitmapByteOrder32Little | kCGImageAlphaPremultipliedFirst) : (CGBitmapInfo)kCGImageAlphaNone,
+                                   provider, NULL, false, kCGRenderingIntentDefault);
+  CGColorSpaceRelease(colorSpace);
+  CGDataProviderRelease(provider);
+  return image;
+}
+
+@end
+
+#pragma mark - SimulatedCameraLayer
+
 @interface SimulatedCameraLayer : CALayer {
   NSInteger _imageIndex;
 }
+@property(nonatomic, assign, readonly) NSInteger imageIndex;
 @end
 
 @implementation SimulatedCameraLayer
 
+@synthesize imageIndex = _imageIndex;
+
 - (id)init {
   if ((self = [super init])) {
     self.backgroundColor = [UIColor colorWithRed:1 green:0.7f blue:0.0f alpha:0.5f].CGColor;
@@ -66,7 +246,19 @@
       break;
   }
 
-  UIImage *   image = [UIImage imageNamed:[NSString stringWithFormat:@"simulated_camera_%ld.png", (long)_imageIndex]];
+  UIImage *   image = nil;
+  SimulatedCameraFrames *frames = [SimulatedCameraFrames sharedFrames];
+  if (frames) {
+    _imageIndex %= (NSInteger)frames.frameCount;
+    CGImageRef frameImage = [frames newImageForFrame:(NSUInteger)_imageIndex];
+    if (frameImage) {
+      image = [UIImage imageWithCGImage:frameImage];
+      CGImageRelease(frameImage);
+    }
+  }
+  else {
+    image = [UIImage imageNamed:[NSString stringWithFormat:@"simulated_camera_%ld.png", (long)_imageIndex]];
+  }
   if (image == nil) {
     if (_imageIndex > 0) {
       _imageIndex = 0;
@@ -492,7 +684,11 @@
     self.running = YES;
   }
 #elif SIMULATE_CAMERA
-  self.simulatedCameraTimer = [NSTimer scheduledTimerWithTimeInterval:2 target:self selector:@selector(simulateNewFrame) userInfo:nil repeats:YES];
+  NSTimeInterval frameInterval = [[NSProcessInfo processInfo].environment[@"CARDIO_SIMULATED_CAMERA_INTERVAL"] doubleValue];
+  if (frameInterval <= 0) {
+    frameInterval = kSimulatedCameraFrameInterval;
+  }
+  self.simulatedCameraTimer = [NSTimer scheduledTimerWithTimeInterval:frameInterval target:self selector:@selector(simulateNewFrame) userInfo:nil repeats:YES];
   [self simulateNewFrame]; // grab the first frame right away
   self.running = YES;
 #endif
@@ -546,8 +742,14 @@
 
 #if SIMULATE_CAMERA
 - (void)simulateNewFrame {
-  [(SimulatedCameraLayer *)self.previewLayer nextImage];
-  [self captureOutput:nil didOutputSampleBuffer:nil fromConnection:nil];
+  SimulatedCameraLayer *simulatedCameraLayer = (SimulatedCameraLayer *)self.previewLayer;
+  [simulatedCameraLayer nextImage];
+  // Without a frame container, frames carry no sample buffer
+  CMSampleBufferRef sampleBuffer = [[SimulatedCameraFrames sharedFrames] newSampleBufferForFrame:(NSUInteger)simulatedCameraLayer.imageIndex];
+  [self captureOutput:nil didOutputSampleBuffer:sampleBuffer fromConnection:nil];
+  if (sampleBuffer) {
+    CFRelease(sampleBuffer);
+  }
 }
 
 - (void)considerItScanned {
@@ -581,7 +783,7 @@ didOutputSampleBuffer:(CMSampleBufferRef)sampleBuffer
     static double fps = 0;
 #endif
 #if SIMULATE_CAMERA
-    CardIOVideoFrame *frame = [[CardIOVideoFrame alloc] initWithSampleBuffer:nil interfaceOrientation:self.interfaceOrientation];
+    CardIOVideoFrame *frame = [[CardIOVideoFrame alloc] initWithSampleBuffer:sampleBuffer interfaceOrientation:self.interfaceOrientation];
     frame.scanner = self.scanner;
     frame.cardInfo = self.scanner.cardInfo;
 #else
@@ -1,15 +1,15 @@
 #!/usr/bin/env python
 
 import atexit
-import glob
+import imp
 import os
-import re
 import shutil
 import sys
 import tempfile
 import textwrap
+import time
 
-from fabric.api import env, local, hide
+from fabric.api import env, hide
 from fabric.context_managers import lcd, settings, shell_env
 from fabric.contrib.console import confirm
 from fabric.contrib.files import exists
@@ -19,13 +19,29 @@ from fabric import colors
 
 sys.path.append('scripts')
 from string_scripts.confirm_ready_for_release import confirm_ready_for_release as _confirm_ready_for_release
+from build_scripts.artifact_cache import ArtifactCache as _ArtifactCache, artifact_key as _artifact_key, source_fingerprint as _source_fingerprint
+from build_scripts.build_trace import Tracer as _Tracer, max_rss_kb as _max_rss_kb
+from build_scripts.dmz_concat import UP_TO_DATE, WAS_STALE, incremental_concat as _incremental_concat
+from build_scripts.file_utils import cache_directory as _cache_directory, write_if_changed as _write_if_changed
+from build_scripts.incremental_asset_bundle import REGENERATED, incremental_asset_bundle as _incremental_asset_bundle
+from build_scripts.job_scheduler import Job as _Job, JobFailed as _JobFailed, run_jobs as _run_jobs
+from build_scripts.release_archive import write_archive as _write_archive
+from build_scripts.repo_metadata import RepoMetadata as _RepoMetadata
+from build_scripts.sdk_assembly import LINK, SDK_MANIFEST, assemble_sdk as _assemble_sdk_from_manifest
+from build_scripts.size_profile import (DEFAULT_BASELINE_PATH, SizeProfileError as _SizeProfileError, load_baseline as _load_baseline,
+                                        profile as _profile, regressions as _regressions, save_baseline as _save_baseline)
 
 
 # --- Configuration ---------------------------------------------------------
 
 env.verbose = False
+env.trace = False
+env.trace_dir = None
 env.libname = "libCardIO.a"
-env.developer_dir = local("xcode-select -p", capture=True)
+env.developer_dir = None  # looked up when a task first needs it; see _developer_dir()
+
+# Toolchain and git metadata, looked up lazily and cached on disk (see repo_metadata.py)
+_metadata = _RepoMetadata()
 
 # --- Tasks -----------------------------------------------------------------
 
@@ -37,6 +53,25 @@ def verbose(be_verbose=True):
     env.verbose = be_verbose
 
 
+def trace(trace_dir=None):
+    """
+    Makes all following tasks record a timing trace of their phases and subprocesses.
+    For example, `fab trace build:outdir=~` writes a Chrome/Perfetto trace (.json) and a summary (.txt)
+    to trace_dir (default: ~/.cache/card.io/traces) and prints the summary.
+    """
+    env.trace = True
+    env.trace_dir = trace_dir
+
+
+def _write_trace(tracer):
+    trace_dir = os.path.abspath(os.path.expanduser(env.trace_dir or os.path.join(_cache_directory(), "traces")))
+    trace_path, summary_path = tracer.write(trace_dir)
+    print(colors.white("Timing summary", bold=True))
+    for line in tracer.summary_lines():
+        print(colors.white("  " + line))
+    print(colors.white("Wrote trace to {trace_path} (open it in chrome://tracing or ui.perfetto.dev)".format(**locals())))
+
+
 def developer_dir(dir):
     """
     Sets DEVELOPER_DIR environment variable to correct Xcode
@@ -60,49 +95,293 @@ def _locate(fileset, root=os.curdir):
                 yield os.path.join(path, filename)
 
 
-def _add_version_to_header_file(version_str, file):
-    lines = []
-    for line in file.readlines():
-        lines.append(line)
-        m = re.match("^(//\s+)CardIO.*\.h$", line)
-        if m:
-            lines.append("{0}Version {1}\n".format(m.groups()[0], version_str))
-            lines.append("//\n")
-    file.seek(0)
-    file.truncate()
-    for line in lines:
-        file.write(line)
+def _developer_dir():
+    """
+    The developer dir set with `fab developer_dir:...`, or else the one xcode-select reports.
+    """
+    if env.developer_dir is None:
+        env.developer_dir = _metadata.developer_dir()
+        if env.developer_dir is None:
+            abort(colors.red("Cannot find Xcode; use `fab developer_dir:/Applications/Xcode.app` to point at it", bold=True))
+    return env.developer_dir
 
 
 def _version_str(show_dirty=False):
-    git_describe_cmd = "git describe --match='iOS_[0-9]*.[0-9]*' --tags --always --dirty"
-    version_str = local(git_describe_cmd, capture=True).strip()[4:]
-    if not show_dirty:
-        version_str = version_str.replace('-dirty', '')
+    version_str = _metadata.describe()
+    if version_str is None:
+        abort(colors.red("`git describe` failed; is this a git repository?", bold=True))
+    version_str = version_str[4:]
+    if show_dirty and _metadata.is_dirty():
+        version_str += '-dirty'
     return version_str
 
 
-def _copy(source_files, dest_dir):
-    for public_header_file in source_files:
-        with open(public_header_file, "rb") as in_file:
-            contents = in_file.read()
-        unused, header_filename = os.path.split(public_header_file)
-        header_filename = os.path.join(dest_dir, header_filename)
-        with open(header_filename, "wb") as out_file:
-            out_file.write(contents)
-        with open(header_filename, "r+") as out_file:
-            _add_version_to_header_file(_version_str(), out_file)
+def _is_true(value):
+    """
+    Fabric passes task arguments as strings: treat "no", "false", "0" and "" as False.
+    """
+    if isinstance(value, basestring):
+        return value.strip().lower() not in ("no", "false", "0", "")
+    return bool(value)
+
+
+# Tells CardIO-static's in-tree phases (the version header, the strings pre-commit hook and the Baler) that fab build
+# has already done their work: otherwise every concurrent build would rewrite the same files in Classes/.
+_TREE_PREPARED = "CARDIO_TREE_PREPARED=YES"
+
+
+def _isolated_build_settings(variant_dir, name):
+    """
+    xcodebuild settings that give a build its own intermediates, so that several can run at once.
+    """
+    job_dir = os.path.join(variant_dir, "intermediates", name)
+    return "OBJROOT={obj} SYMROOT={sym}".format(obj=os.path.join(job_dir, "obj"), sym=os.path.join(job_dir, "sym"))
+
+
+def _write_icc_version(icc_root, icc_version):
+    """
+    Write Classes/CardIOIccVersion.h, as CardIO-static's "Get version from git tag" phase would.
+    fab build does it once, up front: the concurrent builds skip that phase (see _TREE_PREPARED).
+    """
+    with open(os.path.join(icc_root, "Classes", "CardIOIccVersion.h.template")) as f:
+        contents = f.read().replace("icc-version-undefined", icc_version)
+    _write_if_changed(os.path.join(icc_root, "Classes", "CardIOIccVersion.h"), contents)
+
+
+def _lipo_path():
+    # in Xcode 4.5 GM, xcrun selects the wrong lipo to use, so circumventing xcrun for now :(
+    toolchain_lipo = os.path.join(_developer_dir(), "Toolchains", "XcodeDefault.xctoolchain", "usr", "bin", "lipo")
+    if os.path.exists(toolchain_lipo):
+        return toolchain_lipo
+    return "lipo"
 
 
-def build(outdir=None, device_sdk=None, simulator_sdk=None, **kwargs):
+def _run_build_jobs(jobs, build_config, build_jobs, temp_dir, cwd, tracer):
+    """
+    Run the build jobs concurrently (at most build_jobs at once), each logging to its own file in temp_dir.
+    Aborts with the failing job's log as soon as any job fails. Every job that ran is recorded in tracer.
+    """
+    def on_start(job):
+        print(colors.blue("({build_config}) Started {name}".format(build_config=build_config, name=job.name)))
+
+    def on_finish(job):
+        print(colors.blue("({build_config}) Finished {name} in {duration:.1f}s".format(build_config=build_config, name=job.name, duration=job.duration)))
+        if env.verbose:
+            print(job.log_tail(lines=None))
+
+    job_env = dict(os.environ)
+    job_env["DEVELOPER_DIR"] = _developer_dir()
+    try:
+        _run_jobs(jobs, max_jobs=int(build_jobs) if build_jobs else None, cwd=cwd, env=job_env,
+                  log_dir=os.path.join(temp_dir, "logs"), on_start=on_start, on_finish=on_finish)
+    except _JobFailed as e:
+        print(e.job.log_tail())
+        abort(colors.red(str(e), bold=True))
+    finally:
+        for job in jobs:
+            if job.start_time is not None and job.end_time is not None:
+                tracer.add_process(job.name, job.start_time, job.end_time, job.returncode,
+                                   job.cpu_time, _max_rss_kb(job.max_rusage), log=job.log_path)
+
+
+def _parse_variants(variants, common_flags):
+    """
+    Turn `variants`, e.g. "default;SCAN_EXPIRY:0;SCAN_EXPIRY:0+OTHER_FLAG:1", into a list of flag dicts.
+    Variants are separated by ';' and flags within a variant by '+'; every variant also gets common_flags.
+    Flags are written NAME:VALUE, since fab itself splits task arguments on '=' (NAME\\=VALUE also works).
+    """
+    if not variants:
+        return [dict(common_flags)]
+    flag_sets = []
+    for variant in variants.split(";"):
+        flags = dict(common_flags)
+        variant = variant.strip()
+        if variant and variant != "default":
+            for flag in variant.split("+"):
+                key, separator, value = flag.partition("=" if "=" in flag else ":")
+                if not separator or not key.strip():
+                    abort("Cannot parse build flag '{flag}' in variants '{variants}'".format(**locals()))
+                flags[key.strip()] = value.strip()
+        if flags not in flag_sets:
+            flag_sets.append(flags)
+    return flag_sets
+
+
+def _variant_suffix(flags):
+    suffix = "_".join("{k}-{v}".format(k=k, v=v) for k, v in sorted(flags.iteritems()))
+    if suffix:
+        suffix = "_" + suffix
+    return suffix
+
+
+def _plan_variant(flags, temp_dir, build_config, device_sdk, arch_to_sdk, artifact_cache, common_key_parts):
+    """
+    Work out which slices of one variant must be built, fetching the rest from the artifact cache.
+    Returns a dict describing the variant, including the jobs that still need to run.
+    """
+    name = _variant_suffix(flags).lstrip("_") or "default"
+    variant_dir = os.path.join(temp_dir, name, build_config)
+    formatted_xcode_preprocessor_flags = " ".join("{k}={v}".format(k=k, v=v) for k, v in sorted(flags.iteritems()))
+    extra_xcodebuild_settings = "{tree_prepared} GCC_PREPROCESSOR_DEFINITIONS='$(value) {formatted_xcode_preprocessor_flags}'".format(
+        tree_prepared=_TREE_PREPARED, **locals())
+    parallelize = "" if env.verbose else "-parallelizeTargets"  # don't parallelize verbose builds, it's hard to read the output
+    print(colors.white("Using extra Xcode flags for {name}: {formatted_xcode_preprocessor_flags}".format(**locals())))
+
+    variant = {"name": name, "flags": flags, "jobs": [], "arch_build_dirs": {}, "reused": []}
+    arch_build_dirs = variant["arch_build_dirs"]
+    jobs = variant["jobs"]
+
+    # Cache keys: every slice depends on the sources, the flags, the toolchain and the embedded version;
+    # the universal library depends on exactly the slices that go into it.
+    artifact_keys = {"archive": _artifact_key(*common_key_parts + [formatted_xcode_preprocessor_flags, build_config, "archive", device_sdk])}
+    for arch, sdk in arch_to_sdk:
+        artifact_keys[arch] = _artifact_key(*common_key_parts + [formatted_xcode_preprocessor_flags, build_config, arch, sdk])
+    artifact_keys["universal"] = _artifact_key(*[artifact_keys[key] for key in sorted(artifact_keys)] + ["universal"])
+    variant["artifact_keys"] = artifact_keys
+
+    lipo_dir = os.path.join(variant_dir, "universal")
+    variant["lipo_dir"] = lipo_dir
+    os.makedirs(lipo_dir)
+
+    if artifact_cache and artifact_cache.fetch(artifact_keys["universal"], env.libname, lipo_dir):
+        print(colors.blue("({name}) Reusing cached universal {libname}".format(libname=env.libname, **locals())))
+        variant["reused"].append("universal")
+        return variant
+
+    # Each job gets its own intermediates (OBJROOT/SYMROOT) as well as its own product dir,
+    # so the jobs can run side by side and no arch needs a `clean` first.
+
+    # Build the Archive release
+    base_xcodebuild_command = "xcrun xcodebuild -scheme \"CardIO Static Library\" -target CardIO-static -configuration {build_config} archive".format(**locals())
+    build_dir = os.path.join(variant_dir, "Archive")
+    arch_build_dirs["archive"] = build_dir
+    os.makedirs(build_dir)
+    if artifact_cache and artifact_cache.fetch(artifact_keys["archive"], env.libname, build_dir):
+        print(colors.blue("({name}) Reusing cached Archive {libname}".format(libname=env.libname, **locals())))
+        variant["reused"].append("Archive")
+    else:
+        isolation = _isolated_build_settings(variant_dir, "Archive")
+        build_cmd = "{base_xcodebuild_command} {parallelize} CONFIGURATION_BUILD_DIR={build_dir} {isolation} {extra_xcodebuild_settings}".format(**locals())
+        jobs.append(_Job("{name} Archive".format(**locals()), [build_cmd]))
+
+    for arch, sdk in arch_to_sdk:
+        base_xcodebuild_command = "xcrun xcodebuild OTHER_CFLAGS='-fembed-bitcode' -target CardIO-static -arch {arch} -sdk {sdk} -configuration {build_config}".format(**locals())
+        build_dir = os.path.join(variant_dir, arch)
+        arch_build_dirs[arch] = build_dir
+        os.makedirs(build_dir)
+        if artifact_cache and artifact_cache.fetch(artifact_keys[arch], env.libname, build_dir):
+            print(colors.blue("({name}) Reusing cached {arch} {libname}".format(libname=env.libname, **locals())))
+            variant["reused"].append(arch)
+            continue
+        isolation = _isolated_build_settings(variant_dir, arch)
+        build_cmd = "{base_xcodebuild_command} {parallelize} CONFIGURATION_BUILD_DIR={build_dir} {isolation} {extra_xcodebuild_settings}".format(**locals())
+        jobs.append(_Job("{name} {arch}".format(**locals()), [build_cmd]))
+
+    arch_build_dirs["universal"] = lipo_dir
+    lipo_cmd = "{lipo}" \
+               "           {archive}/{libname}" \
+               "           -arch i386 {i386}/{libname}" \
+               "           -arch x86_64 {x86_64}/{libname}" \
+               "           -create" \
+               "           -output {universal}/{libname}".format(lipo=_lipo_path(), libname=env.libname, **arch_build_dirs)
+    jobs.append(_Job("{name} Lipo".format(**locals()), [lipo_cmd], depends_on=[job.name for job in jobs]))
+
+    strip_cmd = "xcrun strip -S {universal}/{libname}".format(libname=env.libname, **arch_build_dirs)
+    jobs.append(_Job("{name} Strip".format(**locals()), [strip_cmd], depends_on=[jobs[-1].name]))
+
+    return variant
+
+
+def _assemble_sdk(sdk_dir, icc_root, libfile, version_str):
+    print(colors.white("Assembling release SDK in {sdk_dir}".format(sdk_dir=sdk_dir), bold=True))
+    manifest = SDK_MANIFEST + ((libfile, "CardIO", LINK),)
+    file_hashes = _assemble_sdk_from_manifest(sdk_dir, icc_root, version_str, manifest=manifest)
+    print(colors.white("Wrote {count} files and their hashes to {sdk_dir}.sha1".format(count=len(file_hashes), sdk_dir=sdk_dir)))
+
+
+def _run_dmz_concat(dmz_root):
+    """
+    Run the dmz fabfile's `concat` task in this process, rather than starting a second fab.
+    """
+    dmz_fabfile = imp.load_source("dmz_fabfile", os.path.join(dmz_root, "fabfile.py"))
+    cwd = os.getcwd()
+    os.chdir(dmz_root)
+    try:
+        with lcd(dmz_root):
+            dmz_fabfile.concat()
+    finally:
+        os.chdir(cwd)
+
+
+def _print_variant_summary(variants):
+    print(colors.white("Variant summary", bold=True))
+    for variant in variants:
+        print(colors.white("  {name:<32} build {compile:6.1f}s  assembly {assembly:5.1f}s  reused {reused}  -> {sdk_dir}".format(**variant)))
+
+
+def _write_release_archive(archive_path, sdk_dirs):
+    print(colors.white("Packing release archive {archive_path}".format(archive_path=archive_path), bold=True))
+    summary = _write_archive(archive_path, [(os.path.basename(sdk_dir), sdk_dir) for sdk_dir in sdk_dirs])
+    print(colors.white("Wrote {files} files ({linked_files} stored once as links, saving {linked_bytes} bytes), "
+                       "{archive_bytes} bytes, sha1 {sha1}".format(**summary._asdict())))
+    print(colors.white("Wrote their hashes to {archive_path}.sha1; check the archive with "
+                       "`scripts/build_scripts/release_archive.py --verify {archive_path}`".format(archive_path=archive_path)))
+
+
+def _check_sizes(variants, icc_root, update):
+    """
+    Profile each variant's libraries and the asset bundle, and compare them with (or, if update, record them as)
+    the variant's size baseline. Returns the number of metrics over budget.
+    """
+    print(colors.white("Checking sizes against {0}".format(DEFAULT_BASELINE_PATH), bold=True))
+    try:
+        baseline = _load_baseline(DEFAULT_BASELINE_PATH)
+        over_budget = 0
+        for variant in variants:
+            library_dir = os.path.join(variant["sdk_dir"], "CardIO")
+            paths = [os.path.join(icc_root, "Classes", "CardIOBundle.m")]
+            paths += sorted(os.path.join(library_dir, filename) for filename in os.listdir(library_dir) if filename.endswith(".a"))
+            metrics = _profile(paths)
+            if update:
+                baseline["profiles"][variant["name"]] = metrics
+                print(colors.white("  {name}: recorded {count} metrics".format(count=len(metrics), **variant)))
+                continue
+            if variant["name"] not in baseline["profiles"]:
+                print(colors.yellow("  {name}: no baseline yet; record one with `fab build:...,sizes=update`".format(**variant)))
+                continue
+            for regression in _regressions(metrics, baseline["profiles"][variant["name"]], baseline["budgets"]):
+                over_budget += 1
+                print(colors.red("  {name}: {0.name} grew by {0.growth} bytes ({0.baseline} -> {0.size}; budget {0.limit})".format(
+                    regression, **variant)))
+        if update:
+            _save_baseline(DEFAULT_BASELINE_PATH, baseline)
+        elif not over_budget:
+            print(colors.white("  Sizes are within budget"))
+    except (_SizeProfileError, IOError, OSError) as e:
+        abort("Cannot check sizes: {0}".format(e))
+    return over_budget
+
+
+def build(outdir=None, device_sdk=None, simulator_sdk=None, strings_jobs=0, build_jobs=None, cache=True, variants=None, archive=True,
+          sizes="check", **kwargs):
     """
     Build card.io SDK.
+    `strings_jobs` is the number of processes used to validate the .strings files (0 = one per CPU).
+    `build_jobs` is the number of xcodebuild invocations to run at once (default: all of them).
+    `cache=no` rebuilds everything rather than reusing cached libraries and .strings verdicts.
+    `variants` builds several flavors at once, e.g. `variants="default;SCAN_EXPIRY:0"`
+    (variants separated by ';', flags within a variant by '+'); other flags apply to every variant.
+    `archive=no` skips packing the SDK directories into a reproducible <outdir>/card.io_ios_sdk_<version>.tar.gz.
+    `sizes=check` (the default) fails the build if a library or the asset bundle grew past its budget (see
+    scripts/build_scripts/size_profile.py); `sizes=update` records this build's sizes as the new baseline; `sizes=no` skips it.
     """
     print(colors.white("Setup", bold=True))
 
-    to_hide = [] if env.verbose else ["stdout", "stderr", "running"]
+    tracer = _Tracer("fab build")
+    if env.trace:
+        atexit.register(_write_trace, tracer)  # also reports builds that abort
 
-    xcode_preprocessor_flags = {}
+    to_hide = [] if env.verbose else ["stdout", "stderr", "running"]
 
     if not outdir:
         message = """
@@ -110,19 +389,25 @@ def build(outdir=None, device_sdk=None, simulator_sdk=None, **kwargs):
                      Example usage:
                        `fab build:outdir=~` - normal build
                        `fab build:outdir=~,SCAN_EXPIRY=0` - to disable the experimental expiry-scan feature
+                       `fab build:outdir=~,variants="default;SCAN_EXPIRY:0"` - both of the above, in one go
                   """
         abort(textwrap.dedent(message).format(**locals()))
 
-    if _confirm_ready_for_release("assets/strings"):
-		sys.exit(1)
+    use_cache = _is_true(cache)
+
+    with tracer.phase("strings gate"):
+        if _confirm_ready_for_release("assets/strings", jobs=int(strings_jobs), use_cache=use_cache):
+            sys.exit(1)
 
     outdir = os.path.abspath(os.path.expanduser(outdir))
     print colors.yellow("Will save release sdk to {outdir}".format(outdir=outdir))
-    out_subdir = "card.io_ios_sdk_{0}".format(_version_str(show_dirty=True))
+    with tracer.phase("git describe"):
+        dirty_version_str = _version_str(show_dirty=True)
+    version_str = dirty_version_str.replace('-dirty', '')
+    icc_version = os.environ.get("ICC_VERSION") or version_str.split("-")[0]
+    out_subdir = "card.io_ios_sdk_{0}".format(dirty_version_str)
 
-    xcode_preprocessor_flags.update(kwargs)
-    formatted_xcode_preprocessor_flags = " ".join("{k}={v}".format(k=k, v=v) for k, v in xcode_preprocessor_flags.iteritems())
-    extra_xcodebuild_settings = "GCC_PREPROCESSOR_DEFINITIONS='$(value) {formatted_xcode_preprocessor_flags}'".format(**locals())
+    flag_sets = _parse_variants(variants, kwargs)
 
     device_sdk = device_sdk or "iphoneos"
     simulator_sdk = simulator_sdk or "iphonesimulator"
@@ -132,106 +417,91 @@ def build(outdir=None, device_sdk=None, simulator_sdk=None, **kwargs):
                    ("x86_64", simulator_sdk)
                   )
 
-    with settings(hide(*to_hide)):
-        icc_root = local("git rev-parse --show-toplevel", capture=True)
+    with tracer.phase("git rev-parse"):
+        icc_root = _metadata.toplevel()
 
     temp_dir = tempfile.mkdtemp() + os.sep
     atexit.register(shutil.rmtree, temp_dir, True)
 
     print(colors.white("Preparing dmz", bold=True))
-    with settings(hide(*to_hide)):
-        with lcd(os.path.join(icc_root, "dmz")):
-            dmz_all_filename = os.path.join("dmz", "dmz_all.cpp")
-            with open(dmz_all_filename) as f:
-                old_dmz_all = f.read()
-            local("fab concat")
-            with open(dmz_all_filename) as f:
-                new_dmz_all = f.read()
-            if old_dmz_all != new_dmz_all:
-                print(colors.red("WARNING: dmz_all.h was not up to date!", bold=True))
-    
+    with tracer.phase("dmz concat") as dmz_phase:
+        with settings(hide(*to_hide)):
+            dmz_root = os.path.join(icc_root, "dmz")
+            concat_result = _incremental_concat(dmz_root, lambda: _run_dmz_concat(dmz_root))
+            dmz_phase["args"]["status"] = concat_result.status
+            if concat_result.status == WAS_STALE:
+                print(colors.red("WARNING: dmz_all.cpp was not up to date!", bold=True))
+            elif concat_result.status == UP_TO_DATE:
+                print(colors.white("dmz_all.cpp is up to date"))
+
+    # Done here, rather than by the Xcode build phases, so that the source fingerprint sees the generated files
+    # and so that the concurrent builds below do not all rewrite them.
+    _write_icc_version(icc_root, icc_version)
+    with tracer.phase("asset bundle") as bundle_phase:
+        bundle_result = _incremental_asset_bundle(os.path.join(icc_root, "assets"), os.path.join(icc_root, "Classes"),
+                                                  "CardIOBundle", "generate_asset_bundle.py assets/ Classes/ -c CardIOBundle")
+        bundle_phase["args"]["status"] = bundle_result.status
+        if bundle_result.status == REGENERATED:
+            print(colors.white("Regenerated CardIOBundle ({0} changed inputs)".format(len(bundle_result.changed_inputs))))
+        else:
+            print(colors.white("CardIOBundle is up to date"))
+
     print(colors.white("Building", bold=True))
     print(colors.white("Using temp dir {temp_dir}".format(**locals())))
-    print(colors.white("Using extra Xcode flags: {formatted_xcode_preprocessor_flags}".format(**locals())))
-    print(colors.white("Using developer directory: {}".format(env.developer_dir)))
+    developer_dir = _developer_dir()
+    print(colors.white("Using developer directory: {}".format(developer_dir)))
 
     with lcd(icc_root):
-        with shell_env(DEVELOPER_DIR=env.developer_dir):
+        with shell_env(DEVELOPER_DIR=developer_dir):
             with settings(hide(*to_hide)):
-                lipo_build_dirs = {}
                 build_config = "Release"
-                arch_build_dirs = {}
-
-                # Build the Archive release
-                print(colors.blue("({build_config}) Building Archive (arm* architectures specified in build config)".format(**locals())))
-                base_xcodebuild_command = "xcrun xcodebuild -scheme \"CardIO Static Library\" -target CardIO-static -configuration {build_config} archive".format(**locals())
-                build_dir = os.path.join(temp_dir, build_config, "Archive")
-                arch_build_dirs["archive"] = build_dir
-                os.makedirs(build_dir)
-                parallelize = "" if env.verbose else "-parallelizeTargets"  # don't parallelize verbose builds, it's hard to read the output
-                build_cmd = "{base_xcodebuild_command} {parallelize} CONFIGURATION_BUILD_DIR={build_dir}  {extra_xcodebuild_settings}".format(**locals())
-                local(build_cmd)
-
-                for arch, sdk in arch_to_sdk:
-                    print(colors.blue("({build_config}) Building {arch}".format(**locals())))
-
-                    base_xcodebuild_command = "xcrun xcodebuild OTHER_CFLAGS='-fembed-bitcode' -target CardIO-static -arch {arch} -sdk {sdk} -configuration {build_config}".format(**locals())
-
-                    clean_cmd =  "{base_xcodebuild_command} clean".format(**locals())
-                    local(clean_cmd)
-
-                    build_dir = os.path.join(temp_dir, build_config, arch)
-                    arch_build_dirs[arch] = build_dir
-                    os.makedirs(build_dir)
-                    parallelize = "" if env.verbose else "-parallelizeTargets"  # don't parallelize verbose builds, it's hard to read the output
-                    build_cmd = "{base_xcodebuild_command} {parallelize} CONFIGURATION_BUILD_DIR={build_dir}  {extra_xcodebuild_settings}".format(**locals())
-                    local(build_cmd)
-
-                print(colors.blue("({build_config}) Lipoing".format(**locals())))
-                lipo_dir = os.path.join(temp_dir, build_config, "universal")
-                lipo_build_dirs[build_config] = lipo_dir
-                os.makedirs(lipo_dir)
-                arch_build_dirs["universal"] = lipo_dir
-                # in Xcode 4.5 GM, xcrun selects the wrong lipo to use, so circumventing xcrun for now :(
-                lipo_cmd = "`xcode-select -print-path`/Toolchains/XcodeDefault.xctoolchain/usr/bin/lipo " \
-                           "           {archive}/{libname}" \
-                           "           -arch i386 {i386}/{libname}" \
-                           "           -arch x86_64 {x86_64}/{libname}" \
-                           "           -create" \
-                           "           -output {universal}/{libname}".format(libname=env.libname, **arch_build_dirs)
-                local(lipo_cmd)
-
-                print(colors.blue("({build_config}) Stripping debug symbols".format(**locals())))
-                strip_cmd = "xcrun strip -S {universal}/{libname}".format(libname=env.libname, **arch_build_dirs)
-                local(strip_cmd)
-
-                out_subdir_suffix = "_".join("{k}-{v}".format(k=k, v=v) for k, v in kwargs.iteritems())
-                if out_subdir_suffix:
-                    out_subdir_suffix = "_" + out_subdir_suffix
-                out_subdir += out_subdir_suffix
-                sdk_dir = os.path.join(outdir, out_subdir)
-
-                print(colors.white("Assembling release SDK in {sdk_dir}".format(sdk_dir=sdk_dir), bold=True))
-                if os.path.isdir(sdk_dir):
-                    shutil.rmtree(sdk_dir)
-                cardio_dir = os.path.join(sdk_dir, "CardIO")
-                os.makedirs(cardio_dir)
-
-                header_files = glob.glob(os.path.join("CardIO_Public_API", "*.h"))
-                _copy(header_files, cardio_dir)
-
-                opencv_libraries = glob.glob(os.path.join("opencv_device/lib/", "*.a"))
-                _copy(opencv_libraries, cardio_dir)
-
-                libfile = os.path.join(lipo_build_dirs["Release"], env.libname)
-                shutil.copy2(libfile, cardio_dir)
-
-                release_dir = os.path.join(icc_root, "Release")
-                shutil.copy2(os.path.join(release_dir, "release_notes.txt"), sdk_dir)
-                shutil.copy2(os.path.join(release_dir, "CardIO.podspec"), sdk_dir)
-                shutil.copy2(os.path.join(release_dir, "acknowledgments.md"), sdk_dir)
-                shutil.copy2(os.path.join(release_dir, "LICENSE.md"), sdk_dir)
-                shutil.copy2(os.path.join(release_dir, "README.md"), sdk_dir)
-                shutil.copy2(os.path.join(release_dir, "CardIO/CardIO.m"), os.path.join(sdk_dir, "CardIO"))
-                shutil.copytree(os.path.join(release_dir, "SampleApp"), os.path.join(sdk_dir, "SampleApp"), ignore=shutil.ignore_patterns(".DS_Store"))
-                shutil.copytree(os.path.join(release_dir, "SampleApp-Swift"), os.path.join(sdk_dir, "SampleApp-Swift"), ignore=shutil.ignore_patterns(".DS_Store"))
+
+                # Work shared by all variants: the source fingerprint and the version compiled into the library.
+                artifact_cache = _ArtifactCache() if use_cache else None
+                with tracer.phase("source fingerprint"):
+                    common_key_parts = [_source_fingerprint(icc_root), developer_dir, icc_version] if use_cache else []
+
+                with tracer.phase("plan and fetch cached libraries"):
+                    planned_variants = [_plan_variant(flags, temp_dir, build_config, device_sdk, arch_to_sdk, artifact_cache, common_key_parts)
+                                        for flags in flag_sets]
+
+                # All variants' builds go through one scheduler, so they share the build_jobs limit.
+                all_jobs = [job for variant in planned_variants for job in variant["jobs"]]
+                if all_jobs:
+                    with tracer.phase("compile, lipo and strip", jobs=len(all_jobs)):
+                        _run_build_jobs(all_jobs, build_config, build_jobs, temp_dir, icc_root, tracer)
+
+                for variant in planned_variants:
+                    if artifact_cache:
+                        with tracer.phase("store {name} libraries".format(**variant)):
+                            for name, build_dir in variant["arch_build_dirs"].iteritems():
+                                artifact_cache.store(variant["artifact_keys"][name], os.path.join(build_dir, env.libname))
+
+                    sdk_dir = os.path.join(outdir, out_subdir + _variant_suffix(variant["flags"]))
+                    assembly_start = time.time()
+                    with tracer.phase("assemble {name}".format(**variant)):
+                        _assemble_sdk(sdk_dir, icc_root, os.path.join(variant["lipo_dir"], env.libname), version_str)
+
+                    jobs = variant["jobs"]
+                    variant["sdk_dir"] = sdk_dir
+                    variant["assembly"] = time.time() - assembly_start
+                    variant["compile"] = max(job.end_time for job in jobs) - min(job.start_time for job in jobs) if jobs else 0.0
+                    variant["reused"] = ", ".join(variant["reused"]) or "nothing"
+
+                if artifact_cache:
+                    with tracer.phase("evict cached libraries"):
+                        artifact_cache.evict()
+                    print(colors.white(artifact_cache.stats()))
+
+                _print_variant_summary(planned_variants)
+
+    # Before archiving, so that an over-budget build leaves no release archive behind.
+    if _is_true(sizes):
+        with tracer.phase("size check"):
+            over_budget = _check_sizes(planned_variants, icc_root, sizes == "update")
+        if over_budget:
+            abort(colors.red("{0} sizes are over budget; if the growth is intended, run again with sizes=update".format(over_budget), bold=True))
+
+    if _is_true(archive):
+        with tracer.phase("archive"):
+            _write_release_archive(os.path.join(outdir, out_subdir + ".tar.gz"), [variant["sdk_dir"] for variant in planned_variants])
@@ -4,7 +4,9 @@ The script builds OpenCV.framework for iOS.
 The built framework is universal, it can be used to build app and run it on either iOS simulator or real device.
 
 Usage:
-    ./build_framework.py <outputdir>
+    ./build_framework.py [--trace] [--no-cache] [--srcroot <opencvdir>] <outputdir>
+
+The OpenCV source tree is the directory above this script's, unless given with --srcroot.
     
 By cmake conventions (and especially if you work with OpenCV SVN repository),
 the output dir should not be a subdirectory of OpenCV source tree.
@@ -23,40 +25,152 @@ Script will create <outputdir>, if it's missing, and a few its subdirectories:
 The script should handle minor OpenCV updates efficiently
 - it does not recompile the library from scratch each time.
 However, OpenCV.framework directory is erased and recreated on each run.
+
+With --trace, the time, CPU time, peak RSS and exit status of every step and command are
+written to <outputdir>/trace (a Chrome/Perfetto trace .json and a summary .txt).
+
+The per-arch builds run concurrently, each in its own build directory (see scripts/build_scripts/job_scheduler.py),
+and the script stops at the first command that fails, with the tail of its log.
+
+The universal libopencv_{core,imgproc}.a and their headers are cached in $CARDIO_CACHE_DIR/opencv (default
+~/.cache/card.io/opencv), keyed by the OpenCV source revision, the arch list, the Xcode and SDK versions, the
+toolchain file and the cmake arguments; when they are all cached, nothing is built. Copying into
+<outputdir>/universal only touches the files that changed. Use --no-cache to build regardless.
+
+With stand-in `cmake`/`xcodebuild`/`lipo` scripts on $PATH (see scripts/build_scripts/shims), the script can be
+run on Linux.
 """
 
-import glob, re, os, os.path, shutil, string, sys
+import filecmp, glob, multiprocessing, re, os, os.path, shutil, string, subprocess, sys, tarfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts"))
+from build_scripts.artifact_cache import ArtifactCache, artifact_key, source_fingerprint
+from build_scripts.build_trace import Tracer, max_rss_kb
+from build_scripts.file_utils import cache_directory, copy_atomically, sha1_file
+from build_scripts.job_scheduler import Job, JobFailed, run_jobs
+
+tracer = Tracer("build_framework")
+
+ARCHS = ("armv7", "armv7s")
+LIBS = ("core", "imgproc")
+TARGET = "iPhoneOS"
+
+# What (relative to the OpenCV source root) goes into the source fingerprint, when there is no clean git revision
+OPENCV_SOURCE_PATHS = ("3rdparty", "CMakeLists.txt", "cmake", "include", "ios", "modules")
+
+HEADERS_ARCHIVE_NAME = "opencv2-headers.tar"
+
+class BuildError(Exception):
+    pass
+
+def run(command, cwd=None):
+    "runs a shell command (in cwd, or the current directory), recording it in the trace; raises BuildError if it fails"
+    returncode = tracer.run(command, cwd=cwd)
+    if returncode != 0:
+        raise BuildError("%s failed with exit status %d" % (command, returncode))
 
-def build_opencv(srcroot, buildroot, target, arch=None):
-    "builds OpenCV for device or simulator"
+def toolchain_file(srcroot, target):
+    return "%s/ios/cmake/Toolchains/Toolchain-%s_Xcode.cmake" % (srcroot, target)
+
+def cmake_arguments(srcroot, target):
+    # for some reason, if you do not specify CMAKE_BUILD_TYPE, it puts libs to "RELEASE" rather than "Release"
+    return ("-GXcode " +
+            "-DCMAKE_BUILD_TYPE=Release " +
+            "-DCMAKE_TOOLCHAIN_FILE=%s " +
+            "-DBUILD_opencv_world=ON " +
+            "-DCMAKE_INSTALL_PREFIX=install") % (toolchain_file(srcroot, target),)
+
+def build_opencv(srcroot, buildroot, target, arch=None, xcode_jobs=8):
+    "returns the Job that builds OpenCV for device or simulator, in its own build directory"
     
     builddir = os.path.join(buildroot, target)
     if not os.path.isdir(builddir):
         os.makedirs(builddir)
-    currdir = os.getcwd()
-    os.chdir(builddir)
-    # for some reason, if you do not specify CMAKE_BUILD_TYPE, it puts libs to "RELEASE" rather than "Release"
-    cmakeargs = ("-GXcode " +
-                "-DCMAKE_BUILD_TYPE=Release " +
-                "-DCMAKE_TOOLCHAIN_FILE=%s/ios/cmake/Toolchains/Toolchain-%s_Xcode.cmake " +
-                "-DBUILD_opencv_world=ON " +
-                "-DCMAKE_INSTALL_PREFIX=install") % (srcroot, target)
+    cmakeargs = cmake_arguments(srcroot, target)
     # if cmake cache exists, just rerun cmake to update OpenCV.xproj if necessary
     if os.path.isfile(os.path.join(builddir, "CMakeCache.txt")):
-        os.system("cmake %s ." % (cmakeargs,))
+        commands = ["cmake %s ." % (cmakeargs,)]
     else:
-        os.system("cmake %s %s" % (cmakeargs, srcroot))
+        commands = ["cmake %s %s" % (cmakeargs, srcroot)]
     
     for wlib in [builddir + "/modules/world/UninstalledProducts/libopencv_world.a",
                  builddir + "/lib/Release/libopencv_world.a"]:
         if os.path.isfile(wlib):
             os.remove(wlib)
+    # `install` only adds and updates files, so headers since removed from the sources would linger
+    shutil.rmtree(os.path.join(builddir, "install"), True)
 
     arch_string = 'ARCHS="%s"' % arch if arch else ""
-    os.system("xcodebuild -parallelizeTargets -jobs 8 -sdk %s -configuration Release %s -target ALL_BUILD" % (target.lower(), arch_string))
-    os.system("xcodebuild -sdk %s -configuration Release %s -target install install" % (target.lower(), arch_string))
-    os.chdir(currdir)
-    
+    commands.append("xcodebuild -parallelizeTargets -jobs %d -sdk %s -configuration Release %s -target ALL_BUILD" % (xcode_jobs, target.lower(), arch_string))
+    commands.append("xcodebuild -sdk %s -configuration Release %s -target install install" % (target.lower(), arch_string))
+    return Job("build %s" % (arch or target), commands, cwd=builddir)
+
+def opencv_revision(srcroot):
+    """
+    identifies the OpenCV sources: the git tree of srcroot if it is checked in unmodified,
+    otherwise a fingerprint of the source files themselves
+    """
+    with open(os.devnull, "w") as devnull:
+        try:
+            tree = subprocess.check_output(["git", "rev-parse", "HEAD:./"], cwd=srcroot, stderr=devnull).strip()
+            modified = subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no", "--", "."], cwd=srcroot, stderr=devnull).strip()
+        except (OSError, subprocess.CalledProcessError):
+            tree, modified = None, True
+    if tree and not modified:
+        return "git tree " + tree
+    return "source fingerprint " + source_fingerprint(srcroot, OPENCV_SOURCE_PATHS)
+
+def xcode_identity(target):
+    """
+    identifies the compiler the build uses: the developer dir, `xcodebuild -version` and the version of target's SDK
+    (each of them as far as it can be found out)
+    """
+    parts = [os.environ.get("DEVELOPER_DIR") or "default developer dir"]
+    with open(os.devnull, "w") as devnull:
+        for command in (["xcodebuild", "-version"], ["xcrun", "-sdk", target.lower(), "--show-sdk-version"]):
+            try:
+                parts.append(subprocess.check_output(command, stderr=devnull).strip())
+            except (OSError, subprocess.CalledProcessError):
+                parts.append("no output from " + " ".join(command))
+    return parts
+
+def cache_keys(srcroot, target, archs, libs):
+    "returns {file name: artifact cache key} for the universal libraries and the headers archive"
+    toolchain = toolchain_file(srcroot, target)
+    common_key_parts = (["opencv", opencv_revision(srcroot), " ".join(archs), target] + xcode_identity(target) +
+                        [sha1_file(toolchain) if os.path.isfile(toolchain) else "no toolchain file",
+                         cmake_arguments("", target), " ".join(libs)])
+    names = ["libopencv_%s.a" % lib for lib in libs] + [HEADERS_ARCHIVE_NAME]
+    return dict((name, artifact_key(*common_key_parts + [name])) for name in names)
+
+def sync_file(src, dst):
+    "copies src to dst (atomically) unless dst already has the same content; returns True if it copied"
+    if os.path.isfile(dst) and filecmp.cmp(src, dst, shallow=False):
+        return False
+    dstdir = os.path.dirname(dst)
+    if not os.path.isdir(dstdir):
+        os.makedirs(dstdir)
+    copy_atomically(src, dst)
+    return True
+
+def sync_tree(src, dst):
+    "makes dst a copy of the directory src, touching only the files that differ; returns (copied, removed) counts"
+    copied = removed = 0
+    for directory, subdirectories, files in os.walk(src):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            if sync_file(path, os.path.join(dst, os.path.relpath(path, src))):
+                copied += 1
+    for directory, subdirectories, files in os.walk(dst, topdown=False):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            if not os.path.isfile(os.path.join(src, os.path.relpath(path, dst))):
+                os.remove(path)
+                removed += 1
+        if not os.listdir(directory) and not os.path.isdir(os.path.join(src, os.path.relpath(directory, dst))):
+            os.rmdir(directory)
+    return copied, removed
+
 def put_framework_together(srcroot, dstroot):
     "constructs the framework directory after all the targets are built"
     
@@ -90,7 +204,7 @@ def put_framework_together(srcroot, dstroot):
     
     # make universal static lib
     wlist = " ".join(["../build/" + t + "/lib/Release/libopencv_world.a" for t in targetlist])
-    os.system("lipo -create " + wlist + " -o " + dstdir + "/opencv2")
+    run("lipo -create " + wlist + " -o " + dstdir + "/opencv2")
     
     # form Info.plist
     srcfile = open(srcroot + "/ios/Info.plist.in", "rt")
@@ -111,50 +225,144 @@ def put_framework_together(srcroot, dstroot):
         
 
 
-def lipo_static_libraries(srcroot, dstroot, libs):
-    universal_dir = os.path.join(dstroot, "universal")
-    try:
-        os.makedirs(os.path.join(universal_dir, "lib"))
-        os.makedirs(os.path.join(universal_dir, "include", "opencv2"))
-    except OSError:
-        pass
-
-    armv7_dir = os.path.join(dstroot, "build", "armv7", "iPhoneOS", "lib", "Release")
-    armv7s_dir = os.path.join(dstroot, "build", "armv7s", "iPhoneOS", "lib", "Release")
+def lipo_jobs(dstroot, target, archs, libs, libdir, depends_on):
+    "returns a Job per library, lipo'ing its per-arch builds into libdir once the builds are done"
+    jobs = []
     for lib in libs:
         libname = "libopencv_{l}.a".format(l=lib)
-        os.system("/Applications/Xcode.app/Contents/Developer/Platforms/iPhoneOS.platform/Developer/usr/bin/lipo -create {v7}/{l} -arch armv7s {v7s}/{l} -output {u}/lib/{l}".format(v7=armv7_dir, v7s=armv7s_dir, u=universal_dir, l=libname))
+        inputs = " ".join("-arch {a} {d}/{l}".format(a=arch, d=os.path.join(dstroot, "build", arch, target, "lib", "Release"), l=libname) for arch in archs)
+        jobs.append(Job("lipo " + libname, ["xcrun -sdk {s} lipo -create {i} -output {o}".format(s=target.lower(), i=inputs, o=os.path.join(libdir, libname))],
+                        depends_on=depends_on))
+    return jobs
+
+def run_build_jobs(jobs, log_dir):
+    "runs the jobs, concurrently where their dependencies allow; raises BuildError, with the log's tail, if any fails"
+    def on_start(job):
+        print "Started", job.name
 
-    include_dir = os.path.join(dstroot, "build", "armv7", "iPhoneOS", "install", "include", "opencv2")
+    def on_finish(job):
+        print "Finished %s in %.1fs" % (job.name, job.duration)
+
+    try:
+        run_jobs(jobs, log_dir=log_dir, on_start=on_start, on_finish=on_finish)
+    except JobFailed as e:
+        print e.job.log_tail()
+        raise BuildError(str(e))
+    finally:
+        for job in jobs:
+            if job.start_time is not None and job.end_time is not None:
+                tracer.add_process(job.name, job.start_time, job.end_time, job.returncode,
+                                   job.cpu_time, max_rss_kb(job.max_rusage), log=job.log_path)
+
+def install_universal(dstroot, libdir, includedir, libs):
+    "brings <dstroot>/universal up to date with the universal libraries in libdir and their headers in includedir (.../include/opencv2)"
+    universal_dir = os.path.join(dstroot, "universal")
+    copied = removed = 0
     for lib in libs:
-        dst = os.path.join(universal_dir, "include", "opencv2", lib)
-        try:
-            shutil.rmtree(dst)
-        except OSError:
-            pass
-        shutil.copytree(os.path.join(include_dir, lib), dst)
+        libname = "libopencv_{l}.a".format(l=lib)
+        copied += sync_file(os.path.join(libdir, libname), os.path.join(universal_dir, "lib", libname))
+        lib_copied, lib_removed = sync_tree(os.path.join(includedir, lib), os.path.join(universal_dir, "include", "opencv2", lib))
+        copied += lib_copied
+        removed += lib_removed
+    copied += sync_file(os.path.join(includedir, "opencv.hpp"), os.path.join(universal_dir, "include", "opencv2", "opencv.hpp"))
 
-    shutil.copyfile(os.path.join(include_dir, "opencv.hpp"), os.path.join(universal_dir, "include", "opencv2", "opencv.hpp"))
+    print "WROTE TO", universal_dir, "(%d files updated, %d removed)" % (copied, removed)
 
-    print "WROTE TO", universal_dir
+def fetch_from_cache(cache, keys, productsdir, libs):
+    "fetches the universal libraries and headers into productsdir; returns False unless all of them were cached"
+    libdir = os.path.join(productsdir, "lib")
+    for lib in libs:
+        libname = "libopencv_{l}.a".format(l=lib)
+        if not cache.fetch(keys[libname], libname, libdir):
+            return False
+    if not cache.fetch(keys[HEADERS_ARCHIVE_NAME], HEADERS_ARCHIVE_NAME, productsdir):
+        return False
+    shutil.rmtree(os.path.join(productsdir, "include"), True)
+    archive = tarfile.open(os.path.join(productsdir, HEADERS_ARCHIVE_NAME))
+    try:
+        archive.extractall(productsdir)
+    finally:
+        archive.close()
+    return True
 
+def store_in_cache(cache, keys, productsdir, includedir, libs):
+    "stores the universal libraries, and the headers they need, in the cache"
+    for lib in libs:
+        libname = "libopencv_{l}.a".format(l=lib)
+        cache.store(keys[libname], os.path.join(productsdir, "lib", libname))
+    archive_path = os.path.join(productsdir, HEADERS_ARCHIVE_NAME)
+    archive = tarfile.open(archive_path, "w")
+    try:
+        for name in list(libs) + ["opencv.hpp"]:
+            archive.add(os.path.join(includedir, name), arcname=os.path.join("include", "opencv2", name))
+    finally:
+        archive.close()
+    cache.store(keys[HEADERS_ARCHIVE_NAME], archive_path)
+    cache.evict()
 
-def build_framework(srcroot, dstroot):
+def build_framework(srcroot, dstroot, use_cache=True):
     "main function to do all the work"
     
     # for target in ["iPhoneOS", "iPhoneSimulator"]:
     #     build_opencv(srcroot, os.path.join(dstroot, "build"), target)
-    for arch in ("armv7", "armv7s"):
-        build_opencv(srcroot, os.path.join(dstroot, "build", arch), "iPhoneOS", arch=arch)
+    archs, libs, target = ARCHS, LIBS, TARGET
+    productsdir = os.path.join(dstroot, "build", "universal")
+    libdir = os.path.join(productsdir, "lib")
+    if not os.path.isdir(libdir):
+        os.makedirs(libdir)
+
+    cache = ArtifactCache(os.path.join(cache_directory(), "opencv")) if use_cache else None
+    if cache:
+        with tracer.phase("cache lookup"):
+            keys = cache_keys(srcroot, target, archs, libs)
+            cached = fetch_from_cache(cache, keys, productsdir, libs)
+    else:
+        cached = False
+
+    if cached:
+        print "Reusing cached universal libraries and headers"
+        includedir = os.path.join(productsdir, "include", "opencv2")
+    else:
+        # the builds share the machine, so split xcodebuild's jobs between them
+        xcode_jobs = max(1, multiprocessing.cpu_count() // len(archs))
+        jobs = [build_opencv(srcroot, os.path.join(dstroot, "build", arch), target, arch=arch, xcode_jobs=xcode_jobs) for arch in archs]
+        jobs += lipo_jobs(dstroot, target, archs, libs, libdir, depends_on=[job.name for job in jobs])
+        with tracer.phase("build %s" % " ".join(archs)):
+            run_build_jobs(jobs, os.path.join(dstroot, "build", "logs"))
+        includedir = os.path.join(dstroot, "build", archs[0], target, "install", "include", "opencv2")
+        if cache:
+            with tracer.phase("cache store"):
+                store_in_cache(cache, keys, productsdir, includedir, libs)
 
     # put_framework_together(srcroot, dstroot)
-    libs = ["core", "imgproc"]
-    lipo_static_libraries(srcroot, dstroot, libs)
+    with tracer.phase("install libraries and headers"):
+        install_universal(dstroot, libdir, includedir, libs)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print "Usage:\n\t./build_framework.py <outputdir>\n\n"
+    args = sys.argv[1:]
+    trace = "--trace" in args
+    if trace:
+        args.remove("--trace")
+    use_cache = "--no-cache" not in args
+    if not use_cache:
+        args.remove("--no-cache")
+    srcroot = os.path.join(os.path.dirname(sys.argv[0]), "..")
+    if "--srcroot" in args[:-1]:
+        srcroot = args.pop(args.index("--srcroot") + 1)
+        args.remove("--srcroot")
+    if len(args) != 1:
+        print "Usage:\n\t./build_framework.py [--trace] [--no-cache] [--srcroot <opencvdir>] <outputdir>\n\n"
         sys.exit(0)
     
-    build_framework(os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), "..")), os.path.abspath(sys.argv[1]))
+    dstroot = os.path.abspath(args[0])
+    try:
+        build_framework(os.path.abspath(srcroot), dstroot, use_cache)
+    except BuildError as e:
+        print "BUILD FAILED:", e
+        sys.exit(1)
+    finally:
+        if trace:
+            trace_path, summary_path = tracer.write(os.path.join(dstroot, "trace"))
+            print "\n".join(tracer.summary_lines())
+            print "WROTE TRACE TO", trace_path
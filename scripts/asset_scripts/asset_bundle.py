@@ -0,0 +1,568 @@
+#!/usr/bin/env python
+"""
+Read and write indexed asset bundles, the format that generate_asset_bundle.py embeds in CardIOBundle.m.
+
+All integers are little-endian.
+
+    header    magic "CIAB", u16 version, u16 header size, u32 entry count, u32 index offset,
+              u32 names offset, u32 names length, u32 payload offset, u32 payload length
+    index     one entry per asset, sorted by path (bytewise, i.e., as strcmp sorts):
+              u32 name offset, u32 name length, u32 payload offset, u32 stored length, u32 length,
+              u16 codec, u16 reserved, u8[20] SHA-1 of the asset's contents
+    names     the paths, UTF-8 and NUL-terminated
+    payloads  each asset's contents, either stored as is (CODEC_STORED) or compressed (CODEC_LZSS)
+
+Name and payload offsets in the index are relative to the start of their sections. An asset can be found with a
+binary search of the index, and decoded on its own, without touching any other asset. Assets with the same
+contents (e.g., images that optimize_png.py made identical) share one payload.
+
+CODEC_LZSS is a plain LZSS: a flag byte, then 8 items, each a literal byte (flag bit 0, least significant bit first)
+or a big-endian u16 back-reference (flag bit 1): 12 bits of distance - 1, then 4 bits of length - 3.
+It needs no library on either side: see the decoder in the generated CardIOBundle.m.
+
+A bundle's digest is the SHA-1 of every (path, SHA-1) pair in its index. When the runtime expands a bundle into
+a directory (for -[CardIOBundle NSBundle]), it leaves a stamp file there: the digest, then the SHA-1 and path of
+every asset. Comparing the stamp's digest tells whether the directory is current; if it is not, only the assets
+whose SHA-1 changed are decoded and written, into a fresh directory that then replaces the old one.
+expand_bundle() does the same, so that the logic can be exercised here.
+
+Example:
+    ./asset_bundle.py ../../Classes/CardIOBundle.m --list
+    ./asset_bundle.py ../../Classes/CardIOBundle.m --verify ../../assets
+    ./asset_bundle.py ../../Classes/CardIOBundle.m --expand /tmp/CardIOBundle.bundle
+"""
+
+import argparse
+import collections
+import hashlib
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+
+
+MAGIC = "CIAB"
+VERSION = 1
+
+HEADER_FORMAT = "<4sHHIIIIII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+INDEX_ENTRY_FORMAT = "<IIIIIHH20s"
+INDEX_ENTRY_SIZE = struct.calcsize(INDEX_ENTRY_FORMAT)
+
+CODEC_STORED = 0
+CODEC_LZSS = 1
+
+LZSS_WINDOW = 4096
+LZSS_MIN_MATCH = 3
+LZSS_MAX_MATCH = 18
+LZSS_MAX_CANDIDATES = 32
+
+IGNORED_FILE_NAMES = frozenset([".DS_Store"])
+
+# Assets that the runtime reads in place (e.g., string tables), so they are never compressed
+STORED_EXTENSIONS = (".table",)
+
+STAMP_FILE_NAME = ".bundle_stamp"  # a dot file, so it can never collide with an asset
+STAMP_DIGEST_PREFIX = "digest "
+
+
+class AssetBundleError(ValueError):
+    pass
+
+
+class AssetEntry(collections.namedtuple("AssetEntry", "path payload_offset stored_length length codec sha1")):
+    """
+    One index entry. sha1 is the raw (20-byte) digest of the asset's decoded contents.
+    """
+    __slots__ = ()
+
+    @property
+    def hex_sha1(self):
+        return self.sha1.encode("hex")
+
+
+# --- LZSS -------------------------------------------------------------------
+
+def lzss_compress(data):
+    """
+    Return data, LZSS-compressed (greedy longest match within the window).
+    """
+    source = bytearray(data)
+    length = len(source)
+    out = bytearray()
+    chains = {}  # 3-byte prefix -> positions where it occurs, oldest first
+
+    def remember(position):
+        if position + LZSS_MIN_MATCH <= length:
+            positions = chains.setdefault(data[position:position + LZSS_MIN_MATCH], [])
+            positions.append(position)
+            if len(positions) > LZSS_MAX_CANDIDATES:
+                del positions[0]
+
+    position = 0
+    while position < length:
+        flags_index = len(out)
+        out.append(0)
+        flags = 0
+        for bit in range(8):
+            if position >= length:
+                break
+            best_length, best_distance = 0, 0
+            longest_possible = min(LZSS_MAX_MATCH, length - position)
+            if longest_possible >= LZSS_MIN_MATCH:
+                for candidate in reversed(chains.get(data[position:position + LZSS_MIN_MATCH], ())):
+                    distance = position - candidate
+                    if distance > LZSS_WINDOW:
+                        break
+                    match_length = LZSS_MIN_MATCH
+                    while match_length < longest_possible and source[candidate + match_length] == source[position + match_length]:
+                        match_length += 1
+                    if match_length > best_length:
+                        best_length, best_distance = match_length, distance
+                        if match_length == longest_possible:
+                            break
+            if best_length >= LZSS_MIN_MATCH:
+                flags |= 1 << bit
+                token = ((best_distance - 1) << 4) | (best_length - LZSS_MIN_MATCH)
+                out.append(token >> 8)
+                out.append(token & 0xFF)
+                advance = best_length
+            else:
+                out.append(source[position])
+                advance = 1
+            for skipped in range(position, position + advance):
+                remember(skipped)
+            position += advance
+        out[flags_index] = flags
+    return str(out)
+
+
+def lzss_decompress(data, length):
+    """
+    Return the `length` bytes that data decodes to. Raises AssetBundleError for malformed input.
+    """
+    source = bytearray(data)
+    out = bytearray()
+    index = 0
+    while len(out) < length:
+        if index >= len(source):
+            raise AssetBundleError("truncated LZSS stream")
+        flags = source[index]
+        index += 1
+        for bit in range(8):
+            if len(out) >= length:
+                break
+            if flags & (1 << bit):
+                if index + 2 > len(source):
+                    raise AssetBundleError("truncated LZSS stream")
+                token = (source[index] << 8) | source[index + 1]
+                index += 2
+                distance = (token >> 4) + 1
+                count = (token & 0xF) + LZSS_MIN_MATCH
+                if distance > len(out) or count > length - len(out):
+                    raise AssetBundleError("LZSS back-reference out of range")
+                for unused in range(count):
+                    out.append(out[-distance])
+            else:
+                if index >= len(source):
+                    raise AssetBundleError("truncated LZSS stream")
+                out.append(source[index])
+                index += 1
+    if index != len(source):
+        raise AssetBundleError("trailing bytes after LZSS stream")
+    return str(out)
+
+
+# --- Writing ----------------------------------------------------------------
+
+def collect_assets(assets_directory):
+    """
+    Return [(path relative to assets_directory, with '/' separators, full path)] for every asset file.
+    """
+    assets = []
+    for directory, subdirectories, files in os.walk(assets_directory):
+        subdirectories[:] = sorted(d for d in subdirectories if not d.startswith("."))
+        for filename in sorted(files):
+            if filename not in IGNORED_FILE_NAMES and not filename.startswith("."):
+                full_path = os.path.join(directory, filename)
+                assets.append((os.path.relpath(full_path, assets_directory).replace(os.sep, "/"), full_path))
+    return assets
+
+
+def encode_payload(contents, compress=True):
+    """
+    Return (codec, stored bytes): compressed, unless that does not make it smaller (e.g., a PNG).
+    """
+    if not compress:
+        return CODEC_STORED, contents
+    compressed = lzss_compress(contents)
+    if len(compressed) < len(contents):
+        return CODEC_LZSS, compressed
+    return CODEC_STORED, contents
+
+
+def build_bundle(assets):
+    """
+    Return the bundle (a byte string) for assets, an iterable of (path, contents).
+    """
+    assets = sorted((path.encode("utf-8") if isinstance(path, unicode) else path, contents) for path, contents in assets)
+    paths = [path for path, unused in assets]
+    if len(set(paths)) != len(paths):
+        raise AssetBundleError("duplicate asset paths")
+
+    index = []
+    names = []
+    payloads = []
+    shared_payloads = {}  # (compress, SHA-1 of the contents): (codec, offset, stored length)
+    names_length = 0
+    payload_length = 0
+    for path, contents in assets:
+        if "\0" in path:
+            raise AssetBundleError("asset path {0!r} contains a NUL".format(path))
+        compress = not path.endswith(STORED_EXTENSIONS)
+        sha1 = hashlib.sha1(contents).digest()
+        if (compress, sha1) not in shared_payloads:
+            codec, stored = encode_payload(contents, compress)
+            shared_payloads[compress, sha1] = (codec, payload_length, len(stored))
+            payloads.append(stored)
+            payload_length += len(stored)
+        codec, offset, stored_length = shared_payloads[compress, sha1]
+        index.append(struct.pack(INDEX_ENTRY_FORMAT, names_length, len(path), offset, stored_length, len(contents),
+                                 codec, 0, sha1))
+        names.append(path + "\0")
+        names_length += len(path) + 1
+
+    index_offset = HEADER_SIZE
+    names_offset = index_offset + len(index) * INDEX_ENTRY_SIZE
+    payload_offset = names_offset + names_length
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, HEADER_SIZE, len(index), index_offset,
+                         names_offset, names_length, payload_offset, payload_length)
+    return "".join([header] + index + names + payloads)
+
+
+def read_assets(assets_directory):
+    """
+    Return [(path, contents)] for every asset file (see collect_assets).
+    """
+    assets = []
+    for path, full_path in collect_assets(assets_directory):
+        with open(full_path, "rb") as f:
+            assets.append((path, f.read()))
+    return assets
+
+
+def build_bundle_from_directory(assets_directory):
+    return build_bundle(read_assets(assets_directory))
+
+
+# --- Reading ----------------------------------------------------------------
+
+class AssetBundle(object):
+    """
+    Random access to the assets in a bundle. Only the header is parsed up front; each lookup is a binary search
+    of the index, and each read decodes just that one asset.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        if len(data) < HEADER_SIZE:
+            raise AssetBundleError("bundle is too short for its header")
+        (magic, version, header_size, self.entry_count, self.index_offset, self.names_offset, self.names_length,
+         self.payload_offset, self.payload_length) = struct.unpack_from(HEADER_FORMAT, data, 0)
+        if magic != MAGIC:
+            raise AssetBundleError("not an asset bundle (magic {0!r})".format(magic))
+        if version != VERSION or header_size != HEADER_SIZE:
+            raise AssetBundleError("unsupported asset bundle version {0}".format(version))
+        if (self.index_offset + self.entry_count * INDEX_ENTRY_SIZE > len(data) or
+                self.names_offset + self.names_length > len(data) or
+                self.payload_offset + self.payload_length > len(data)):
+            raise AssetBundleError("asset bundle sections extend past its end")
+        if self.names_length and data[self.names_offset + self.names_length - 1] != "\0":
+            raise AssetBundleError("asset bundle names are not NUL-terminated")
+
+    def __len__(self):
+        return self.entry_count
+
+    def _name(self, index):
+        name_offset, name_length = struct.unpack_from("<II", self.data, self.index_offset + index * INDEX_ENTRY_SIZE)
+        start = self.names_offset + name_offset
+        return self.data[start:start + name_length]
+
+    def entry_at(self, index):
+        (unused, unused, payload_offset, stored_length, length, codec, unused,
+         sha1) = struct.unpack_from(INDEX_ENTRY_FORMAT, self.data, self.index_offset + index * INDEX_ENTRY_SIZE)
+        return AssetEntry(self._name(index), payload_offset, stored_length, length, codec, sha1)
+
+    def find(self, path):
+        """
+        Return the AssetEntry for path, or None.
+        """
+        if isinstance(path, unicode):
+            path = path.encode("utf-8")
+        low, high = 0, self.entry_count
+        while low < high:
+            middle = (low + high) // 2
+            name = self._name(middle)
+            if path == name:
+                return self.entry_at(middle)
+            if path < name:
+                high = middle
+            else:
+                low = middle + 1
+        return None
+
+    def paths(self):
+        return [self._name(index) for index in range(self.entry_count)]
+
+    def entries(self):
+        return [self.entry_at(index) for index in range(self.entry_count)]
+
+    def read_entry(self, entry, verify=True):
+        if entry.payload_offset + entry.stored_length > self.payload_length:
+            raise AssetBundleError("payload of {0} extends past the bundle".format(entry.path))
+        start = self.payload_offset + entry.payload_offset
+        stored = self.data[start:start + entry.stored_length]
+        if entry.codec == CODEC_STORED:
+            contents = stored
+        elif entry.codec == CODEC_LZSS:
+            contents = lzss_decompress(stored, entry.length)
+        else:
+            raise AssetBundleError("unknown codec {0} for {1}".format(entry.codec, entry.path))
+        if len(contents) != entry.length:
+            raise AssetBundleError("{0} decoded to {1} bytes rather than {2}".format(entry.path, len(contents), entry.length))
+        if verify and hashlib.sha1(contents).digest() != entry.sha1:
+            raise AssetBundleError("SHA-1 mismatch for {0}".format(entry.path))
+        return contents
+
+    def read(self, path, verify=True):
+        """
+        Return the contents of the asset at path. Raises KeyError if there is no such asset.
+        """
+        entry = self.find(path)
+        if entry is None:
+            raise KeyError(path)
+        return self.read_entry(entry, verify)
+
+
+def bundle_digest(bundle):
+    """
+    Return the hex digest that identifies the bundle's contents: the SHA-1 of each path, a NUL and its SHA-1.
+    """
+    digest = hashlib.sha1()
+    for entry in bundle.entries():
+        digest.update(entry.path + "\0" + entry.sha1)
+    return digest.hexdigest()
+
+
+def stamp_text(bundle):
+    """
+    Return the stamp file for a directory holding the expanded bundle.
+    """
+    lines = [STAMP_DIGEST_PREFIX + bundle_digest(bundle)]
+    lines.extend("{0} {1}".format(entry.hex_sha1, entry.path) for entry in bundle.entries())
+    return "\n".join(lines) + "\n"
+
+
+def read_stamp(directory):
+    """
+    Return (digest, {path: hex SHA-1}) from the stamp in directory, or (None, None) if there is no valid stamp.
+    """
+    try:
+        with open(os.path.join(directory, STAMP_FILE_NAME), "r") as f:
+            lines = f.read().splitlines()
+    except IOError:
+        return None, None
+    if not lines or not lines[0].startswith(STAMP_DIGEST_PREFIX):
+        return None, None
+    hashes = {}
+    for line in lines[1:]:
+        sha1, space, path = line.partition(" ")
+        if space:
+            hashes[path] = sha1
+    return lines[0][len(STAMP_DIGEST_PREFIX):], hashes
+
+
+def _hex_sha1_of_file(path):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except IOError:
+        return None
+
+
+def expand_bundle(bundle, directory):
+    """
+    Bring directory up to date with bundle, as the runtime does; return (written paths, reused paths).
+
+    Nothing is touched if the stamp's digest matches. Otherwise, the assets are assembled in a fresh sibling
+    directory: unchanged ones (by the stamp or, without a stamp, by hashing the existing file) are moved over,
+    changed ones are decoded and written. The stamp is written last, and the fresh directory then replaces
+    the old one, so an interrupted expansion never leaves a stamped but incomplete directory behind.
+    """
+    digest = bundle_digest(bundle)
+    existing_digest, stamped_hashes = read_stamp(directory)
+    if existing_digest == digest:
+        return [], []
+
+    parent = os.path.dirname(os.path.abspath(directory))
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    for name in os.listdir(parent):
+        # left behind by an expansion that was interrupted
+        if name.startswith(os.path.basename(directory) + "."):
+            shutil.rmtree(os.path.join(parent, name), True)
+    temporary_directory = tempfile.mkdtemp(dir=parent, prefix=os.path.basename(directory) + ".", suffix=".tmp")
+    written, reused = [], []
+    try:
+        for entry in bundle.entries():
+            if ".." in entry.path.split("/"):
+                raise AssetBundleError("unsafe asset path {0}".format(entry.path))
+            existing_path = os.path.join(directory, *entry.path.split("/"))
+            new_path = os.path.join(temporary_directory, *entry.path.split("/"))
+            if not os.path.isdir(os.path.dirname(new_path)):
+                os.makedirs(os.path.dirname(new_path))
+
+            if stamped_hashes is not None:
+                existing_sha1 = stamped_hashes.get(entry.path)
+            else:
+                existing_sha1 = _hex_sha1_of_file(existing_path)
+            if existing_sha1 == entry.hex_sha1 and os.path.isfile(existing_path):
+                os.rename(existing_path, new_path)
+                reused.append(entry.path)
+            else:
+                with open(new_path, "wb") as f:
+                    f.write(bundle.read_entry(entry))
+                written.append(entry.path)
+
+        with open(os.path.join(temporary_directory, STAMP_FILE_NAME), "w") as f:
+            f.write(stamp_text(bundle))
+
+        old_directory = None
+        if os.path.exists(directory):
+            old_directory = tempfile.mkdtemp(dir=parent, prefix=os.path.basename(directory) + ".", suffix=".old")
+            os.rmdir(old_directory)
+            os.rename(directory, old_directory)
+        os.rename(temporary_directory, directory)
+        if old_directory:
+            shutil.rmtree(old_directory, True)
+    except Exception:
+        shutil.rmtree(temporary_directory, True)
+        raise
+    return written, reused
+
+
+DATA_ARRAY_RE = re.compile(r"static const uint8_t \w+_data\[(\d+)\] = \{[^\n]*\n(.*?)\n\};", re.S)
+
+
+def read_objc_bundle(source_path):
+    """
+    Return the bundle bytes embedded in a generated Objective-C file (e.g., Classes/CardIOBundle.m).
+    """
+    with open(source_path, "r") as f:
+        source = f.read()
+    m = DATA_ARRAY_RE.search(source)
+    if not m:
+        raise AssetBundleError("{0} does not contain a generated asset bundle".format(source_path))
+    data = "".join(chr(int(byte, 16)) for byte in re.findall(r"0x([0-9A-Fa-f]{2})", m.group(2)))
+    if len(data) != int(m.group(1)):
+        raise AssetBundleError("{0} declares {1} bytes but contains {2}".format(source_path, m.group(1), len(data)))
+    return data
+
+
+def load_bundle(path):
+    """
+    Open a bundle from either a raw bundle file or a generated Objective-C file.
+    """
+    if path.endswith((".m", ".mm")):
+        return AssetBundle(read_objc_bundle(path))
+    with open(path, "rb") as f:
+        return AssetBundle(f.read())
+
+
+def differences(bundle, assets):
+    """
+    Return a message for every asset that differs between bundle and assets, [(path, contents)] (round-trip check).
+    """
+    messages = []
+    expected = dict(assets)
+    for path in bundle.paths():
+        if path not in expected:
+            messages.append("{0} is in the bundle but not in the assets".format(path))
+            continue
+        contents = expected.pop(path)
+        try:
+            if bundle.read(path) != contents:
+                messages.append("{0} differs from the asset".format(path))
+        except AssetBundleError as e:
+            messages.append(str(e))
+    for path in sorted(expected):
+        messages.append("{0} is missing from the bundle".format(path))
+    return messages
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("bundle", help="a bundle file, or a generated Objective-C file (e.g., 'Classes/CardIOBundle.m')")
+    parser.add_argument("--list", action="store_true", help="list the assets, their sizes and codecs")
+    parser.add_argument("--extract", metavar="DIRECTORY", help="write every asset into DIRECTORY")
+    parser.add_argument("--verify", metavar="ASSETS_DIRECTORY", help="confirm the bundle holds exactly what generate_asset_bundle.py makes of ASSETS_DIRECTORY")
+    parser.add_argument("--unoptimized-images", action="store_true", help="with --verify: the bundle was generated with --no-optimize-images")
+    parser.add_argument("--digest", action="store_true", help="print the bundle's content digest")
+    parser.add_argument("--expand", metavar="DIRECTORY", help="bring DIRECTORY up to date with the bundle, as the runtime does")
+    args = parser.parse_args(argv)
+
+    try:
+        bundle = load_bundle(args.bundle)
+        entries = bundle.entries()
+        for entry in entries:
+            bundle.read_entry(entry)
+    except (AssetBundleError, IOError) as e:
+        print "[{0}] is not a valid asset bundle: {1}".format(args.bundle, e)
+        return 1
+
+    if args.list:
+        for entry in entries:
+            codec = "lzss" if entry.codec == CODEC_LZSS else "stored"
+            print "{0:>8} {1:>8} {2:<6} {3} {4}".format(entry.length, entry.stored_length, codec, entry.hex_sha1, entry.path)
+        print "{0} assets, {1} bytes decoded, {2} bytes in the bundle".format(
+            len(entries), sum(entry.length for entry in entries), len(bundle.data))
+
+    if args.extract:
+        for entry in entries:
+            path = os.path.join(args.extract, *entry.path.split("/"))
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, "wb") as f:
+                f.write(bundle.read_entry(entry))
+
+    if args.digest:
+        print bundle_digest(bundle)
+
+    if args.expand:
+        written, reused = expand_bundle(bundle, args.expand)
+        if not written and not reused:
+            print "[{0}] is up to date".format(args.expand)
+        else:
+            for path in written:
+                print "wrote {0}".format(path)
+            print "[{0}] updated: {1} assets written, {2} reused".format(args.expand, len(written), len(reused))
+
+    if args.verify:
+        from generate_asset_bundle import bundle_assets
+        messages = differences(bundle, bundle_assets(args.verify, not args.unoptimized_images))
+        for message in messages:
+            print message
+        if messages:
+            return 1
+        print "[{0}] matches {1}".format(args.bundle, args.verify)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Encode the files in an assets directory as an indexed asset bundle, embedded in an Objective-C class.
+
+This replaces `bale assets/ Classes/ --overwrite-delay 0 -z -c CardIOBundle`. Rather than one property list
+that must be decoded (and written to the caches directory) as a whole at startup, the generated class finds
+each asset through a sorted index and decodes just that asset, the first time it is asked for.
+See asset_bundle.py for the format, and for a reader that can check the generated file.
+
+Besides the files in the assets directory, the bundle holds strings/strings.table, compiled from all the
+strings/<language>.strings files: see scripts/string_scripts/string_tables.py.
+
+Images are bundled as optimize_png.py re-encodes them (losslessly, and cached between runs), unless
+--no-optimize-images is given; images with the same pixels then share one payload.
+
+Example (from the top directory):
+    scripts/asset_scripts/generate_asset_bundle.py assets/ Classes/ -c CardIOBundle
+"""
+
+import argparse
+import os
+import string
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from asset_bundle import AssetBundle, build_bundle, bundle_digest, collect_assets, read_assets
+from optimize_png import PngCache, optimize_pngs
+from string_scripts.strings_index import STRINGS_EXTENSION
+from string_scripts.string_tables import STRING_TABLE_PATH, build_tables, filtered_strings
+
+
+TEMPLATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+HEADER_TEMPLATE = os.path.join(TEMPLATES_PATH, "AssetBundle.h.template")
+IMPLEMENTATION_TEMPLATE = os.path.join(TEMPLATES_PATH, "AssetBundle.m.template")
+
+BYTES_PER_LINE = 19
+
+
+def format_bytes(data):
+    lines = []
+    for start in range(0, len(data), BYTES_PER_LINE):
+        lines.append("  " + " ".join("0x{0:02X},".format(ord(byte)) for byte in data[start:start + BYTES_PER_LINE]))
+    return "\n".join(lines)
+
+
+def optimized_images(assets):
+    """
+    Return assets, [(path, contents)], with the contents of every PNG replaced by its optimized form.
+    """
+    optimized = dict((png.path, png.data) for png in
+                     optimize_pngs([(path, contents) for path, contents in assets if path.endswith(".png")], cache=PngCache())[0])
+    return [(path, optimized.get(path, contents)) for path, contents in assets]
+
+
+def bundle_assets(assets_directory, optimize_images=True):
+    """
+    Return [(path, contents)] for everything the bundle holds: the assets, and the string table compiled from them.
+    """
+    assets = read_assets(assets_directory)
+    if optimize_images:
+        assets = optimized_images(assets)
+    strings_by_language = dict((path[len("strings/"):-len(STRINGS_EXTENSION)], filtered_strings(contents))
+                               for path, contents in assets
+                               if path.startswith("strings/") and path.endswith(STRINGS_EXTENSION) and "/" not in path[len("strings/"):])
+    if strings_by_language:
+        assets.append((STRING_TABLE_PATH, build_tables(strings_by_language)))
+    return assets
+
+
+def known_image_paths(assets_directory):
+    """
+    The images that -imageNamed: should find, by their plain names (e.g., "card_io_logo.png" but not "card_io_logo@2x.png").
+    """
+    return [path for path, unused in collect_assets(assets_directory)
+            if path.endswith(".png") and "@" not in os.path.basename(path) and "~" not in os.path.basename(path)]
+
+
+def generate_sources(assets_directory, class_name, command, optimize_images=True):
+    """
+    Return (header source, implementation source) for the bundle of assets_directory.
+    """
+    assets = bundle_assets(assets_directory, optimize_images)
+    data = build_bundle(assets)
+    substitutions = {
+        "class_name": class_name,
+        "command": command,
+        "data_length": len(data),
+        "data_bytes": format_bytes(data),
+        "digest": bundle_digest(AssetBundle(data)),
+        "asset_count": len(assets),
+        "known_image_paths": "\n".join('    @"{0}",'.format(path) for path in known_image_paths(assets_directory)),
+    }
+    with open(HEADER_TEMPLATE, "r") as f:
+        header = string.Template(f.read()).substitute(substitutions)
+    with open(IMPLEMENTATION_TEMPLATE, "r") as f:
+        implementation = string.Template(f.read()).substitute(substitutions)
+    return header, implementation
+
+
+def generate_asset_bundle(assets_directory, output_directory, class_name, command, optimize_images=True):
+    header, implementation = generate_sources(assets_directory, class_name, command, optimize_images)
+    for extension, source in ((".h", header), (".m", implementation)):
+        with open(os.path.join(output_directory, class_name + extension), "w") as f:
+            f.write(source)
+    return 0
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("assets_directory", help="path to the assets (e.g., 'assets/')")
+    parser.add_argument("output_directory", help="where to write <class>.h and <class>.m (e.g., 'Classes/')")
+    parser.add_argument("-c", "--class-name", default="CardIOBundle", help="name of the generated class (default CardIOBundle)")
+    parser.add_argument("--no-optimize-images", dest="optimize_images", action="store_false",
+                        help="bundle the images exactly as they are in the assets directory")
+    args = parser.parse_args(argv)
+
+    command = " ".join(["generate_asset_bundle.py"] + argv)
+    return generate_asset_bundle(args.assets_directory, args.output_directory, args.class_name, command, args.optimize_images)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
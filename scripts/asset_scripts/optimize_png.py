@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+"""
+Losslessly shrink PNG files, and find the ones whose pixels are identical.
+
+Each image is re-encoded with:
+  - only its critical chunks (and tRNS), and the chunks that give its color space (iCCP, gAMA, cHRM) unless that
+    is sRGB: text, timestamps and pHYs are dropped, and so are sRGB chunks and sRGB ICC profiles, since iOS draws
+    untagged images as sRGB. Other profiles are kept (e.g., Release/SampleApp's launch images are tagged with
+    "Generic RGB Profile"), so that the images look the same;
+  - the smallest color type that holds its pixels exactly: gray, gray and alpha, RGB, RGBA, or a palette of
+    at most 256 colors (with tRNS for the translucent ones);
+  - whichever scanline filtering (each of the five filters, or the best filter for each row) and zlib strategy
+    compresses smallest, at the highest compression level.
+The result is decoded and compared with the original's pixels; if they differ, or it is not smaller, the
+original is kept. Images that cannot be decoded here (interlaced, or not 8 bits per channel) are only stripped
+and recompressed.
+
+Re-encoding is deterministic, so images with the same pixels (and color space) come out byte-identical:
+generate_asset_bundle.py stores them once, and the report lists them as duplicates.
+
+Results are cached by the SHA-1 of the input (and OPTIMIZER_VERSION) in $CARDIO_CACHE_DIR/png, so only new
+or changed images are re-encoded; those are spread over a pool of processes.
+
+Example (from the top directory):
+    scripts/asset_scripts/optimize_png.py assets/ Release/SampleApp
+"""
+
+import argparse
+import collections
+import hashlib
+import multiprocessing
+import os
+import struct
+import sys
+import zlib
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from png_codec import (FILTER_TYPES, GRAY, GRAY_ALPHA, PALETTE, RGB, RGBA, PngError, PngHeader,
+                       encode_png, filter_row, image_data, png_chunks, png_header, read_png)
+from build_scripts.file_utils import cache_directory, write_atomically
+
+
+# Bump this when a change to the encoder should replace previously cached results.
+OPTIMIZER_VERSION = 2
+
+ZLIB_STRATEGIES = (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)
+ZLIB_MEMORY_LEVEL = 9
+
+MAX_PALETTE_COLORS = 256
+
+# The chunks that say how to interpret the colors; an sRGB chunk overrides them all
+COLOR_SPACE_CHUNK_TYPES = ("cHRM", "gAMA", "iCCP")
+
+
+class OptimizedPng(collections.namedtuple("OptimizedPng", "path original_length data pixels_sha1")):
+    __slots__ = ()
+
+    @property
+    def saved(self):
+        return self.original_length - len(self.data)
+
+
+def _compress(data, strategy):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS, ZLIB_MEMORY_LEVEL, strategy)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _adaptive_filter(candidates):
+    """
+    Of a row's filtered candidates, the one whose bytes, taken as signed, sum to the least: the usual heuristic.
+    """
+    return min(candidates, key=lambda row: sum(byte if byte < 128 else 256 - byte for byte in bytearray(row[1:])))
+
+
+def compress_scanlines(header, rows):
+    """
+    Return the smallest zlib stream of rows (unfiltered scanlines) over every filtering and strategy tried.
+    """
+    bytes_per_pixel = header.bytes_per_pixel
+    streams = dict((filter_type, []) for filter_type in FILTER_TYPES)
+    adaptive = []
+    previous = bytearray(len(rows[0]) if rows else 0)
+    for row in rows:
+        candidates = [chr(filter_type) + str(filter_row(filter_type, bytearray(row), previous, bytes_per_pixel))
+                      for filter_type in FILTER_TYPES]
+        for filter_type, candidate in zip(FILTER_TYPES, candidates):
+            streams[filter_type].append(candidate)
+        adaptive.append(_adaptive_filter(candidates))
+        previous = row
+    filterings = [streams[filter_type] for filter_type in FILTER_TYPES] + [adaptive]
+    return min((_compress("".join(filtering), strategy) for filtering in filterings for strategy in ZLIB_STRATEGIES), key=len)
+
+
+def reduced_encodings(width, height, rows):
+    """
+    Return [(header, unfiltered scanlines, palette, transparency)] for every color type worth trying for rows
+    (RGBA pixels): the smallest exact truecolor or gray type, and a palette if there are few enough colors.
+    """
+    pixels = "".join(str(row) for row in rows)
+    opaque = pixels[3::4] == "\xff" * (width * height)
+    gray = pixels[0::4] == pixels[1::4] == pixels[2::4]
+    if gray:
+        color_type = GRAY if opaque else GRAY_ALPHA
+    else:
+        color_type = RGB if opaque else RGBA
+
+    def truecolor_row(row):
+        if color_type == RGBA:
+            return row
+        if color_type == GRAY:
+            return row[0::4]
+        if color_type == GRAY_ALPHA:
+            reduced = bytearray(width * 2)
+            reduced[0::2], reduced[1::2] = row[0::4], row[3::4]
+            return reduced
+        reduced = bytearray(width * 3)
+        reduced[0::3], reduced[1::3], reduced[2::3] = row[0::4], row[1::4], row[2::4]
+        return reduced
+
+    encodings = [(PngHeader(width, height, 8, color_type, 0, 0, 0), [truecolor_row(row) for row in rows], "", "")]
+
+    if color_type != GRAY:  # a palette never beats one byte of gray per pixel
+        colors = set()
+        for start in xrange(0, len(pixels), 4):
+            colors.add(pixels[start:start + 4])
+            if len(colors) > MAX_PALETTE_COLORS:
+                break
+        else:
+            # Translucent colors first, so that tRNS can stop at the last of them
+            palette_colors = sorted(colors, key=lambda color: (color[3] == "\xff", color))
+            index = dict((color, i) for i, color in enumerate(palette_colors))
+            palette = "".join(color[:3] for color in palette_colors)
+            transparency = "".join(color[3] for color in palette_colors if color[3] != "\xff")
+            indexed_rows = [bytearray(chr(index[row[x:x + 4]]) for x in xrange(0, len(row), 4))
+                            for row in (str(row) for row in rows)]
+            encodings.append((PngHeader(width, height, 8, PALETTE, 0, 0, 0), indexed_rows, palette, transparency))
+
+    return encodings
+
+
+def _pixels_sha1(width, height, rows, color_space_chunks):
+    sha1 = hashlib.sha1("{0}x{1}\0".format(width, height))
+    for chunk_type, contents in color_space_chunks:
+        sha1.update("{0}{1}\0{2}".format(chunk_type, len(contents), contents))
+    for row in rows:
+        sha1.update(str(row))
+    return sha1.hexdigest()
+
+
+def icc_profile_description(profile):
+    """
+    Return the description (the 'desc' tag) of an ICC profile, e.g. "sRGB IEC61966-2.1", or None if it has none.
+    """
+    try:
+        tag_count = struct.unpack_from(">I", profile, 128)[0]
+        for i in xrange(tag_count):
+            signature, offset, size = struct.unpack_from(">4sII", profile, 132 + 12 * i)
+            if signature != "desc":
+                continue
+            tag = profile[offset:offset + size]
+            if tag.startswith("desc"):  # ICC v2: the length of an ASCII description, then the description
+                length = struct.unpack_from(">I", tag, 8)[0]
+                return tag[12:12 + length].rstrip("\0")
+            if tag.startswith("mluc"):  # ICC v4: localized UTF-16 descriptions; the first will do
+                record_count = struct.unpack_from(">I", tag, 8)[0]
+                if record_count:
+                    length, record_offset = struct.unpack_from(">II", tag, 20)
+                    return tag[record_offset:record_offset + length].decode("utf-16-be").encode("utf-8").rstrip("\0")
+    except (struct.error, UnicodeDecodeError):
+        pass
+    return None
+
+
+def color_space_chunks(chunks):
+    """
+    Return the chunks, of the [(chunk type, contents)] of a PNG, that tag it with a color space other than sRGB.
+    """
+    if any(chunk_type == "sRGB" for chunk_type, unused in chunks):
+        return []
+    for chunk_type, contents in chunks:
+        if chunk_type == "iCCP":
+            try:
+                profile = zlib.decompress(contents[contents.index("\0") + 2:])
+            except (ValueError, zlib.error):
+                break  # keep what cannot be read
+            if (icc_profile_description(profile) or "").startswith("sRGB"):
+                return []
+    return [(chunk_type, contents) for chunk_type, contents in chunks if chunk_type in COLOR_SPACE_CHUNK_TYPES]
+
+
+def _recompressed(data):
+    """
+    Strip and recompress a PNG that cannot be decoded here, keeping its filtered scanlines as they are.
+    """
+    chunks = png_chunks(data)
+    header = png_header(chunks)
+    palette = "".join(contents for chunk_type, contents in chunks if chunk_type == "PLTE")
+    transparency = "".join(contents for chunk_type, contents in chunks if chunk_type == "tRNS")
+    filtered = image_data(chunks)
+    compressed = min((_compress(filtered, strategy) for strategy in ZLIB_STRATEGIES), key=len)
+    return encode_png(header, compressed, palette, transparency, color_space_chunks(chunks))
+
+
+def optimize_png_data(data):
+    """
+    Return (optimized PNG, SHA-1 of its pixels or None if they could not be decoded). Raises PngError.
+    """
+    try:
+        width, height, rows = read_png(data)
+    except PngError:
+        header = png_header(png_chunks(data))
+        if header.bit_depth == 8 and not header.interlace:
+            raise  # a corrupt image, rather than an unsupported one
+        candidate = _recompressed(data)
+        return (candidate if len(candidate) < len(data) else data), None
+
+    color_space = color_space_chunks(png_chunks(data))
+    best = data
+    for header, reduced_rows, palette, transparency in reduced_encodings(width, height, rows):
+        candidate = encode_png(header, compress_scanlines(header, reduced_rows), palette, transparency, color_space)
+        if len(candidate) < len(best) and read_png(candidate)[2] == rows:
+            best = candidate
+    return best, _pixels_sha1(width, height, rows, color_space)
+
+
+def _optimize_item(item):
+    name, data = item
+    try:
+        optimized, pixels_sha1 = optimize_png_data(data)
+    except PngError as e:
+        return name, len(data), None, None, str(e)
+    return name, len(data), optimized, pixels_sha1, None
+
+
+class PngCache(object):
+    """
+    Optimized PNGs by the SHA-1 of the original: <directory>/<sha1>.png, plus <sha1>.pixels for the pixels' SHA-1.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(cache_directory(), "png")
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(data):
+        return hashlib.sha1("png-optimizer-v{0}\0{1}".format(OPTIMIZER_VERSION, data)).hexdigest()
+
+    def fetch(self, key):
+        """
+        Return (optimized PNG, pixels SHA-1 or None), or None on a miss.
+        """
+        try:
+            with open(os.path.join(self.directory, key + ".png"), "rb") as f:
+                data = f.read()
+            with open(os.path.join(self.directory, key + ".pixels"), "r") as f:
+                pixels_sha1 = f.read().strip() or None
+        except IOError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data, pixels_sha1
+
+    def store(self, key, data, pixels_sha1):
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            for extension, contents in ((".pixels", pixels_sha1 or ""), (".png", data)):  # .png last: it marks the entry complete
+                write_atomically(os.path.join(self.directory, key + extension), contents)
+        except (IOError, OSError):
+            pass  # only a cache
+
+
+def optimize_pngs(items, jobs=0, cache=None):
+    """
+    Optimize items, [(name, PNG data)], on jobs processes (default: one per CPU), through cache if given.
+
+    Returns ([OptimizedPng], [error message]), in the order of items; an item that is not a valid PNG has no OptimizedPng.
+    """
+    results = {}
+    errors = []
+    misses = []
+    for name, data in items:
+        key = PngCache.key(data)
+        cached = cache.fetch(key) if cache is not None else None
+        if cached is None:
+            misses.append((name, data, key))
+        else:
+            results[name] = OptimizedPng(name, len(data), cached[0], cached[1])
+
+    jobs = min(jobs or multiprocessing.cpu_count(), len(misses))
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            optimized = pool.map(_optimize_item, [(name, data) for name, data, unused in misses], chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        optimized = [_optimize_item((name, data)) for name, data, unused in misses]
+
+    for (name, unused, key), (unused, original_length, data, pixels_sha1, error) in zip(misses, optimized):
+        if error is not None:
+            errors.append("{0}: {1}".format(name, error))
+            continue
+        results[name] = OptimizedPng(name, original_length, data, pixels_sha1)
+        if cache is not None:
+            cache.store(key, data, pixels_sha1)
+
+    return [results[name] for name, unused in items if name in results], errors
+
+
+def optimize_files(paths, jobs=0, cache=None):
+    """
+    optimize_pngs for the files at paths. Nothing is written back to them.
+    """
+    items = []
+    for path in paths:
+        with open(path, "rb") as f:
+            items.append((path, f.read()))
+    return optimize_pngs(items, jobs, cache)
+
+
+def duplicate_groups(optimized_pngs):
+    """
+    Return [[path]] of the images that have the same pixels (and so the same optimized bytes), two or more to a group.
+    """
+    groups = collections.defaultdict(list)
+    for optimized in optimized_pngs:
+        groups[optimized.pixels_sha1 or hashlib.sha1(optimized.data).hexdigest()].append(optimized.path)
+    return sorted(group for group in groups.itervalues() if len(group) > 1)
+
+
+def png_paths(paths):
+    """
+    Expand paths (files and directories) into the PNG files they hold, sorted within each directory.
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, subdirectories, files in os.walk(path):
+                subdirectories[:] = sorted(d for d in subdirectories if not d.startswith("."))
+                found.extend(os.path.join(directory, filename) for filename in sorted(files) if filename.endswith(".png"))
+        else:
+            found.append(path)
+    return found
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="PNG files, or directories to search for them")
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="processes to optimize with (default: one per CPU)")
+    parser.add_argument("--in-place", action="store_true", help="replace each file that can be made smaller")
+    parser.add_argument("--no-cache", action="store_true", help="neither read nor update the cache of optimized images")
+    args = parser.parse_args(argv)
+
+    cache = None if args.no_cache else PngCache()
+    optimized_pngs, errors = optimize_files(png_paths(args.paths), args.jobs, cache)
+    for error in errors:
+        print error
+
+    for optimized in optimized_pngs:
+        if optimized.saved > 0:
+            print "{0:>8} -> {1:>8} ({2:5.1f}%) {3}".format(optimized.original_length, len(optimized.data),
+                                                            100.0 * optimized.saved / optimized.original_length, optimized.path)
+            if args.in_place:
+                write_atomically(optimized.path, optimized.data, os.stat(optimized.path).st_mode & 0777)
+
+    groups = duplicate_groups(optimized_pngs)
+    for group in groups:
+        print "same pixels: {0}".format(" ".join(group))
+    duplicates = set(path for group in groups for path in group[1:])
+
+    original_bytes = sum(optimized.original_length for optimized in optimized_pngs)
+    saved_bytes = sum(optimized.saved for optimized in optimized_pngs)
+    duplicate_bytes = sum(len(optimized.data) for optimized in optimized_pngs if optimized.path in duplicates)
+    print "{0} images, {1} bytes -> {2} bytes ({3} saved{4}); {5} more in {6} duplicates{7}".format(
+        len(optimized_pngs), original_bytes, original_bytes - saved_bytes, saved_bytes,
+        ", written" if args.in_place else "", duplicate_bytes, len(duplicates),
+        "; cache: {0} hits, {1} misses".format(cache.hits, cache.misses) if cache is not None else "")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
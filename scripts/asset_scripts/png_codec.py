@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+"""
+Read and write PNG files with nothing but zlib: what simulated_camera_frames.py needs to read frames, and what
+optimize_png.py needs to re-encode images.
+
+Any PNG can be split into its chunks, and any non-interlaced one into its unfiltered scanlines. Decoding to
+pixels (read_png) is supported for 8-bit, non-interlaced images of every color type, which covers our assets.
+"""
+
+import collections
+import struct
+import zlib
+
+
+PNG_SIGNATURE = "\x89PNG\r\n\x1a\n"
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}  # by color type
+
+# Color types
+GRAY = 0
+RGB = 2
+PALETTE = 3
+GRAY_ALPHA = 4
+RGBA = 6
+
+FILTER_TYPES = (0, 1, 2, 3, 4)  # none, sub, up, average, paeth
+
+
+class PngError(ValueError):
+    pass
+
+
+class PngHeader(collections.namedtuple("PngHeader", "width height bit_depth color_type compression filter_method interlace")):
+    __slots__ = ()
+
+    @property
+    def bytes_per_pixel(self):
+        """
+        The distance, in bytes, between a byte and the one the filters take as its left neighbor.
+        """
+        return max(1, PNG_CHANNELS[self.color_type] * self.bit_depth // 8)
+
+    @property
+    def stride(self):
+        """
+        The number of bytes in an unfiltered scanline.
+        """
+        return (self.width * PNG_CHANNELS[self.color_type] * self.bit_depth + 7) // 8
+
+
+def png_chunk(chunk_type, contents):
+    return (struct.pack(">I", len(contents)) + chunk_type + contents +
+            struct.pack(">I", zlib.crc32(chunk_type + contents) & 0xffffffff))
+
+
+def png_chunks(data):
+    """
+    Return [(chunk type, contents)] for every chunk of the PNG data, up to and including IEND.
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        raise PngError("not a PNG file")
+    chunks = []
+    position = len(PNG_SIGNATURE)
+    while position + 8 <= len(data):
+        length, chunk_type = struct.unpack_from(">I4s", data, position)
+        if position + 12 + length > len(data):
+            raise PngError("truncated {0} chunk".format(chunk_type))
+        chunks.append((chunk_type, data[position + 8:position + 8 + length]))
+        position += 12 + length
+        if chunk_type == "IEND":
+            break
+    return chunks
+
+
+def png_header(chunks):
+    for chunk_type, contents in chunks:
+        if chunk_type == "IHDR":
+            if len(contents) != 13:
+                raise PngError("IHDR chunk has {0} bytes".format(len(contents)))
+            header = PngHeader(*struct.unpack(">IIBBBBB", contents))
+            if header.color_type not in PNG_CHANNELS:
+                raise PngError("unknown color type {0}".format(header.color_type))
+            return header
+    raise PngError("PNG has no IHDR chunk")
+
+
+def image_data(chunks):
+    """
+    Return the decompressed contents of the IDAT chunks: the filtered scanlines.
+    """
+    try:
+        return zlib.decompress("".join(contents for chunk_type, contents in chunks if chunk_type == "IDAT"))
+    except zlib.error as e:
+        raise PngError("corrupt PNG image data: {0}".format(e))
+
+
+def _paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    if pb <= pc:
+        return b
+    return c
+
+
+def _unfilter(filter_type, row, previous, bytes_per_pixel):
+    if filter_type == 0:
+        return row
+    if filter_type == 2:
+        return bytearray((x + b) & 0xff for x, b in zip(row, previous))
+    for i in xrange(len(row)):
+        a = row[i - bytes_per_pixel] if i >= bytes_per_pixel else 0
+        if filter_type == 1:
+            row[i] = (row[i] + a) & 0xff
+        elif filter_type == 3:
+            row[i] = (row[i] + ((a + previous[i]) >> 1)) & 0xff
+        elif filter_type == 4:
+            c = previous[i - bytes_per_pixel] if i >= bytes_per_pixel else 0
+            row[i] = (row[i] + _paeth(a, previous[i], c)) & 0xff
+        else:
+            raise PngError("unknown PNG filter type {0}".format(filter_type))
+    return row
+
+
+def filter_row(filter_type, row, previous, bytes_per_pixel):
+    """
+    Return row (a bytearray) filtered with filter_type, against previous (the unfiltered row above it).
+    """
+    if filter_type == 0:
+        return row
+    if filter_type == 2:
+        return bytearray((x - b) & 0xff for x, b in zip(row, previous))
+    left = bytearray(bytes_per_pixel) + row[:-bytes_per_pixel]
+    if filter_type == 1:
+        return bytearray((x - a) & 0xff for x, a in zip(row, left))
+    if filter_type == 3:
+        return bytearray((x - ((a + b) >> 1)) & 0xff for x, a, b in zip(row, left, previous))
+    upper_left = bytearray(bytes_per_pixel) + previous[:-bytes_per_pixel]
+    return bytearray((x - _paeth(a, b, c)) & 0xff for x, a, b, c in zip(row, left, previous, upper_left))
+
+
+def scanlines(header, data):
+    """
+    Return the unfiltered scanlines (bytearrays, without their filter type bytes) of a non-interlaced image.
+    """
+    if header.interlace:
+        raise PngError("interlaced PNGs cannot be split into scanlines")
+    stride = header.stride
+    if len(data) < header.height * (stride + 1):
+        raise PngError("truncated PNG image data")
+    rows = []
+    previous = bytearray(stride)
+    for y in xrange(header.height):
+        start = y * (stride + 1)
+        row = _unfilter(ord(data[start]), bytearray(data[start + 1:start + 1 + stride]), previous, header.bytes_per_pixel)
+        previous = row
+        rows.append(row)
+    return rows
+
+
+def read_png(data):
+    """
+    Decode an 8-bit, non-interlaced PNG. Returns (width, height, rows), each row a bytearray of RGBA pixels.
+    """
+    chunks = png_chunks(data)
+    header = png_header(chunks)
+    if header.bit_depth != 8 or header.interlace:
+        raise PngError("unsupported PNG (bit depth {0}, color type {1}, interlace {2}); "
+                       "only 8-bit, non-interlaced PNGs can be decoded".format(header.bit_depth, header.color_type, header.interlace))
+    palette = "".join(contents for chunk_type, contents in chunks if chunk_type == "PLTE")
+    transparency = "".join(contents for chunk_type, contents in chunks if chunk_type == "tRNS")
+    rows = [_to_rgba(row, header.width, header.color_type, palette, transparency) for row in scanlines(header, image_data(chunks))]
+    return header.width, header.height, rows
+
+
+def _to_rgba(row, width, color_type, palette, transparency):
+    if color_type == RGBA:
+        return row
+    rgba = bytearray("\xff" * (width * 4))
+    if color_type == RGB:
+        rgba[0::4], rgba[1::4], rgba[2::4] = row[0::3], row[1::3], row[2::3]
+    elif color_type == GRAY:
+        rgba[0::4] = rgba[1::4] = rgba[2::4] = row
+    elif color_type == GRAY_ALPHA:
+        rgba[0::4] = rgba[1::4] = rgba[2::4] = row[0::2]
+        rgba[3::4] = row[1::2]
+    else:
+        for x, index in enumerate(row):
+            rgba[x * 4:x * 4 + 3] = palette[index * 3:index * 3 + 3]
+            if index < len(transparency):
+                rgba[x * 4 + 3] = transparency[index]
+    return rgba
+
+
+def encode_png(header, compressed_data, palette="", transparency="", color_space_chunks=()):
+    """
+    Return a PNG with just the critical chunks (and tRNS) for header and the compressed, filtered scanlines,
+    plus color_space_chunks, [(chunk type, contents)] such as iCCP or gAMA, which go before the palette.
+    """
+    chunks = [png_chunk("IHDR", struct.pack(">IIBBBBB", *header))]
+    chunks.extend(png_chunk(chunk_type, contents) for chunk_type, contents in color_space_chunks)
+    if palette:
+        chunks.append(png_chunk("PLTE", palette))
+    if transparency:
+        chunks.append(png_chunk("tRNS", transparency))
+    chunks.append(png_chunk("IDAT", compressed_data))
+    chunks.append(png_chunk("IEND", ""))
+    return PNG_SIGNATURE + "".join(chunks)
+
+
+def write_png(width, height, rows):
+    """
+    Encode rows of RGB pixels as a PNG.
+    """
+    raw = "".join("\0" + str(row) for row in rows)
+    return encode_png(PngHeader(width, height, 8, RGB, 0, 0, 0), zlib.compress(raw, 9))
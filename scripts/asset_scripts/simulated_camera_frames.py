@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+"""
+Pack PNG frames (e.g., Resources/simulated_camera_*.png) into the frame container that the simulated camera
+(SIMULATE_CAMERA, see CardIOVideoStream.mm) serves its frames from, and read such containers back.
+
+The container holds every frame already decoded, in the pixel layout that the video path works with, so the
+simulator maps the file and hands out frames that point straight into it: nothing is decoded or copied per frame.
+
+All integers are little-endian.
+
+    header    magic "CISF", u16 version, u16 header size, u32 width, u32 height, u32 pixel format,
+              u32 bytes per row, u32 frame count, u32 frames offset, u32 frame size, u32 second plane offset
+    frames    frame i starts at frames offset + i * frame size; each starts on a page boundary
+
+The pixel format is a CoreVideo pixel format type (an OSType):
+    PIXEL_FORMAT_BGRA  kCVPixelFormatType_32BGRA: one plane, premultiplied B, G, R, A bytes per pixel
+    PIXEL_FORMAT_420V  kCVPixelFormatType_420YpCbCr8BiPlanarVideoRange, as the camera delivers it: a plane of
+                       (video range, BT.601) Y, then at second plane offset a half-height plane of interleaved Cb, Cr
+                       for each 2x2 block of pixels. Width and height must be even.
+Both planes have `bytes per row` bytes per row, a multiple of 64; the second plane offset is 0 for BGRA.
+
+Frames are packed in the order given, so any sequence of frames (of one size) can be replayed, e.g. for load tests:
+the simulator reads $CARDIO_SIMULATED_CAMERA_FRAMES if it is set, and the app's simulated_camera.frames otherwise.
+
+Example:
+    ./simulated_camera_frames.py ../../Resources/simulated_camera_*.png -o /tmp/simulated_camera.frames
+    ./simulated_camera_frames.py /tmp/simulated_camera.frames --info
+    ./simulated_camera_frames.py /tmp/simulated_camera.frames --extract 0 /tmp/frame0.png
+"""
+
+import argparse
+import collections
+import mmap
+import os
+import struct
+import sys
+
+from png_codec import PngError, read_png, write_png
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))  # for build_scripts
+from build_scripts.file_utils import write_if_changed
+
+
+MAGIC = "CISF"
+VERSION = 1
+
+HEADER_FORMAT = "<4sHHIIIIIIII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+PIXEL_FORMAT_BGRA = 0x42475241  # 'BGRA'
+PIXEL_FORMAT_420V = 0x34323076  # '420v'
+PIXEL_FORMATS = {"bgra": PIXEL_FORMAT_BGRA, "420v": PIXEL_FORMAT_420V}
+
+ROW_ALIGNMENT = 64
+FRAME_ALIGNMENT = 4096
+
+
+class SimulatedFramesError(ValueError):
+    pass
+
+
+class FramesHeader(collections.namedtuple("FramesHeader", "width height pixel_format bytes_per_row frame_count "
+                                                           "frames_offset frame_size second_plane_offset")):
+    __slots__ = ()
+
+    @property
+    def pixel_format_name(self):
+        return struct.pack(">I", self.pixel_format)
+
+
+def _align(value, alignment):
+    return (value + alignment - 1) // alignment * alignment
+
+
+# --- Pixel layouts ----------------------------------------------------------
+
+def _bgra_plane(rows, bytes_per_row):
+    plane = bytearray()
+    padding = bytearray(bytes_per_row - len(rows[0]))
+    for rgba in rows:
+        bgra = bytearray(rgba)
+        bgra[0::4], bgra[2::4] = rgba[2::4], rgba[0::4]
+        if rgba[3::4].count("\xff") != len(rgba) // 4:
+            for i in xrange(0, len(bgra), 4):  # premultiply, as CoreGraphics expects
+                alpha = bgra[i + 3]
+                bgra[i] = (bgra[i] * alpha + 127) // 255
+                bgra[i + 1] = (bgra[i + 1] * alpha + 127) // 255
+                bgra[i + 2] = (bgra[i + 2] * alpha + 127) // 255
+        plane += bgra
+        plane += padding
+    return plane
+
+
+def _clamp(value):
+    return 0 if value < 0 else 255 if value > 255 else value
+
+
+def _420v_planes(rows, width, height, bytes_per_row):
+    """
+    BT.601, video range: Y in [16, 235], Cb and Cr in [16, 240]; chroma is the average over each 2x2 block.
+    """
+    luma = bytearray()
+    chroma = bytearray()
+    padding = bytearray(bytes_per_row - width)
+    for y in xrange(0, height, 2):
+        # the sums of R, G and B over each 2x2 block
+        red, green, blue = [0] * (width // 2), [0] * (width // 2), [0] * (width // 2)
+        for rgba in (rows[y], rows[y + 1]):
+            line = bytearray(width)
+            for x in xrange(width):
+                r, g, b = rgba[x * 4], rgba[x * 4 + 1], rgba[x * 4 + 2]
+                line[x] = ((66 * r + 129 * g + 25 * b + 128) >> 8) + 16
+                red[x // 2] += r
+                green[x // 2] += g
+                blue[x // 2] += b
+            luma += line
+            luma += padding
+        line = bytearray(width)
+        for x in xrange(width // 2):
+            r, g, b = red[x], green[x], blue[x]
+            line[2 * x] = _clamp(((-38 * r - 74 * g + 112 * b + 512) >> 10) + 128)
+            line[2 * x + 1] = _clamp(((112 * r - 94 * g - 18 * b + 512) >> 10) + 128)
+        chroma += line
+        chroma += padding
+    return luma, chroma
+
+
+def pack_frames(frames, pixel_format=PIXEL_FORMAT_BGRA):
+    """
+    Return a container holding frames, [(width, height, RGBA rows)], all of the same size, in order.
+    """
+    if not frames:
+        raise SimulatedFramesError("no frames to pack")
+    width, height = frames[0][0], frames[0][1]
+    for frame_width, frame_height, unused in frames:
+        if (frame_width, frame_height) != (width, height):
+            raise SimulatedFramesError("frames differ in size ({0}x{1} and {2}x{3})".format(width, height, frame_width, frame_height))
+
+    if pixel_format == PIXEL_FORMAT_BGRA:
+        bytes_per_row = _align(width * 4, ROW_ALIGNMENT)
+        second_plane_offset = 0
+        plane_bytes = bytes_per_row * height
+    elif pixel_format == PIXEL_FORMAT_420V:
+        if width % 2 or height % 2:
+            raise SimulatedFramesError("420v frames need an even width and height, not {0}x{1}".format(width, height))
+        bytes_per_row = _align(width, ROW_ALIGNMENT)
+        second_plane_offset = bytes_per_row * height
+        plane_bytes = second_plane_offset + bytes_per_row * height // 2
+    else:
+        raise SimulatedFramesError("unknown pixel format 0x{0:08x}".format(pixel_format))
+    frame_size = _align(plane_bytes, FRAME_ALIGNMENT)
+    frames_offset = _align(HEADER_SIZE, FRAME_ALIGNMENT)
+
+    parts = [struct.pack(HEADER_FORMAT, MAGIC, VERSION, HEADER_SIZE, width, height, pixel_format, bytes_per_row,
+                         len(frames), frames_offset, frame_size, second_plane_offset)]
+    parts.append("\0" * (frames_offset - HEADER_SIZE))
+    for unused, unused, rows in frames:
+        if pixel_format == PIXEL_FORMAT_BGRA:
+            frame = _bgra_plane(rows, bytes_per_row)
+        else:
+            luma, chroma = _420v_planes(rows, width, height, bytes_per_row)
+            frame = luma + chroma
+        parts.append(str(frame))
+        parts.append("\0" * (frame_size - len(frame)))
+    return "".join(parts)
+
+
+def pack_png_files(paths, pixel_format=PIXEL_FORMAT_BGRA):
+    frames = []
+    for path in paths:
+        with open(path, "rb") as f:
+            try:
+                frames.append(read_png(f.read()))
+            except PngError as e:
+                raise SimulatedFramesError("{0}: {1}".format(path, e))
+    return pack_frames(frames, pixel_format)
+
+
+# --- Reading ----------------------------------------------------------------
+
+class SimulatedFrames(object):
+    """
+    A frame container, memory-mapped: frame() and planes() return buffers into the mapping, without copying.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.header = parse_header(self._map)
+        except SimulatedFramesError:
+            self.close()
+            raise
+
+    def close(self):
+        self._map.close()
+
+    def __len__(self):
+        return self.header.frame_count
+
+    def frame(self, index):
+        """
+        Return a buffer over frame index (both planes, for 420v).
+        """
+        if not 0 <= index < self.header.frame_count:
+            raise IndexError(index)
+        return buffer(self._map, self.header.frames_offset + index * self.header.frame_size, self.header.frame_size)
+
+    def planes(self, index):
+        """
+        Return buffers over the planes of frame index: (BGRA,) or (Y, CbCr).
+        """
+        header = self.header
+        start = header.frames_offset + index * header.frame_size
+        if not 0 <= index < header.frame_count:
+            raise IndexError(index)
+        if header.pixel_format == PIXEL_FORMAT_BGRA:
+            return (buffer(self._map, start, header.bytes_per_row * header.height),)
+        return (buffer(self._map, start, header.second_plane_offset),
+                buffer(self._map, start + header.second_plane_offset, header.bytes_per_row * header.height // 2))
+
+    def rgb_rows(self, index):
+        """
+        Return frame index converted back to rows of RGB pixels (un-premultiplied, for BGRA).
+        """
+        header = self.header
+        width, bytes_per_row = header.width, header.bytes_per_row
+        planes = self.planes(index)
+        rows = []
+        for y in xrange(header.height):
+            rgb = bytearray(width * 3)
+            if header.pixel_format == PIXEL_FORMAT_BGRA:
+                bgra = bytearray(planes[0][y * bytes_per_row:y * bytes_per_row + width * 4])
+                for x in xrange(width):
+                    alpha = bgra[x * 4 + 3]
+                    for channel, source in ((0, 2), (1, 1), (2, 0)):
+                        value = bgra[x * 4 + source]
+                        rgb[x * 3 + channel] = min(255, (value * 255 + alpha // 2) // alpha) if alpha else 0
+            else:
+                luma = bytearray(planes[0][y * bytes_per_row:y * bytes_per_row + width])
+                chroma = bytearray(planes[1][y // 2 * bytes_per_row:y // 2 * bytes_per_row + width])
+                for x in xrange(width):
+                    c = 298 * (luma[x] - 16)
+                    d = chroma[x & ~1] - 128
+                    e = chroma[(x & ~1) + 1] - 128
+                    rgb[x * 3] = _clamp((c + 409 * e + 128) >> 8)
+                    rgb[x * 3 + 1] = _clamp((c - 100 * d - 208 * e + 128) >> 8)
+                    rgb[x * 3 + 2] = _clamp((c + 516 * d + 128) >> 8)
+            rows.append(rgb)
+        return rows
+
+
+def parse_header(data):
+    """
+    Return the FramesHeader of the container data. Raises SimulatedFramesError if it is not a valid container.
+    """
+    if len(data) < HEADER_SIZE:
+        raise SimulatedFramesError("too short for a frame container header")
+    (magic, version, header_size, width, height, pixel_format, bytes_per_row, frame_count, frames_offset, frame_size,
+     second_plane_offset) = struct.unpack_from(HEADER_FORMAT, data, 0)
+    if magic != MAGIC:
+        raise SimulatedFramesError("not a frame container (magic {0!r})".format(magic))
+    if version != VERSION or header_size != HEADER_SIZE:
+        raise SimulatedFramesError("unsupported frame container version {0}".format(version))
+    header = FramesHeader(width, height, pixel_format, bytes_per_row, frame_count, frames_offset, frame_size, second_plane_offset)
+    if pixel_format == PIXEL_FORMAT_BGRA:
+        needed = bytes_per_row * height
+        row_bytes = width * 4
+    elif pixel_format == PIXEL_FORMAT_420V:
+        needed = second_plane_offset + bytes_per_row * height // 2
+        row_bytes = width
+        if second_plane_offset < bytes_per_row * height:
+            raise SimulatedFramesError("420v planes overlap")
+    else:
+        raise SimulatedFramesError("unknown pixel format 0x{0:08x}".format(pixel_format))
+    if bytes_per_row < row_bytes or frame_size < needed:
+        raise SimulatedFramesError("frame layout is too small for {0}x{1} {2}".format(width, height, header.pixel_format_name))
+    if frames_offset < HEADER_SIZE or frames_offset + frame_count * frame_size > len(data):
+        raise SimulatedFramesError("frames extend past the end of the container")
+    return header
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="the PNG frames to pack, in order (or, with --info/--extract, a frame container)")
+    parser.add_argument("-o", "--output", help="the frame container to write (it is left alone if it would not change)")
+    parser.add_argument("-f", "--format", choices=sorted(PIXEL_FORMATS), default="bgra", help="pixel layout of the frames (default bgra)")
+    parser.add_argument("--info", action="store_true", help="describe the frame container")
+    parser.add_argument("--extract", nargs=2, metavar=("INDEX", "PNG"), help="write frame INDEX of the frame container as a PNG")
+    args = parser.parse_args(argv)
+
+    if args.info or args.extract:
+        for path in args.inputs:
+            try:
+                frames = SimulatedFrames(path)
+            except (SimulatedFramesError, IOError, ValueError) as e:
+                print "[{0}] is not a valid frame container: {1}".format(path, e)
+                return 1
+            header = frames.header
+            if args.info:
+                print "[{0}] {1} frames, {2}x{3} {4}, {5} bytes per row, {6} bytes per frame".format(
+                    path, header.frame_count, header.width, header.height, header.pixel_format_name,
+                    header.bytes_per_row, header.frame_size)
+            if args.extract:
+                index, png_path = int(args.extract[0]), args.extract[1]
+                if not 0 <= index < len(frames):
+                    print "[{0}] has no frame {1}".format(path, index)
+                    return 1
+                with open(png_path, "wb") as f:
+                    f.write(write_png(header.width, header.height, frames.rgb_rows(index)))
+                print "wrote {0}".format(png_path)
+            frames.close()
+        return 0
+
+    if not args.output:
+        parser.error("packing needs an --output")
+    try:
+        container = pack_png_files(args.inputs, PIXEL_FORMATS[args.format])
+    except (SimulatedFramesError, IOError) as e:
+        print "Could not pack the frames: {0}".format(e)
+        return 1
+    if write_if_changed(args.output, container):
+        print "wrote {0} ({1} frames, {2} bytes)".format(args.output, len(args.inputs), len(container))
+    else:
+        print "[{0}] is up to date".format(args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
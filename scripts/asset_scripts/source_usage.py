@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+"""
+Index the localized-string keys and the images that the sources refer to, so that what nothing uses can be
+pruned from the assets that generate_asset_bundle.py bales into CardIOBundle.
+
+The sources (the .h, .m and .mm files and the xibs under SOURCE_PATHS) are scanned in parallel for:
+  - Objective-C string literals: @"camera" refers to the key camera, and @"card_io_logo.png" (or
+    imageNamed:@"card_io_logo") to the image card_io_logo.png, along with its @2x, @3x and ~ipad versions;
+  - format literals, such as @"CreditCardLogos/%@", which refer to every key or image they can format to
+    (if they have at least MIN_FORMAT_TEXT characters of their own, so that @"%@.png" refers to nothing);
+  - the images named by xibs and storyboards; and
+  - calls to CardIOLocalizedString whose key is not a literal, which the index cannot follow.
+The generated CardIOBundle.{h,m} are not scanned: they list every image, used or not.
+
+From that index the script reports the dead keys (those in expected_keys or in a .strings file that nothing
+refers to), the unreferenced images, and the keys passed to CardIOLocalizedString that no .strings file has.
+It can also write
+  - an expected_keys file regenerated from usage: dead keys dropped, and referenced keys that no expected_keys
+    file lists yet appended, keeping the file's order otherwise; and
+  - a pruned copy of the assets directory, without the unreferenced images and without the dead keys' lines
+    in the .strings files, to bale in place of assets/; and next to it (in <DIRECTORY>_expected_keys) a copy of
+    the expected_keys directory regenerated the same way, which the pruned .strings files are to be checked
+    against: confirm_ready_for_release.py <DIRECTORY>/strings --expected-keys <DIRECTORY>_expected_keys
+
+Example (from the top directory):
+    scripts/asset_scripts/source_usage.py assets/
+    scripts/asset_scripts/source_usage.py assets/ --write-expected-keys scripts/string_scripts/expected_keys/icc_keys.txt
+    scripts/asset_scripts/source_usage.py assets/ --pruned-assets /tmp/pruned_assets/
+"""
+
+import argparse
+import collections
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from asset_bundle import collect_assets
+from build_scripts.file_utils import write_if_changed
+from string_scripts.check_locale_consistency import PLACEHOLDER_RE
+from string_scripts.strings_index import (EXPECTED_KEYS_PATH, ROOT_PATH, STRINGS_EXTENSION, expected_keys_files,
+                                          load_expected_keys, normalized_key, parse_strings_file, tokenize_line)
+
+
+# Relative to the repository root
+SOURCE_PATHS = ("Classes", "CardIO_Public_API", "Resources")
+SOURCE_EXTENSIONS = (".h", ".m", ".mm", ".xib", ".storyboard")
+INTERFACE_BUILDER_EXTENSIONS = (".xib", ".storyboard")
+GENERATED_SOURCES = frozenset(["Classes/CardIOBundle.h", "Classes/CardIOBundle.m"])
+
+# CardIOLocalizedString passing its own key parameter along, which is not a call site to follow
+FORWARDING_CALLS = frozenset([("Classes/CardIOLocalizer.m", "key")])
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".pdf")
+
+# A format literal must have this many characters besides its placeholders and any image extension to count
+MIN_FORMAT_TEXT = 3
+
+OBJC_STRING_RE = re.compile(r'@"((?:[^"\\\n]|\\.)*)"')
+IMAGE_NAMED_RE = re.compile(r'imageNamed:\s*@"((?:[^"\\\n]|\\.)*)"')
+LOCALIZED_STRING_CALL_RE = re.compile(r'\bCardIOLocalizedString\w*\s*\(\s*([^,)]*)')
+INTERFACE_BUILDER_IMAGE_RE = re.compile(r'\b(?:image|highlightedImage|selectedImage|backgroundImage)="([^"]+)"|'
+                                        r'<string key="NSResourceName">([^<]+)</string>')
+IMAGE_VARIANT_RE = re.compile(r"(@[0-9]x)?(~[a-z]+)?(\.[A-Za-z]+)$")
+
+# Values for SourceReference.kind
+LITERAL = "literal"            # a string literal, or an image named by a xib
+LOCALIZED_KEY = "key"          # the literal key of a CardIOLocalizedString call
+DYNAMIC_KEY = "dynamic"        # the (non-literal) key expression of a CardIOLocalizedString call
+
+
+class SourceReference(collections.namedtuple("SourceReference", "path line_num kind text")):
+    """
+    path:      the source file, relative to the repository root
+    line_num:  1-based line number
+    kind:      LITERAL, LOCALIZED_KEY or DYNAMIC_KEY
+    text:      the literal's contents, or the key expression of a DYNAMIC_KEY call
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return "{0}:{1}".format(self.path, self.line_num)
+
+
+class UsageReport(collections.namedtuple("UsageReport", "keys dead_keys missing_keys images unreferenced_images dynamic_calls")):
+    """
+    keys:                 {key: [SourceReference]} for each known key that is referred to
+    dead_keys:            the known keys that nothing refers to
+    missing_keys:         {key: [SourceReference]} for the keys passed to CardIOLocalizedString that are not known
+    images:               {asset path: [SourceReference]} for each image that is referred to
+    unreferenced_images:  the asset paths of the images that nothing refers to
+    dynamic_calls:        the SourceReferences of calls whose key is not a literal
+    """
+    __slots__ = ()
+
+
+def source_files(root=ROOT_PATH, paths=SOURCE_PATHS):
+    """
+    Return the sorted paths (relative to root) of the sources to scan.
+    """
+    found = []
+    for source_path in paths:
+        for directory, subdirectories, files in os.walk(os.path.join(root, source_path)):
+            subdirectories[:] = [d for d in subdirectories if not d.startswith(".")]
+            for filename in files:
+                path = os.path.relpath(os.path.join(directory, filename), root).replace(os.sep, "/")
+                if filename.endswith(SOURCE_EXTENSIONS) and path not in GENERATED_SOURCES:
+                    found.append(path)
+    return sorted(found)
+
+
+def scan_source(root, path):
+    """
+    Return the SourceReferences in the source file at path (relative to root).
+    """
+    references = []
+    interface_builder = path.endswith(INTERFACE_BUILDER_EXTENSIONS)
+    with open(os.path.join(root, path), "r") as source:
+        for line_num, line in enumerate(source, 1):
+            if interface_builder:
+                for match in INTERFACE_BUILDER_IMAGE_RE.finditer(line):
+                    references.append(SourceReference(path, line_num, LITERAL, match.group(1) or match.group(2)))
+                continue
+            for match in OBJC_STRING_RE.finditer(line):
+                references.append(SourceReference(path, line_num, LITERAL, match.group(1)))
+            for match in IMAGE_NAMED_RE.finditer(line):
+                if not os.path.splitext(match.group(1))[1]:
+                    references.append(SourceReference(path, line_num, LITERAL, match.group(1) + ".png"))
+            for match in LOCALIZED_STRING_CALL_RE.finditer(line):
+                key = match.group(1).strip()
+                if key.startswith('@"') and key.endswith('"'):
+                    references.append(SourceReference(path, line_num, LOCALIZED_KEY, key[2:-1]))
+                elif key and not key.startswith("NSString") and (path, key) not in FORWARDING_CALLS:  # not the declaration
+                    references.append(SourceReference(path, line_num, DYNAMIC_KEY, key))
+    return references
+
+
+def _scan_source_star(args):
+    # Pool.map passes a single argument
+    return scan_source(*args)
+
+
+def format_pattern(literal):
+    """
+    Return a regular expression for everything the format literal can produce, or None if literal is not a
+    format (or has too little text of its own to tell what it refers to).
+    """
+    pieces = []
+    text = []
+    end = 0
+    for match in PLACEHOLDER_RE.finditer(literal):
+        text.append(literal[end:match.start()])
+        pieces.append(re.escape(literal[end:match.start()]))
+        pieces.append("%" if match.group(2) == "%" else ".+")
+        end = match.end()
+    if len(pieces) == 0 or ".+" not in pieces:
+        return None
+    text.append(literal[end:])
+    pieces.append(re.escape(literal[end:]))
+    own_text = "".join(text)
+    if own_text.lower().endswith(IMAGE_EXTENSIONS):
+        own_text = own_text[:own_text.rindex(".")]
+    if len(own_text.strip("/._- ")) < MIN_FORMAT_TEXT:
+        return None
+    return re.compile("".join(pieces) + r"\Z")
+
+
+class SourceIndex(object):
+    """
+    Every reference found in the sources, by the text it refers to.
+    """
+
+    def __init__(self, references, file_count):
+        self.file_count = file_count
+        self.references = collections.defaultdict(list)  # {text: [SourceReference]}, for LITERAL and LOCALIZED_KEY
+        self.called_keys = collections.defaultdict(list)  # {key: [SourceReference]}, for LOCALIZED_KEY
+        self.dynamic_calls = []
+        for reference in references:
+            if reference.kind == DYNAMIC_KEY:
+                self.dynamic_calls.append(reference)
+                continue
+            self.references[reference.text].append(reference)
+            if reference.kind == LOCALIZED_KEY:
+                self.called_keys[reference.text].append(reference)
+        self.formats = [(pattern, self.references[text]) for text, pattern in
+                        ((text, format_pattern(text)) for text in sorted(self.references) if "%" in text)
+                        if pattern is not None]
+
+    def references_to(self, names):
+        """
+        Return the references to any of names, directly or through a format literal, one per source line.
+        """
+        found = {}
+        for name in names:
+            for reference in self.references.get(name, ()):
+                found.setdefault((reference.path, reference.line_num), reference)
+            for pattern, references in self.formats:
+                if pattern.match(name):
+                    for reference in references:
+                        found.setdefault((reference.path, reference.line_num), reference)
+        return [found[location] for location in sorted(found)]
+
+
+def index_sources(root=ROOT_PATH, paths=SOURCE_PATHS, jobs=1):
+    """
+    Scan the sources under root for references, across a pool of jobs processes (0 = one per CPU).
+    """
+    files = source_files(root, paths)
+    work = [(root, path) for path in files]
+    if jobs == 0:
+        jobs = multiprocessing.cpu_count()
+    jobs = min(jobs, len(work))
+
+    if jobs <= 1:
+        scanned = [_scan_source_star(args) for args in work]
+    else:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            scanned = pool.map(_scan_source_star, work)
+        finally:
+            pool.close()
+            pool.join()
+
+    return SourceIndex([reference for references in scanned for reference in references], len(files))
+
+
+def known_keys(assets_directory, expected_keys_path=EXPECTED_KEYS_PATH):
+    """
+    The keys of expected_keys, and of every .strings file in assets_directory/strings, normalized and unadapted.
+    """
+    keys = set(load_expected_keys(expected_keys_path))
+    for path, full_path in collect_assets(assets_directory):
+        if path.startswith("strings/") and path.endswith(STRINGS_EXTENSION):
+            keys.update(normalized_key(entry.unadapted_key) for entry in parse_strings_file(full_path) if entry.quoted)
+    return keys
+
+
+def image_names(path):
+    """
+    The names by which the image at path (relative to the assets directory) can be referred to.
+    """
+    names = set()
+    for name in (path, os.path.basename(path)):
+        names.add(name)
+        names.add(IMAGE_VARIANT_RE.sub(r"\3", name))
+    return names
+
+
+def usage_report(index, assets_directory, expected_keys_path=EXPECTED_KEYS_PATH):
+    keys = {}
+    dead_keys = set()
+    for key in known_keys(assets_directory, expected_keys_path):
+        references = index.references_to([key])
+        if references:
+            keys[key] = references
+        else:
+            dead_keys.add(key)
+    missing_keys = dict((key, references) for key, references in index.called_keys.items() if normalized_key(key) not in keys)
+
+    images = {}
+    unreferenced_images = set()
+    for path, unused in collect_assets(assets_directory):
+        if path.lower().endswith(IMAGE_EXTENSIONS):
+            references = index.references_to(image_names(path))
+            if references:
+                images[path] = references
+            else:
+                unreferenced_images.add(path)
+
+    return UsageReport(keys, dead_keys, missing_keys, images, unreferenced_images, index.dynamic_calls)
+
+
+def regenerated_expected_keys(data, report, listed_elsewhere):
+    """
+    Return the contents of an expected_keys file regenerated from usage, the keys dropped and the keys added.
+    """
+    lines = data.splitlines()
+    kept_lines = []
+    dropped = []
+    for line in lines:
+        key = normalized_key(line.strip())
+        if key and not key.startswith("//") and key in report.dead_keys:
+            dropped.append(key)
+        else:
+            kept_lines.append(line)
+    kept_keys = set(normalized_key(line.strip()) for line in kept_lines)
+    added = sorted(key for key in set(report.keys) | set(normalized_key(key) for key in report.missing_keys)
+                   if key not in kept_keys and key not in listed_elsewhere)
+    return "".join(line + "\n" for line in kept_lines + added), dropped, added
+
+
+def write_expected_keys(path, report, expected_keys_path=EXPECTED_KEYS_PATH):
+    """
+    Rewrite the expected_keys file at path from usage. Returns (the keys dropped, the keys added).
+    """
+    with open(path, "r") as f:
+        data = f.read()
+    listed_elsewhere = load_expected_keys(expected_keys_path) if os.path.isdir(expected_keys_path) else frozenset()
+    contents, dropped, added = regenerated_expected_keys(data, report, listed_elsewhere)
+    write_if_changed(path, contents)
+    return dropped, added
+
+
+def pruned_expected_keys_path(output_directory):
+    """
+    Where the expected_keys that go with the pruned assets in output_directory are written: next to it.
+    """
+    return os.path.normpath(output_directory) + "_expected_keys"
+
+
+def write_pruned_expected_keys(output_directory, report, expected_keys_path=EXPECTED_KEYS_PATH):
+    """
+    Mirror the expected_keys directory into output_directory, each file regenerated from usage (the referenced keys
+    that no file lists yet go into the first), to check the pruned assets against. Only files whose contents change
+    are written, and files that are no longer in expected_keys are removed. Returns (the keys dropped, the keys added).
+    """
+    if not os.path.isdir(output_directory):
+        os.makedirs(output_directory)
+    listed = set(load_expected_keys(expected_keys_path))
+    names = set()
+    dropped, added = [], []
+    for path in expected_keys_files(expected_keys_path):
+        with open(path, "r") as f:
+            data = f.read()
+        contents, file_dropped, file_added = regenerated_expected_keys(data, report, listed)
+        listed.update(file_added)
+        dropped += file_dropped
+        added += file_added
+        names.add(os.path.basename(path))
+        write_if_changed(os.path.join(output_directory, os.path.basename(path)), contents)
+
+    for path in expected_keys_files(output_directory):
+        if os.path.basename(path) not in names:
+            os.remove(path)
+    return dropped, added
+
+
+def pruned_strings(data, dead_keys):
+    """
+    Return the contents of a .strings file without the lines that hold dead keys.
+    """
+    kept = []
+    for line in data.splitlines(True):
+        entry = tokenize_line(0, line)
+        if entry is None or not entry.quoted or normalized_key(entry.unadapted_key) not in dead_keys:
+            kept.append(line)
+    return "".join(kept)
+
+
+def write_pruned_assets(assets_directory, output_directory, report):
+    """
+    Mirror assets_directory into output_directory, less the unreferenced images and the dead keys.
+    Only files whose contents change are written, and files that are no longer part of the tree are removed.
+    Returns (the paths written, the paths removed).
+    """
+    written = []
+    kept = set()
+    for path, full_path in collect_assets(assets_directory):
+        if path in report.unreferenced_images:
+            continue
+        with open(full_path, "rb") as f:
+            contents = f.read()
+        if path.startswith("strings/") and path.endswith(STRINGS_EXTENSION):
+            contents = pruned_strings(contents, report.dead_keys)
+        kept.add(path)
+        output_path = os.path.join(output_directory, *path.split("/"))
+        if not os.path.isdir(os.path.dirname(output_path)):
+            os.makedirs(os.path.dirname(output_path))
+        if write_if_changed(output_path, contents):
+            written.append(path)
+
+    removed = []
+    for path, full_path in collect_assets(output_directory):
+        if path not in kept:
+            os.remove(full_path)
+            removed.append(path)
+    return written, removed
+
+
+def print_report(report, index, elapsed):
+    print "Scanned {0} source files in {1:.0f} ms: {2} of {3} keys and {4} of {5} images are referred to.".format(
+        index.file_count, elapsed * 1000, len(report.keys), len(report.keys) + len(report.dead_keys),
+        len(report.images), len(report.images) + len(report.unreferenced_images))
+    if report.dead_keys:
+        print "Dead keys (in expected_keys or a .strings file, but referred to by no source):\n    {0}".format(sorted(report.dead_keys))
+    if report.unreferenced_images:
+        print "Unreferenced images:\n    {0}".format(sorted(report.unreferenced_images))
+    for key, references in sorted(report.missing_keys.items()):
+        print "[{0}] CardIOLocalizedString key '{1}' is in no .strings file".format(references[0], key)
+    for reference in report.dynamic_calls:
+        print "[{0}] CardIOLocalizedString key is not a literal ({1}); keys reached only that way look dead".format(reference, reference.text)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("assets_directory", help="path to the assets (e.g., 'assets/')")
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="number of processes scanning sources (default 0 = one per CPU)")
+    parser.add_argument("--where", metavar="KEY_OR_IMAGE", action="append", default=[],
+                        help="list the references to a key or an image (e.g., 'camera' or 'card_io_logo.png')")
+    parser.add_argument("--write-expected-keys", metavar="PATH", help="regenerate this expected_keys file from usage")
+    parser.add_argument("--pruned-assets", metavar="DIRECTORY", help="write the assets, less what is not referred to, here")
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    index = index_sources(jobs=args.jobs)
+    elapsed = time.time() - started
+    report = usage_report(index, args.assets_directory)
+    print_report(report, index, elapsed)
+
+    for name in args.where:
+        references = index.references_to(image_names(name))
+        print "{0}: {1}".format(name, ", ".join(str(reference) for reference in references) or "not referred to")
+
+    if args.write_expected_keys:
+        dropped, added = write_expected_keys(args.write_expected_keys, report)
+        print "Wrote {0}: dropped {1}, added {2}".format(args.write_expected_keys, dropped, added)
+
+    if args.pruned_assets:
+        written, removed = write_pruned_assets(args.assets_directory, args.pruned_assets, report)
+        print "Wrote {0} pruned assets ({1} changed, {2} removed) to {3}".format(
+            len(collect_assets(args.pruned_assets)), len(written), len(removed), args.pruned_assets)
+        expected_keys_path = pruned_expected_keys_path(args.pruned_assets)
+        dropped, added = write_pruned_expected_keys(expected_keys_path, report)
+        print "Wrote the expected_keys for them to {0}: dropped {1}, added {2}".format(expected_keys_path, dropped, added)
+
+    return 1 if report.missing_keys else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+"""
+Tests for asset_bundle.py: LZSS and CIAB bundles decode to exactly what was encoded, and expanding a bundle
+over an older expansion rewrites only the assets that changed.
+
+    python -m unittest discover -s scripts -p "test_*.py"
+"""
+
+import os
+import random
+import shutil
+import struct
+import tempfile
+import unittest
+
+from asset_bundle import (CODEC_LZSS, CODEC_STORED, HEADER_FORMAT, HEADER_SIZE, LZSS_MAX_MATCH, LZSS_WINDOW, MAGIC,
+                          STAMP_FILE_NAME, AssetBundle, AssetBundleError, build_bundle, differences, expand_bundle,
+                          load_bundle, lzss_compress, lzss_decompress, read_assets, read_stamp)
+
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir)
+ASSETS_PATH = os.path.join(ROOT_PATH, "assets")
+
+
+def _random_bytes(seed, length):
+    generator = random.Random(seed)
+    return "".join(chr(generator.randrange(256)) for unused in xrange(length))
+
+
+class LzssTest(unittest.TestCase):
+
+    def assert_round_trip(self, data):
+        compressed = lzss_compress(data)
+        self.assertEqual(lzss_decompress(compressed, len(data)), data)
+        return compressed
+
+    def test_round_trips(self):
+        samples = [
+            "",
+            "a",
+            "abc",
+            "a" * 1000,  # overlapping back-references
+            "".join(chr(i) for i in range(256)) * 3,
+            _random_bytes(1, 5000),
+            _random_bytes(2, 300) * 20,  # repeats farther apart than a match can reach in one token
+            _random_bytes(3, LZSS_WINDOW) + _random_bytes(3, LZSS_WINDOW),  # repeat exactly one window back
+            _random_bytes(4, LZSS_WINDOW + 1) + _random_bytes(4, 64),  # just out of the window's reach
+            "x" * (LZSS_MAX_MATCH + 1) + "y" + "x" * (LZSS_MAX_MATCH * 3),
+        ]
+        for data in samples:
+            self.assert_round_trip(data)
+
+    def test_round_trips_real_assets(self):
+        for path, contents in read_assets(ASSETS_PATH):
+            self.assert_round_trip(contents)
+
+    def test_compresses_repetition(self):
+        self.assertLess(len(self.assert_round_trip("card.io " * 500)), 500)
+
+    def test_rejects_truncated_stream(self):
+        compressed = lzss_compress("card.io " * 50)
+        with self.assertRaises(AssetBundleError):
+            lzss_decompress(compressed[:-1], 400)
+
+    def test_rejects_trailing_bytes(self):
+        with self.assertRaises(AssetBundleError):
+            lzss_decompress(lzss_compress("card.io") + "\0", 7)
+
+    def test_rejects_back_reference_before_start(self):
+        # a flag byte announcing a back-reference, then one to distance 1 with nothing decoded yet
+        with self.assertRaises(AssetBundleError):
+            lzss_decompress("\x01\x00\x00", 3)
+
+
+class BundleTest(unittest.TestCase):
+
+    ASSETS = [
+        ("strings/en.strings", '"ok" = "OK";\n' * 40),
+        ("strings/fr.strings", '"ok" = "OK";\n' * 40),  # same contents: one shared payload
+        ("images/noise.png", _random_bytes(5, 700)),  # incompressible: stored
+        ("strings.table", "table " * 100),  # .table files are always stored
+        (u"images/caf\xe9.png", "unicode path"),
+        ("empty", ""),
+    ]
+
+    def setUp(self):
+        self.bundle = AssetBundle(build_bundle(self.ASSETS))
+
+    def test_round_trip(self):
+        self.assertEqual(differences(self.bundle, [(path.encode("utf-8"), contents) for path, contents in self.ASSETS]), [])
+        self.assertEqual(len(self.bundle), len(self.ASSETS))
+
+    def test_index_is_sorted(self):
+        self.assertEqual(self.bundle.paths(), sorted(self.bundle.paths()))
+
+    def test_find(self):
+        self.assertIsNone(self.bundle.find("strings/de.strings"))
+        self.assertEqual(self.bundle.read(u"images/caf\xe9.png"), "unicode path")
+        with self.assertRaises(KeyError):
+            self.bundle.read("missing")
+
+    def test_codecs_and_shared_payloads(self):
+        entries = dict((entry.path, entry) for entry in self.bundle.entries())
+        self.assertEqual(entries["strings/en.strings"].codec, CODEC_LZSS)
+        self.assertEqual(entries["images/noise.png"].codec, CODEC_STORED)
+        self.assertEqual(entries["strings.table"].codec, CODEC_STORED)
+        self.assertEqual(entries["strings/en.strings"].payload_offset, entries["strings/fr.strings"].payload_offset)
+
+    def test_is_deterministic(self):
+        self.assertEqual(build_bundle(self.ASSETS), build_bundle(reversed(self.ASSETS)))
+
+    def test_rejects_duplicate_paths(self):
+        with self.assertRaises(AssetBundleError):
+            build_bundle([("a", "1"), ("a", "2")])
+
+    def test_rejects_bad_headers(self):
+        data = build_bundle(self.ASSETS)
+        with self.assertRaises(AssetBundleError):
+            AssetBundle(data[:HEADER_SIZE - 1])
+        with self.assertRaises(AssetBundleError):
+            AssetBundle("XXXX" + data[4:])
+        header = list(struct.unpack_from(HEADER_FORMAT, data))
+        header[1] += 1  # version
+        with self.assertRaises(AssetBundleError):
+            AssetBundle(struct.pack(HEADER_FORMAT, *header) + data[HEADER_SIZE:])
+        with self.assertRaises(AssetBundleError):
+            AssetBundle(data[:-1])  # the payloads extend past the end
+
+    def test_detects_corrupt_payload(self):
+        data = bytearray(build_bundle([("a", "x" * 100)]))
+        data[-1] ^= 0xFF
+        with self.assertRaises(AssetBundleError):
+            AssetBundle(str(data)).read("a")
+
+    def test_real_assets_round_trip(self):
+        assets = read_assets(ASSETS_PATH)
+        self.assertEqual(differences(AssetBundle(build_bundle(assets)), assets), [])
+
+    def test_generated_bundle_decodes(self):
+        bundle = load_bundle(os.path.join(ROOT_PATH, "Classes", "CardIOBundle.m"))
+        self.assertTrue(bundle.data.startswith(MAGIC))
+        for entry in bundle.entries():
+            bundle.read_entry(entry)  # verifies each asset's SHA-1
+
+
+class ExpandBundleTest(unittest.TestCase):
+
+    ASSETS = {
+        "strings/en.strings": '"ok" = "OK";\n',
+        "strings/fr.strings": '"ok" = "D\'accord";\n',
+        "images/logo.png": _random_bytes(6, 300),
+    }
+
+    def setUp(self):
+        self.parent = tempfile.mkdtemp(prefix="test_asset_bundle_")
+        self.directory = os.path.join(self.parent, "CardIOBundle.bundle")
+        self.written, self.reused = expand_bundle(AssetBundle(build_bundle(self.ASSETS.items())), self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.parent, True)
+
+    def expand(self, assets):
+        return expand_bundle(AssetBundle(build_bundle(assets.items())), self.directory)
+
+    def read(self, path):
+        with open(os.path.join(self.directory, *path.split("/")), "rb") as f:
+            return f.read()
+
+    def assert_expanded(self, assets):
+        for path, contents in assets.items():
+            self.assertEqual(self.read(path), contents)
+        expanded = set()
+        for directory, unused, files in os.walk(self.directory):
+            expanded.update(os.path.relpath(os.path.join(directory, name), self.directory).replace(os.sep, "/")
+                            for name in files)
+        self.assertEqual(expanded, set(assets) | set([STAMP_FILE_NAME]))
+
+    def test_first_expansion_writes_everything(self):
+        self.assertEqual(sorted(self.written), sorted(self.ASSETS))
+        self.assertEqual(self.reused, [])
+        self.assert_expanded(self.ASSETS)
+        self.assertEqual(set(read_stamp(self.directory)[1]), set(self.ASSETS))
+
+    def test_unchanged_bundle_touches_nothing(self):
+        self.assertEqual(self.expand(self.ASSETS), ([], []))
+
+    def test_changed_asset_is_the_only_one_written(self):
+        unchanged_mtime = os.path.getmtime(os.path.join(self.directory, "images", "logo.png"))
+        assets = dict(self.ASSETS)
+        assets["strings/fr.strings"] = '"ok" = "OK";\n'
+        written, reused = self.expand(assets)
+        self.assertEqual(written, ["strings/fr.strings"])
+        self.assertEqual(sorted(reused), ["images/logo.png", "strings/en.strings"])
+        self.assert_expanded(assets)
+        self.assertEqual(os.path.getmtime(os.path.join(self.directory, "images", "logo.png")), unchanged_mtime)
+
+    def test_added_and_removed_assets(self):
+        assets = dict(self.ASSETS)
+        del assets["strings/fr.strings"]
+        assets["strings/de.strings"] = '"ok" = "OK";\n'
+        written, reused = self.expand(assets)
+        self.assertEqual(written, ["strings/de.strings"])
+        self.assertEqual(sorted(reused), ["images/logo.png", "strings/en.strings"])
+        self.assert_expanded(assets)
+
+    def test_without_stamp_existing_files_are_hashed(self):
+        os.remove(os.path.join(self.directory, STAMP_FILE_NAME))
+        with open(os.path.join(self.directory, "strings", "en.strings"), "wb") as f:
+            f.write("damaged")
+        written, reused = self.expand(self.ASSETS)
+        self.assertEqual(written, ["strings/en.strings"])
+        self.assertEqual(sorted(reused), ["images/logo.png", "strings/fr.strings"])
+        self.assert_expanded(self.ASSETS)
+
+    def test_leftovers_of_an_interrupted_expansion_are_removed(self):
+        leftover = os.path.join(self.parent, "CardIOBundle.bundle.abc.tmp")
+        os.makedirs(leftover)
+        assets = dict(self.ASSETS)
+        assets["images/logo.png"] = _random_bytes(7, 300)
+        self.assertEqual(self.expand(assets)[0], ["images/logo.png"])
+        self.assertEqual(os.listdir(self.parent), ["CardIOBundle.bundle"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Tests for optimize_png.py: re-encoded images have the same pixels, and keep their color space unless it is sRGB.
+
+    python -m unittest discover -s scripts -p "test_*.py"
+"""
+
+import os
+import random
+import unittest
+import zlib
+
+from optimize_png import color_space_chunks, icc_profile_description, optimize_png_data
+from png_codec import RGB, RGBA, PngHeader, encode_png, png_chunk, png_chunks, read_png
+
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir)
+
+GENERIC_RGB_PNG = os.path.join(ROOT_PATH, "Release", "SampleApp", "Default-568h@2x.png")  # "Generic RGB Profile"
+SRGB_PROFILE_PNG = os.path.join(ROOT_PATH, "Resources", "pp_h_rgb.png")  # "sRGB IEC61966-2.1"
+SRGB_CHUNK_PNG = os.path.join(ROOT_PATH, "Resources", "cardio_logo_220.png")
+
+
+def _chunks(path):
+    with open(path, "rb") as f:
+        return png_chunks(f.read())
+
+
+def _icc_profile(chunks):
+    contents = dict(chunks)["iCCP"]
+    return zlib.decompress(contents[contents.index("\0") + 2:])
+
+
+def _png(width, height, seed, color_type=RGBA, extra_chunks=()):
+    """
+    A PNG of random pixels in few colors, unfiltered and barely compressed, so that it can be made smaller.
+    """
+    generator = random.Random(seed)
+    channels = 4 if color_type == RGBA else 3
+    colors = ["".join(chr(generator.randrange(256)) for unused in xrange(3)) + "\xff"[:channels - 3]
+              for unused in xrange(4)]
+    raw = "".join("\0" + "".join(generator.choice(colors) for unused in xrange(width)) for unused in xrange(height))
+    data = encode_png(PngHeader(width, height, 8, color_type, 0, 0, 0), zlib.compress(raw, 1))
+    extra = "".join(png_chunk(chunk_type, contents) for chunk_type, contents in extra_chunks)
+    ihdr_end = 8 + 25
+    return data[:ihdr_end] + extra + data[ihdr_end:]
+
+
+class ColorSpaceTest(unittest.TestCase):
+
+    def test_profile_descriptions(self):
+        self.assertEqual(icc_profile_description(_icc_profile(_chunks(GENERIC_RGB_PNG))), "Generic RGB Profile")
+        self.assertEqual(icc_profile_description(_icc_profile(_chunks(SRGB_PROFILE_PNG))), "sRGB IEC61966-2.1")
+        self.assertIsNone(icc_profile_description("too short"))
+
+    def test_only_srgb_is_dropped(self):
+        generic_rgb = [(chunk_type, contents) for chunk_type, contents in _chunks(GENERIC_RGB_PNG) if chunk_type == "iCCP"]
+        self.assertEqual(color_space_chunks(_chunks(GENERIC_RGB_PNG)), generic_rgb)
+        self.assertEqual(color_space_chunks(_chunks(SRGB_PROFILE_PNG)), [])
+        self.assertEqual(color_space_chunks(_chunks(SRGB_CHUNK_PNG)), [])
+        gamma = [("gAMA", "\x00\x00\xb1\x8f")]
+        self.assertEqual(color_space_chunks(gamma + [("IDAT", "")]), gamma)
+        self.assertEqual(color_space_chunks(gamma + [("sRGB", "\0")]), [])  # sRGB overrides gAMA
+        unreadable = [("iCCP", "profile\0\0not zlib")]
+        self.assertEqual(color_space_chunks(unreadable), unreadable)
+
+
+class OptimizeTest(unittest.TestCase):
+
+    def assert_optimized(self, data, expected_color_space):
+        optimized, pixels_sha1 = optimize_png_data(data)
+        self.assertLess(len(optimized), len(data))
+        self.assertEqual(read_png(optimized)[2], read_png(data)[2])
+        self.assertEqual(color_space_chunks(png_chunks(optimized)), expected_color_space)
+        return optimized, pixels_sha1
+
+    def test_keeps_other_profiles(self):
+        generic_rgb = color_space_chunks(_chunks(GENERIC_RGB_PNG))
+        gamma = [("gAMA", "\x00\x00\xb1\x8f"), ("cHRM", "\0" * 32)]
+        for color_space in (generic_rgb, gamma):
+            self.assert_optimized(_png(32, 16, 1, extra_chunks=color_space), color_space)
+            self.assert_optimized(_png(32, 16, 1, RGB, extra_chunks=color_space), color_space)
+
+    def test_drops_srgb_and_metadata(self):
+        srgb_profile = [(chunk_type, contents) for chunk_type, contents in _chunks(SRGB_PROFILE_PNG) if chunk_type == "iCCP"]
+        for extra_chunks in (srgb_profile, [("sRGB", "\0"), ("gAMA", "\x00\x00\xb1\x8f")], [("tEXt", "Software\0test")]):
+            optimized, unused = self.assert_optimized(_png(32, 16, 2, extra_chunks=extra_chunks), [])
+            self.assertEqual([chunk_type for chunk_type, unused in png_chunks(optimized)], ["IHDR", "PLTE", "IDAT", "IEND"])
+
+    def test_same_pixels_in_other_color_spaces_are_not_duplicates(self):
+        untagged, untagged_sha1 = optimize_png_data(_png(32, 16, 3))
+        generic_rgb = color_space_chunks(_chunks(GENERIC_RGB_PNG))
+        tagged, tagged_sha1 = optimize_png_data(_png(32, 16, 3, extra_chunks=generic_rgb))
+        self.assertNotEqual(untagged_sha1, tagged_sha1)
+        self.assertEqual(optimize_png_data(_png(32, 16, 3, extra_chunks=[("tEXt", "a\0b")])), (untagged, untagged_sha1))
+
+
+if __name__ == "__main__":
+    unittest.main()
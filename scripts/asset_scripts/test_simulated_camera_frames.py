@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""
+Tests for simulated_camera_frames.py: frames packed from PNGs come back out of --extract as they went in (exactly
+for BGRA, within rounding for 420v), and containers with a bad header are rejected.
+
+    python -m unittest discover -s scripts -p "test_*.py"
+"""
+
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from png_codec import read_png, write_png
+from simulated_camera_frames import (FRAME_ALIGNMENT, HEADER_FORMAT, HEADER_SIZE, PIXEL_FORMAT_420V,
+                                     PIXEL_FORMAT_BGRA, ROW_ALIGNMENT, SimulatedFrames, SimulatedFramesError, main,
+                                     pack_frames, parse_header)
+
+
+WIDTH, HEIGHT = 18, 10  # rows are padded (to ROW_ALIGNMENT bytes) in both layouts
+
+
+def _rgb_frame(seed):
+    """
+    Rows of RGB pixels, one random color per 2x2 block (so 420v's shared chroma loses nothing but rounding).
+    """
+    generator = random.Random(seed)
+    rows = [bytearray(WIDTH * 3) for unused in xrange(HEIGHT)]
+    for y in xrange(0, HEIGHT, 2):
+        for x in xrange(0, WIDTH, 2):
+            color = bytearray(generator.randrange(256) for unused in xrange(3))
+            for row in rows[y:y + 2]:
+                row[x * 3:x * 3 + 6] = color + color
+    return rows
+
+
+def _rgba_rows(rgb_rows, alpha=255):
+    rows = []
+    for rgb in rgb_rows:
+        rgba = bytearray(len(rgb) // 3 * 4)
+        for i in xrange(len(rgb) // 3):
+            rgba[i * 4:i * 4 + 3] = rgb[i * 3:i * 3 + 3]
+            rgba[i * 4 + 3] = alpha
+        rows.append(rgba)
+    return rows
+
+
+class FramesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="test_simulated_camera_frames_")
+        self.frames = [_rgb_frame(seed) for seed in xrange(3)]
+        self.png_paths = []
+        for index, rows in enumerate(self.frames):
+            path = self.path("frame_{0}.png".format(index))
+            with open(path, "wb") as f:
+                f.write(write_png(WIDTH, HEIGHT, rows))
+            self.png_paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, True)
+
+    def path(self, name):
+        return os.path.join(self.temp_dir, name)
+
+    def run_main(self, argv):
+        """
+        Run the script's main(argv); returns (exit status, output).
+        """
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            returncode = main(argv)
+            return returncode, sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def pack(self, pixel_format_name):
+        container_path = self.path(pixel_format_name + ".frames")
+        returncode, output = self.run_main(self.png_paths + ["-f", pixel_format_name, "-o", container_path])
+        self.assertEqual(returncode, 0, output)
+        return container_path
+
+    def extract(self, container_path, index):
+        png_path = self.path("extracted.png")
+        returncode, output = self.run_main([container_path, "--extract", str(index), png_path])
+        self.assertEqual(returncode, 0, output)
+        with open(png_path, "rb") as f:
+            width, height, rgba_rows = read_png(f.read())
+        self.assertEqual((width, height), (WIDTH, HEIGHT))
+        return [bytearray(rgba[i] for i in xrange(len(rgba)) if i % 4 != 3) for rgba in rgba_rows]
+
+    def test_bgra_round_trip(self):
+        container_path = self.pack("bgra")
+        for index, rows in enumerate(self.frames):
+            self.assertEqual(self.extract(container_path, index), rows, "frame {0}".format(index))
+
+    def test_420v_round_trip(self):
+        container_path = self.pack("420v")
+        for index, rows in enumerate(self.frames):
+            for expected, extracted in zip(rows, self.extract(container_path, index)):
+                # video range and integer BT.601 coefficients: off by rounding, each way
+                self.assertLessEqual(max(abs(a - b) for a, b in zip(expected, extracted)), 2, "frame {0}".format(index))
+
+    def test_layout(self):
+        for name, pixel_format, bytes_per_row in (("bgra", PIXEL_FORMAT_BGRA, ROW_ALIGNMENT * 2),
+                                                  ("420v", PIXEL_FORMAT_420V, ROW_ALIGNMENT)):
+            frames = SimulatedFrames(self.pack(name))
+            try:
+                header = frames.header
+                self.assertEqual((header.width, header.height, header.pixel_format, header.frame_count),
+                                 (WIDTH, HEIGHT, pixel_format, len(self.frames)))
+                self.assertEqual(header.bytes_per_row, bytes_per_row)
+                self.assertEqual(header.frames_offset % FRAME_ALIGNMENT, 0)
+                self.assertEqual(header.frame_size % FRAME_ALIGNMENT, 0)
+                self.assertEqual(len(frames.frame(2)), header.frame_size)
+                with self.assertRaises(IndexError):
+                    frames.frame(3)
+            finally:
+                frames.close()
+
+    def test_premultiplied_bgra(self):
+        rows = _rgba_rows(self.frames[0], alpha=128)
+        data = pack_frames([(WIDTH, HEIGHT, rows)])
+        header = parse_header(data)
+        first_pixel = bytearray(data[header.frames_offset:header.frames_offset + 4])
+        red, green, blue = rows[0][0], rows[0][1], rows[0][2]
+        self.assertEqual(first_pixel, bytearray([(blue * 128 + 127) // 255, (green * 128 + 127) // 255,
+                                                 (red * 128 + 127) // 255, 128]))
+
+    def test_unchanged_container_is_not_rewritten(self):
+        container_path = self.pack("bgra")
+        returncode, output = self.run_main(self.png_paths + ["-o", container_path])
+        self.assertEqual(returncode, 0)
+        self.assertIn("is up to date", output)
+
+    def test_rejects_frames_it_cannot_pack(self):
+        with self.assertRaises(SimulatedFramesError):
+            pack_frames([])
+        with self.assertRaises(SimulatedFramesError):
+            pack_frames([(WIDTH, HEIGHT, _rgba_rows(self.frames[0])), (2, 2, _rgba_rows([bytearray(6)] * 2))])
+        with self.assertRaises(SimulatedFramesError):
+            pack_frames([(3, 2, _rgba_rows([bytearray(9)] * 2))], PIXEL_FORMAT_420V)
+
+    def assert_rejected(self, data):
+        with self.assertRaises(SimulatedFramesError):
+            parse_header(data)
+        path = self.path("bad.frames")
+        with open(path, "wb") as f:
+            f.write(data)
+        returncode, output = self.run_main([path, "--info"])
+        self.assertEqual(returncode, 1)
+        self.assertIn("is not a valid frame container", output)
+
+    def test_rejects_bad_headers(self):
+        data = pack_frames([(WIDTH, HEIGHT, _rgba_rows(rows)) for rows in self.frames], PIXEL_FORMAT_420V)
+        self.assertEqual(parse_header(data).frame_count, 3)
+
+        def with_field(index, value):
+            fields = list(struct.unpack_from(HEADER_FORMAT, data))
+            fields[index] = value
+            return struct.pack(HEADER_FORMAT, *fields) + data[HEADER_SIZE:]
+
+        self.assert_rejected(data[:HEADER_SIZE - 1])
+        self.assert_rejected("XXXX" + data[4:])  # magic
+        self.assert_rejected(with_field(1, 2))  # version
+        self.assert_rejected(with_field(2, HEADER_SIZE + 4))  # header size
+        self.assert_rejected(with_field(5, 0x79757673))  # pixel format 'yuvs'
+        self.assert_rejected(with_field(6, WIDTH - 1))  # bytes per row
+        self.assert_rejected(with_field(10, ROW_ALIGNMENT))  # second plane offset: the planes overlap
+        self.assert_rejected(with_field(9, ROW_ALIGNMENT))  # frame size
+        self.assert_rejected(with_field(7, 4))  # frame count
+        self.assert_rejected(data[:-1])  # truncated
+
+
+if __name__ == "__main__":
+    unittest.main()
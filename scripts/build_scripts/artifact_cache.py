@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+"""
+Content-addressed store for built libraries (libCardIO.a), so that `fab build` on an unchanged tree reuses them.
+
+An artifact's key is derived from:
+  - a fingerprint of every source that feeds the CardIO-static target (see SOURCE_PATHS),
+  - the GCC_PREPROCESSOR_DEFINITIONS flags,
+  - the SDK name, the developer dir and the version string compiled into the library, and
+  - the slice it is (e.g., "archive", "i386", or "universal").
+A universal library's key is derived from the keys of the slices it was lipo'd from.
+
+The store lives in $CARDIO_CACHE_DIR/artifacts (default ~/.cache/card.io/artifacts). Entries unused for
+longer than max_age_days are evicted, and then the least recently used ones until the store fits in max_bytes.
+"""
+
+import hashlib
+import os
+import shutil
+import time
+
+from file_utils import cache_directory, copy_atomically, read_json_cache, sha1_file, write_json_cache
+
+
+# Bump this to invalidate every stored artifact, e.g. when the way libraries are built changes.
+ARTIFACT_CACHE_VERSION = 1
+
+# Everything (relative to the repository root) that can affect what CardIO-static compiles to,
+# including the files the xcconfigs name (SupportFiles/CardIO-Prefix.pch, SupportFiles/CardIO_exported_symbols.txt).
+SOURCE_PATHS = (
+    "Classes",
+    "CardIO_Public_API",
+    "CardIOCardholderNameTextFieldDelegate.h",
+    "CardIOCardholderNameTextFieldDelegate.m",
+    "SupportFiles",
+    "assets",
+    "build_configs",
+    "dmz",
+    "icc.xcodeproj/project.pbxproj",
+    "opencv_device",
+)
+
+# Generated during the build from the version string, which is part of the key anyway.
+IGNORED_FILE_NAMES = frozenset([".DS_Store", "CardIOIccVersion.h"])
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+DEFAULT_MAX_AGE_DAYS = 30
+
+STAT_CACHE_FILE_NAME = "source_hashes.json"
+
+
+def _source_files(root, paths):
+    for path in paths:
+        full_path = os.path.join(root, path)
+        if os.path.isfile(full_path):
+            yield path
+        for directory, subdirectories, files in os.walk(full_path):
+            subdirectories[:] = sorted(d for d in subdirectories if not d.startswith("."))
+            for filename in sorted(files):
+                if filename not in IGNORED_FILE_NAMES and not filename.startswith("."):
+                    yield os.path.relpath(os.path.join(directory, filename), root)
+
+
+def source_hashes(root, paths=SOURCE_PATHS, stat_cache_path=None):
+    """
+    Return [(path, SHA-1 of its content)] for every source file under paths, in a stable order.
+
+    File hashes are remembered by (mtime, size) in stat_cache_path, so unchanged files are not re-read.
+    """
+    stat_cache_path = stat_cache_path or os.path.join(cache_directory(), STAT_CACHE_FILE_NAME)
+    stat_cache = read_json_cache(stat_cache_path)
+
+    updated_stat_cache = {}
+    hashes = []
+    for path in _source_files(root, paths):
+        full_path = os.path.join(root, path)
+        stat = os.stat(full_path)
+        cached = stat_cache.get(full_path)
+        if cached is not None and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            file_hash = cached[2]
+        else:
+            file_hash = sha1_file(full_path)
+        updated_stat_cache[full_path] = [stat.st_mtime, stat.st_size, file_hash]
+        hashes.append((path, file_hash))
+
+    if updated_stat_cache != stat_cache:
+        write_json_cache(stat_cache_path, updated_stat_cache)
+    return hashes
+
+
+def source_fingerprint(root, paths=SOURCE_PATHS, stat_cache_path=None):
+    """
+    Return a hash over the path and content of every source file under paths (see source_hashes).
+    """
+    fingerprint = hashlib.sha1()
+    for path, file_hash in source_hashes(root, paths, stat_cache_path):
+        fingerprint.update("{0}\0{1}\n".format(path, file_hash))
+    return fingerprint.hexdigest()
+
+
+def artifact_key(*parts):
+    """
+    Combine the given strings (fingerprints, flags, SDK names, slice names, other keys...) into one key.
+    """
+    sha1 = hashlib.sha1("artifact-cache-v{0}".format(ARTIFACT_CACHE_VERSION))
+    for part in parts:
+        sha1.update("\0")
+        sha1.update(str(part))
+    return sha1.hexdigest()
+
+
+class ArtifactCache(object):
+    """
+    A directory of <key>/<file name> entries. Looking an entry up marks it as recently used.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.directory = directory or os.path.join(cache_directory(), "artifacts")
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_directory(self, key):
+        return os.path.join(self.directory, key)
+
+    def fetch(self, key, filename, destination_directory):
+        """
+        Copy the cached file into destination_directory and return True, or return False on a miss.
+        A copy that fails (e.g., because another build evicted the entry meanwhile) is a miss too.
+        """
+        cached_path = os.path.join(self._entry_directory(key), filename)
+        destination_path = os.path.join(destination_directory, filename)
+        if not os.path.isfile(cached_path):
+            self.misses += 1
+            return False
+        try:
+            if not os.path.isdir(destination_directory):
+                os.makedirs(destination_directory)
+            shutil.copy2(cached_path, destination_path)
+            os.utime(self._entry_directory(key), None)
+        except EnvironmentError:
+            if os.path.isfile(destination_path):
+                os.remove(destination_path)  # partial
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key, path):
+        """
+        Store a copy of the file at path under key. An existing entry for key is left untouched.
+        """
+        entry_directory = self._entry_directory(key)
+        cached_path = os.path.join(entry_directory, os.path.basename(path))
+        if os.path.isfile(cached_path):
+            return
+        try:
+            if not os.path.isdir(entry_directory):
+                os.makedirs(entry_directory)
+            copy_atomically(path, cached_path)  # so that fetch never sees a partial file
+        except EnvironmentError:
+            pass  # only an optimization (and another build may have stored, or evicted, the same key meanwhile)
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for key in os.listdir(self.directory):
+            entry_directory = self._entry_directory(key)
+            if key.startswith(".") or not os.path.isdir(entry_directory):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_directory, filename)) for filename in os.listdir(entry_directory))
+            entries.append((os.path.getmtime(entry_directory), size, entry_directory))
+        return entries
+
+    def evict(self):
+        """
+        Remove stale entries, then the least recently used ones until the store fits in max_bytes.
+        Returns the number of bytes freed.
+        """
+        freed = 0
+        oldest_allowed = time.time() - self.max_age_days * 24 * 60 * 60
+        entries = sorted(self._entries(), reverse=True)  # most recently used first
+        total = 0
+        for last_used, size, entry_directory in entries:
+            if last_used < oldest_allowed or total + size > self.max_bytes:
+                shutil.rmtree(entry_directory, True)
+                freed += size
+            else:
+                total += size
+        return freed
+
+    def stats(self):
+        return "Artifact cache: {0} hits, {1} misses".format(self.hits, self.misses)
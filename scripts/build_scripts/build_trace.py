@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""
+Record where a build's time goes: wall time, CPU time, peak RSS and exit status per phase and per subprocess.
+
+A Tracer collects two kinds of events:
+  - phases, timed with `with tracer.phase("name"):` (they may nest), and
+  - processes, either run through tracer.run() or added afterwards with tracer.add_process()
+    (e.g. the jobs run by job_scheduler.run_jobs, which already measure themselves).
+tracer.write(directory) then saves a Chrome trace (load it in chrome://tracing or https://ui.perfetto.dev)
+and a plain-text summary table next to it.
+
+CPU time of a phase includes the CPU time of the child processes that finished during it.
+Peak RSS is per process; a phase reports the largest of the processes run during it.
+"""
+
+import contextlib
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+from job_scheduler import wait_with_rusage
+
+
+PHASE = "phase"
+PROCESS = "process"
+
+OK = "ok"
+FAILED = "failed"
+
+
+def max_rss_kb(rusage):
+    if rusage is None:
+        return None
+    rss = rusage.ru_maxrss
+    if sys.platform == "darwin":
+        rss //= 1024  # bytes on OS X, kilobytes on Linux
+    return rss
+
+
+def _cpu_seconds():
+    times = os.times()
+    return times[0] + times[1] + times[2] + times[3]
+
+
+class Tracer(object):
+    def __init__(self, name):
+        self.name = name
+        self.start_time = time.time()
+        self.events = []
+        self._depth = 0
+        self._lock = threading.Lock()
+
+    def _add(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    @contextlib.contextmanager
+    def phase(self, name, **args):
+        """
+        Time the enclosed block. The phase is marked failed if the block raises (including sys.exit and abort).
+        """
+        event = {"name": name, "category": PHASE, "depth": self._depth, "args": args,
+                 "start_time": time.time(), "status": OK}
+        cpu_start = _cpu_seconds()
+        children_rss_start = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        self._depth += 1
+        try:
+            yield event
+        except BaseException:
+            event["status"] = FAILED
+            raise
+        finally:
+            self._depth -= 1
+            event["end_time"] = time.time()
+            event["cpu_seconds"] = _cpu_seconds() - cpu_start
+            children_rss = resource.getrusage(resource.RUSAGE_CHILDREN)
+            event["max_rss_kb"] = max_rss_kb(children_rss) if children_rss.ru_maxrss > children_rss_start else None
+            self._add(event)
+
+    def add_process(self, name, start_time, end_time, returncode, cpu_seconds=None, max_rss_kb=None, **args):
+        self._add({"name": name, "category": PROCESS, "depth": self._depth, "args": args,
+                   "start_time": start_time, "end_time": end_time, "cpu_seconds": cpu_seconds,
+                   "max_rss_kb": max_rss_kb, "returncode": returncode,
+                   "status": OK if returncode == 0 else FAILED})
+
+    def run(self, command, name=None, cwd=None, env=None):
+        """
+        Run a shell command, record it, and return its exit status (like os.system, but not encoded).
+        The event is named after the program run, unless a name is given; the full command is in its args.
+        """
+        start_time = time.time()
+        try:
+            process = subprocess.Popen(command, shell=True, cwd=cwd, env=env)
+            returncode, rusage = wait_with_rusage(process)
+        except OSError:
+            returncode, rusage = 127, None
+        cpu_seconds = rusage.ru_utime + rusage.ru_stime if rusage is not None else None
+        name = name or " ".join([os.path.basename(command.split()[0])] + command.split()[1:2])
+        self.add_process(name, start_time, time.time(), returncode, cpu_seconds, max_rss_kb(rusage), command=command)
+        return returncode
+
+    def _finished_events(self):
+        with self._lock:
+            events = sorted(self.events, key=lambda event: (event["start_time"], event["depth"]))
+        for event in events:
+            if event["category"] == PHASE and event["max_rss_kb"] is None:
+                contained = [other["max_rss_kb"] for other in events
+                             if other["category"] == PROCESS and other["max_rss_kb"] is not None
+                             and other["start_time"] >= event["start_time"] and other["end_time"] <= event["end_time"]]
+                event["max_rss_kb"] = max(contained) if contained else None
+        return events
+
+    def chrome_trace(self):
+        """
+        Return the events in the Chrome trace event format. Phases share one track; processes that
+        overlap in time (e.g. concurrent builds) each get a track of their own.
+        """
+        trace_events = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": 0, "args": {"name": "phases"}}]
+        lane_ends = []
+        for event in self._finished_events():
+            if event["category"] == PHASE:
+                tid = 0
+            else:
+                for lane, lane_end in enumerate(lane_ends):
+                    if lane_end <= event["start_time"]:
+                        break
+                else:
+                    lane = len(lane_ends)
+                    lane_ends.append(None)
+                    trace_events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": lane + 1,
+                                         "args": {"name": "processes {0}".format(lane + 1)}})
+                lane_ends[lane] = event["end_time"]
+                tid = lane + 1
+            args = dict(event["args"])
+            args.update((key, event[key]) for key in ("cpu_seconds", "max_rss_kb", "status", "returncode") if event.get(key) is not None)
+            trace_events.append({
+                "name": event["name"],
+                "cat": event["category"],
+                "ph": "X",
+                "ts": int((event["start_time"] - self.start_time) * 1e6),
+                "dur": int((event["end_time"] - event["start_time"]) * 1e6),
+                "pid": 1,
+                "tid": tid,
+                "args": args,
+            })
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms", "otherData": {"name": self.name}}
+
+    def summary_lines(self):
+        lines = ["{0:<48} {1:>9} {2:>9} {3:>10}  {4}".format(self.name, "wall s", "cpu s", "peak RSS", "status")]
+        for event in self._finished_events():
+            name = "  " * event["depth"] + event["name"]
+            if len(name) > 48:
+                name = name[:45] + "..."
+            cpu = "{0:.2f}".format(event["cpu_seconds"]) if event["cpu_seconds"] is not None else "-"
+            rss = "{0:.1f} MB".format(event["max_rss_kb"] / 1024.0) if event["max_rss_kb"] is not None else "-"
+            status = event["status"]
+            if event.get("returncode"):
+                status += " ({0})".format(event["returncode"])
+            lines.append("{0:<48} {1:>9.2f} {2:>9} {3:>10}  {4}".format(name, event["end_time"] - event["start_time"], cpu, rss, status))
+        lines.append("{0:<48} {1:>9.2f}".format("total", time.time() - self.start_time))
+        return lines
+
+    def write(self, directory):
+        """
+        Write <name>-<timestamp>.json (Chrome trace) and .txt (summary) to directory; return both paths.
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        base_name = "{0}-{1}".format(re.sub("[^A-Za-z0-9_.-]+", "_", self.name), time.strftime("%Y%m%d-%H%M%S"))
+        trace_path = os.path.join(directory, base_name + ".json")
+        summary_path = os.path.join(directory, base_name + ".txt")
+        with open(trace_path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        with open(summary_path, "w") as f:
+            f.write("\n".join(self.summary_lines()) + "\n")
+        return trace_path, summary_path
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Regenerate dmz/dmz_all.cpp, the amalgamated dmz translation unit, only when one of its inputs changed.
+
+The manifest ($CARDIO_CACHE_DIR/dmz_concat_manifest.json) remembers, for each dmz checkout, the content hash
+of every input (the dmz sources, and the dmz fabfile that does the concatenation) and of the dmz_all.cpp they
+produced. When neither has changed, the concatenation is skipped. When it does run and produces the same
+dmz_all.cpp as before, the file's modification time is put back, so Xcode does not recompile it.
+"""
+
+import collections
+import os
+
+from artifact_cache import source_hashes
+from file_utils import (UNCHANGED, UP_TO_DATE, cache_directory, changed_inputs, read_json_cache, sha1_file,
+                        write_json_cache)
+
+
+OUTPUT_FILE_NAME = "dmz_all.cpp"
+INPUT_EXTENSIONS = (".c", ".cc", ".cpp", ".h", ".hpp", ".inl", ".py")
+
+MANIFEST_FILE_NAME = "dmz_concat_manifest.json"
+STAT_CACHE_FILE_NAME = "dmz_source_hashes.json"
+
+# The possible outcomes of incremental_concat: UP_TO_DATE, UNCHANGED (see file_utils), or
+WAS_STALE = "was stale"        # concat ran, and dmz_all.cpp changed: it was not up to date
+
+
+class ConcatResult(collections.namedtuple("ConcatResult", "status changed_inputs")):
+    """
+    changed_inputs lists the inputs whose hash differs from the manifest (all of them on a first run).
+    """
+    __slots__ = ()
+
+
+def input_hashes(dmz_root, stat_cache_path=None):
+    """
+    Return {path relative to dmz_root: SHA-1} for every input of the concatenation.
+    """
+    stat_cache_path = stat_cache_path or os.path.join(cache_directory(), STAT_CACHE_FILE_NAME)
+    return dict((path, file_hash) for path, file_hash in source_hashes(dmz_root, (".",), stat_cache_path)
+                if path != OUTPUT_FILE_NAME and path.endswith(INPUT_EXTENSIONS))
+
+
+def incremental_concat(dmz_root, concat, manifest_path=None, force=False):
+    """
+    Call concat() (which regenerates dmz_root/dmz_all.cpp) unless the manifest shows that nothing changed.
+    Returns a ConcatResult.
+    """
+    dmz_root = os.path.abspath(dmz_root)
+    manifest_path = manifest_path or os.path.join(cache_directory(), MANIFEST_FILE_NAME)
+    manifest = read_json_cache(manifest_path)
+    entry = manifest.get(dmz_root, {})
+
+    inputs = input_hashes(dmz_root)
+    output_path = os.path.join(dmz_root, OUTPUT_FILE_NAME)
+    output_stat = os.stat(output_path) if os.path.exists(output_path) else None
+    output_hash = sha1_file(output_path) if output_stat is not None else None
+
+    changed = changed_inputs(inputs, entry.get("inputs", {}))
+    if not force and not changed and output_hash is not None and entry.get("output") == output_hash:
+        return ConcatResult(UP_TO_DATE, [])
+
+    concat()
+
+    new_output_hash = sha1_file(output_path)
+    if new_output_hash == output_hash:
+        os.utime(output_path, (output_stat.st_atime, output_stat.st_mtime))
+        status = UNCHANGED
+    else:
+        status = WAS_STALE
+
+    manifest[dmz_root] = {"inputs": inputs, "output": new_output_hash}
+    write_json_cache(manifest_path, manifest)
+    return ConcatResult(status, changed)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""
+File helpers shared by the build, asset and strings scripts: where their caches live, file hashes, and writes that
+readers (including concurrent builds) see either complete or not at all.
+
+Every atomic write goes to a temporary file next to its destination (".<name>.XXXXXX") and is then renamed over it.
+
+The incremental generators (dmz_concat.py, incremental_asset_bundle.py) share the manifest helpers: a manifest is
+a JSON cache of the input hashes (and output hashes) each generator last ran with.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+
+CHUNK_SIZE = 1024 * 1024
+
+# Outcomes shared by the incremental generators
+UP_TO_DATE = "up to date"      # no input (nor output) changed, so the generator was not run
+UNCHANGED = "unchanged"        # the generator ran, and produced the outputs that were already there
+
+
+def cache_directory():
+    """
+    $CARDIO_CACHE_DIR, or ~/.cache/card.io: the parent of every cache the scripts keep between runs.
+    """
+    return os.environ.get("CARDIO_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "card.io")
+
+
+def sha1_file(path):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def _write_atomically(path, write, finish):
+    """
+    Call write(file object) on a temporary file next to path, then finish(temporary path), then rename it over path.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix="." + os.path.basename(path) + ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        finish(temp_path)
+        os.rename(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_atomically(path, contents, mode=0644):
+    """
+    Replace path with contents (a byte string), giving it mode.
+    """
+    _write_atomically(path, lambda f: f.write(contents), lambda temp_path: os.chmod(temp_path, mode))
+
+
+def write_if_changed(path, contents):
+    """
+    Write contents to path (atomically), unless it already holds them. Returns True if it wrote.
+    """
+    try:
+        with open(path, "rb") as f:
+            if f.read() == contents:
+                return False
+    except IOError:
+        pass
+    write_atomically(path, contents)
+    return True
+
+
+def copy_atomically(source, destination):
+    """
+    Replace destination with a copy of source, keeping source's mode and times.
+    """
+    def copy(out_file):
+        with open(source, "rb") as in_file:
+            shutil.copyfileobj(in_file, out_file, CHUNK_SIZE)
+
+    _write_atomically(destination, copy, lambda temp_path: shutil.copystat(source, temp_path))
+
+
+def read_json_cache(path):
+    """
+    Return the JSON object cached at path, or {} if it is missing or unreadable.
+    """
+    try:
+        with open(path, "r") as f:
+            value = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}  # missing or corrupt: start over
+    return value if isinstance(value, dict) else {}
+
+
+def changed_inputs(inputs, previous_inputs):
+    """
+    Return the sorted paths whose hash differs between inputs and previous_inputs ({path: hash}), including the
+    paths that are in only one of them.
+    """
+    return sorted(path for path in set(inputs) | set(previous_inputs) if inputs.get(path) != previous_inputs.get(path))
+
+
+def write_json_cache(path, value):
+    """
+    Write value to path as JSON (atomically, creating its directory), for a cache: failures are ignored.
+    """
+    try:
+        contents = json.dumps(value)  # first: a byte string that is not UTF-8 cannot be stored (ValueError)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        write_atomically(path, contents)
+    except (IOError, OSError, ValueError):
+        pass  # only an optimization
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Regenerate Classes/CardIOBundle.{h,m} from assets/ only when an asset (or the generator) changed.
+
+The manifest ($CARDIO_CACHE_DIR/asset_bundle_manifest.json) remembers, for each output directory and class,
+the content hash of every asset, of the generator (scripts/asset_scripts, and the string table compiler)
+and of the generated files.
+When none of them has changed, generation is skipped altogether. When it does run, each generated file is
+replaced (atomically) only if its bytes differ, so an unchanged CardIOBundle.m keeps its modification time
+and Xcode does not recompile it.
+
+This is what the Xcode "Baler" build phase runs, and what `fab build` runs before building.
+
+Example (from the top directory):
+    scripts/build_scripts/incremental_asset_bundle.py assets/ Classes/ -c CardIOBundle
+"""
+
+import argparse
+import collections
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))  # for asset_scripts
+from asset_scripts.generate_asset_bundle import generate_sources
+from artifact_cache import source_hashes
+from file_utils import (UNCHANGED, UP_TO_DATE, cache_directory, changed_inputs, read_json_cache, sha1_file,
+                        write_if_changed, write_json_cache)
+
+
+# The generator's own sources, relative to scripts/
+SCRIPTS_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+GENERATOR_PATHS = ("asset_scripts", "string_scripts/string_tables.py", "string_scripts/strings_index.py")
+GENERATOR_EXTENSIONS = (".py", ".template")
+
+MANIFEST_FILE_NAME = "asset_bundle_manifest.json"
+STAT_CACHE_FILE_NAME = "asset_source_hashes.json"
+
+# The possible outcomes of incremental_asset_bundle: UP_TO_DATE, UNCHANGED (see file_utils), or
+REGENERATED = "regenerated"    # the generator ran, and at least one generated file changed
+
+
+class BundleResult(collections.namedtuple("BundleResult", "status changed_inputs written_files")):
+    """
+    changed_inputs lists the inputs whose hash differs from the manifest (all of them on a first run);
+    written_files, the generated files that were replaced.
+    """
+    __slots__ = ()
+
+
+def input_hashes(assets_directory, stat_cache_path=None):
+    """
+    Return {path: SHA-1} for every asset (relative to assets_directory) and, under "generator/", every
+    generator source (including the string table compiler).
+    """
+    stat_cache_path = stat_cache_path or os.path.join(cache_directory(), STAT_CACHE_FILE_NAME)
+    hashes = dict(source_hashes(assets_directory, (".",), stat_cache_path))
+    for path, file_hash in source_hashes(SCRIPTS_ROOT, GENERATOR_PATHS, stat_cache_path):
+        if path.endswith(GENERATOR_EXTENSIONS):
+            hashes["generator/" + path] = file_hash
+    return hashes
+
+
+def incremental_asset_bundle(assets_directory, output_directory, class_name="CardIOBundle", command=None,
+                             manifest_path=None, force=False):
+    """
+    Write output_directory/<class_name>.{h,m} unless the manifest shows that nothing changed.
+    Returns a BundleResult.
+    """
+    assets_directory = os.path.abspath(assets_directory)
+    output_directory = os.path.abspath(output_directory)
+    manifest_path = manifest_path or os.path.join(cache_directory(), MANIFEST_FILE_NAME)
+    manifest = read_json_cache(manifest_path)
+    manifest_key = os.path.join(output_directory, class_name)
+    entry = manifest.get(manifest_key, {})
+
+    if command is None:
+        command = "generate_asset_bundle.py {0} {1} -c {2}".format(
+            os.path.relpath(assets_directory) + "/", os.path.relpath(output_directory) + "/", class_name)
+    output_paths = [os.path.join(output_directory, class_name + extension) for extension in (".h", ".m")]
+    output_hashes = dict((os.path.basename(path), sha1_file(path)) for path in output_paths if os.path.isfile(path))
+
+    inputs = input_hashes(assets_directory)
+    changed = changed_inputs(inputs, entry.get("inputs", {}))
+    if (not force and not changed and entry.get("command") == command and
+            len(output_hashes) == len(output_paths) and entry.get("outputs") == output_hashes):
+        return BundleResult(UP_TO_DATE, [], [])
+
+    written_files = []
+    for path, contents in zip(output_paths, generate_sources(assets_directory, class_name, command)):
+        if write_if_changed(path, contents):
+            written_files.append(path)
+
+    manifest[manifest_key] = {
+        "command": command,
+        "inputs": inputs,
+        "outputs": dict((os.path.basename(path), sha1_file(path)) for path in output_paths),
+    }
+    write_json_cache(manifest_path, manifest)
+    return BundleResult(REGENERATED if written_files else UNCHANGED, changed, written_files)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("assets_directory", help="path to the assets (e.g., 'assets/')")
+    parser.add_argument("output_directory", help="where to write <class>.h and <class>.m (e.g., 'Classes/')")
+    parser.add_argument("-c", "--class-name", default="CardIOBundle", help="name of the generated class (default CardIOBundle)")
+    parser.add_argument("-f", "--force", action="store_true", help="run the generator even if nothing seems to have changed")
+    args = parser.parse_args(argv)
+
+    command = " ".join(["generate_asset_bundle.py", args.assets_directory, args.output_directory, "-c", args.class_name])
+    result = incremental_asset_bundle(args.assets_directory, args.output_directory, args.class_name, command, force=args.force)
+    if result.status == UP_TO_DATE:
+        print "{0} is up to date".format(args.class_name)
+    else:
+        print "{0} {1} ({2} changed inputs)".format(args.class_name, result.status, len(result.changed_inputs))
+        for path in result.written_files:
+            print "wrote {0}".format(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+"""
+Run build jobs (sequences of shell commands) concurrently, respecting their dependencies.
+
+Each job's stdout and stderr go to its own log file. As soon as any job fails, the jobs still running
+are terminated, nothing else is started, and JobFailed is raised. A job starts as soon as every job it
+depends on has succeeded, so e.g. a lipo step starts the moment its last input has been built.
+
+Nothing here is Xcode-specific: with stand-in `xcrun`/`xcodebuild`/`lipo` scripts on $PATH
+(see scripts/build_scripts/shims) the whole schedule can be exercised on Linux.
+"""
+
+import errno
+import os
+import subprocess
+import threading
+import time
+
+
+class JobFailed(Exception):
+    def __init__(self, job, returncode):
+        Exception.__init__(self, "{0} failed with exit status {1} (log: {2})".format(job.name, returncode, job.log_path))
+        self.job = job
+        self.returncode = returncode
+
+
+class Job(object):
+    """
+    A named sequence of shell commands, run in order; the job fails at the first non-zero exit status.
+    The commands run in cwd if one is given, otherwise in the cwd given to run_jobs.
+    """
+
+    def __init__(self, name, commands, depends_on=(), cwd=None):
+        self.name = name
+        self.commands = list(commands)
+        self.depends_on = list(depends_on)
+        self.cwd = cwd
+        self.log_path = None
+        self.returncode = None
+        self.start_time = None
+        self.end_time = None
+        self.cpu_time = None
+        self.max_rusage = None
+        self._process = None
+
+    @property
+    def duration(self):
+        if self.start_time is None or self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    def log_tail(self, lines=40):
+        """
+        Return the last `lines` lines of the job's log (or all of it, if lines is None).
+        """
+        if not self.log_path or not os.path.exists(self.log_path):
+            return ""
+        with open(self.log_path, "r") as log:
+            log_lines = log.readlines()
+        if lines is not None:
+            log_lines = log_lines[-lines:]
+        return "".join(log_lines)
+
+
+def wait_with_rusage(process):
+    """
+    Wait for a subprocess.Popen and return (returncode, resource usage), or (returncode, None) without os.wait4.
+    """
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+    while True:
+        try:
+            unused, status, rusage = os.wait4(process.pid, 0)
+            break
+        except OSError as e:
+            if e.errno != errno.EINTR:
+                raise
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    return process.returncode, rusage
+
+
+def _log_file_name(name):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name) + ".log"
+
+
+def run_jobs(jobs, max_jobs=None, cwd=None, env=None, log_dir=None, on_start=None, on_finish=None):
+    """
+    Run jobs, at most max_jobs at a time (default: all that are ready), and return them once all have succeeded.
+
+    on_start(job) and on_finish(job) are called from the scheduling thread as jobs start and succeed.
+    Raises JobFailed for the first job that fails.
+    """
+    jobs_by_name = dict((job.name, job) for job in jobs)
+    for job in jobs:
+        for dependency in job.depends_on:
+            if dependency not in jobs_by_name:
+                raise ValueError("{0} depends on unknown job {1}".format(job.name, dependency))
+
+    if log_dir is not None and not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+    max_jobs = max_jobs or len(jobs) or 1
+
+    condition = threading.Condition()
+    state = {"aborted": False, "finished": []}
+
+    def run(job):
+        log = open(job.log_path, "w") if job.log_path else open(os.devnull, "w")
+        returncode = 0
+        try:
+            for command in job.commands:
+                with condition:
+                    if state["aborted"]:
+                        returncode = -1
+                        break
+                    log.write("$ {0}\n".format(command))
+                    log.flush()
+                    job._process = subprocess.Popen(command, shell=True, cwd=job.cwd or cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+                returncode, rusage = wait_with_rusage(job._process)
+                if rusage is not None:
+                    job.cpu_time = (job.cpu_time or 0.0) + rusage.ru_utime + rusage.ru_stime
+                    if job.max_rusage is None or rusage.ru_maxrss > job.max_rusage.ru_maxrss:
+                        job.max_rusage = rusage
+                if returncode != 0:
+                    break
+        except OSError:
+            returncode = 127
+        finally:
+            log.close()
+            with condition:
+                job.returncode = returncode
+                job.end_time = time.time()
+                job._process = None
+                state["finished"].append(job)
+                condition.notify()
+
+    waiting = list(jobs)
+    running = []
+    done = set()
+    failure = None
+
+    with condition:
+        while waiting or running:
+            ready = [job for job in waiting if all(dependency in done for dependency in job.depends_on)]
+            for job in ready[:max(0, max_jobs - len(running))]:
+                waiting.remove(job)
+                running.append(job)
+                if log_dir is not None:
+                    job.log_path = os.path.join(log_dir, _log_file_name(job.name))
+                job.start_time = time.time()
+                if on_start:
+                    on_start(job)
+                thread = threading.Thread(target=run, args=(job,))
+                thread.daemon = True
+                thread.start()
+
+            if not running:
+                raise ValueError("dependency cycle among jobs: {0}".format(", ".join(job.name for job in waiting)))
+
+            while not state["finished"]:
+                condition.wait(1.0)
+
+            for job in state["finished"]:
+                running.remove(job)
+                if job.returncode == 0:
+                    done.add(job.name)
+                    if on_finish:
+                        on_finish(job)
+                elif failure is None:
+                    failure = job
+            state["finished"] = []
+
+            if failure is not None:
+                # fail fast: stop everything that is still running, and wait for it to wind down
+                state["aborted"] = True
+                for job in running:
+                    if job._process is not None:
+                        try:
+                            job._process.terminate()
+                        except OSError:
+                            pass
+                while running:
+                    while not state["finished"]:
+                        condition.wait(1.0)
+                    for job in state["finished"]:
+                        running.remove(job)
+                    state["finished"] = []
+                raise JobFailed(failure, failure.returncode)
+
+    return jobs
@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+"""
+Pack release SDK directories (one per variant) into a single reproducible .tar.gz, with a checksum manifest.
+
+  - Reproducible: entries are sorted by path, every timestamp is RELEASE_MTIME (or $SOURCE_DATE_EPOCH), owners
+    are root with no names, and modes are 0755 for directories and executables and 0644 for everything else.
+    Packing the same files always gives the same bytes, whatever the machine or the number of threads.
+  - Deduplicated: a file whose contents are already in the archive (typically the sample apps, the headers and
+    the OpenCV libraries, which every variant has) is stored as a hard link to that first copy, which tar (and Finder)
+    extract as an ordinary file.
+  - Compressed in parallel: the tar stream is cut into BLOCK_SIZE blocks, and each is deflated, on a pool of
+    threads, into a gzip member of its own. Concatenated members are a valid gzip file.
+
+The manifest (<archive>.sha1) has a `shasum -c`-compatible "<sha1>  <path>" line for every file in the archive.
+verify_archive() checks an archive against it as a stream, one member at a time, without extracting anything,
+so it can read from a pipe (e.g., a download) as well as from a file.
+
+Example (from the output directory):
+    release_archive.py card.io_ios_sdk_5.4.1.tar.gz card.io_ios_sdk_5.4.1 card.io_ios_sdk_5.4.1-SCAN_EXPIRY_0
+    release_archive.py --verify card.io_ios_sdk_5.4.1.tar.gz
+"""
+
+import argparse
+import collections
+import hashlib
+import os
+import stat
+import struct
+import sys
+import tarfile
+import time
+import zlib
+from multiprocessing.pool import ThreadPool
+
+from file_utils import sha1_file
+
+
+RELEASE_MTIME = 315532800  # 1980-01-01, the earliest time a zip file can hold
+BLOCK_SIZE = 1024 * 1024
+COMPRESSION_LEVEL = 9
+DEFAULT_THREADS = 8
+
+IGNORED_FILE_NAMES = frozenset([".DS_Store"])
+
+# A gzip member header: magic, deflate, no flags, no mtime, "maximum compression", unknown OS.
+GZIP_HEADER = "\x1f\x8b\x08\x00\x00\x00\x00\x00\x02\xff"
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+class ArchiveSummary(collections.namedtuple("ArchiveSummary", "files linked_files linked_bytes input_bytes archive_bytes sha1")):
+    __slots__ = ()
+
+
+def release_mtime():
+    return int(os.environ.get("SOURCE_DATE_EPOCH") or RELEASE_MTIME)
+
+
+def _gzip_member(block):
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return (GZIP_HEADER + compressor.compress(block) + compressor.flush() +
+            struct.pack("<II", zlib.crc32(block) & 0xffffffff, len(block) & 0xffffffff))
+
+
+class ParallelGzipWriter(object):
+    """
+    A write-only file object that gzips what is written to it into out_file, one member per BLOCK_SIZE bytes,
+    deflating up to `threads` blocks at once (zlib releases the GIL). Members are written in order.
+    """
+
+    def __init__(self, out_file, threads=DEFAULT_THREADS, block_size=BLOCK_SIZE):
+        self.out_file = out_file
+        self.block_size = block_size
+        self.max_pending = max(1, threads) * 2
+        self.pool = ThreadPool(max(1, threads))
+        self.buffer = []
+        self.buffered = 0
+        self.pending = collections.deque()
+        self.members = 0
+
+    def write(self, data):
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.block_size:
+            data = "".join(self.buffer)
+            cut = len(data) - len(data) % self.block_size
+            for start in xrange(0, cut, self.block_size):
+                self._submit(data[start:start + self.block_size])
+            self.buffer = [data[cut:]]
+            self.buffered = len(data) - cut
+
+    def _submit(self, block):
+        self.pending.append(self.pool.apply_async(_gzip_member, (block,)))
+        while len(self.pending) >= self.max_pending:
+            self._write_member()
+
+    def _write_member(self):
+        self.out_file.write(self.pending.popleft().get())
+        self.members += 1
+
+    def close(self):
+        if self.buffered or not self.members and not self.pending:
+            self._submit("".join(self.buffer))  # an empty stream still needs one member
+            self.buffer = []
+            self.buffered = 0
+        try:
+            while self.pending:
+                self._write_member()
+        finally:
+            self.pool.close()
+            self.pool.join()
+
+
+class GzipMembersReader(object):
+    """
+    A read-only file object that gunzips in_file, member after member (tarfile's own "r|gz" stops after the first).
+    zlib checks each member's CRC and length.
+    """
+
+    def __init__(self, in_file):
+        self.in_file = in_file
+        self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.buffer = ""
+        self.position = 0
+        self.at_end = False
+
+    def _fill(self):
+        chunk = self.in_file.read(CHUNK_SIZE)
+        if not chunk:
+            data = self.decompressor.flush()
+            self.at_end = True
+        else:
+            try:
+                data = self.decompressor.decompress(chunk)
+                while self.decompressor.unused_data:  # the start of the next member
+                    unused_data = self.decompressor.unused_data
+                    self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    data += self.decompressor.decompress(unused_data)
+            except zlib.error as e:
+                raise ArchiveError("corrupt gzip data: {0}".format(e))
+        self.buffer = self.buffer[self.position:] + data
+        self.position = 0
+
+    def read(self, size=-1):
+        while not self.at_end and (size < 0 or len(self.buffer) - self.position < size):
+            self._fill()
+        end = len(self.buffer) if size < 0 else self.position + size
+        data = self.buffer[self.position:end]
+        self.position += len(data)
+        return data
+
+
+def _archive_entries(directories):
+    """
+    Return [(path in the archive, full path)] for directories, [(name in the archive, directory)], sorted so that
+    every directory comes before its contents.
+    """
+    entries = []
+    for name, directory in directories:
+        entries.append((name, directory))
+        for parent, subdirectories, files in os.walk(directory):
+            for filename in subdirectories + files:
+                if filename not in IGNORED_FILE_NAMES:
+                    full_path = os.path.join(parent, filename)
+                    entries.append(("/".join([name] + os.path.relpath(full_path, directory).split(os.sep)), full_path))
+    return sorted(entries, key=lambda entry: entry[0].split("/"))
+
+
+def _tar_info(path, full_path, mtime):
+    st = os.lstat(full_path)
+    info = tarfile.TarInfo(path)
+    info.mtime = mtime
+    info.uid = info.gid = 0
+    info.uname = info.gname = ""
+    if stat.S_ISDIR(st.st_mode):
+        info.type = tarfile.DIRTYPE
+        info.mode = 0755
+    elif stat.S_ISLNK(st.st_mode):
+        info.type = tarfile.SYMTYPE
+        info.linkname = os.readlink(full_path)
+        info.mode = 0777
+    else:
+        info.size = st.st_size
+        info.mode = 0755 if st.st_mode & 0111 else 0644
+    return info
+
+
+def write_archive(archive_path, directories, manifest_path=None, threads=DEFAULT_THREADS):
+    """
+    Pack directories, [(name in the archive, directory)], into archive_path, and write its manifest
+    (default: archive_path + ".sha1"). Returns an ArchiveSummary.
+    """
+    mtime = release_mtime()
+    first_paths = {}  # SHA-1: the path of the first file with that content
+    file_hashes = []
+    linked_files = 0
+    linked_bytes = 0
+    input_bytes = 0
+
+    temp_path = archive_path + ".incoming"
+    with open(temp_path, "wb") as out_file:
+        writer = ParallelGzipWriter(out_file, threads)
+        try:
+            tar = tarfile.open(fileobj=writer, mode="w|", format=tarfile.PAX_FORMAT, encoding="utf-8")
+            for path, full_path in _archive_entries(directories):
+                info = _tar_info(path, full_path, mtime)
+                if not info.isreg():
+                    tar.addfile(info)
+                    continue
+                file_hash = sha1_file(full_path)
+                file_hashes.append((path, file_hash))
+                input_bytes += info.size
+                if file_hash in first_paths:
+                    linked_files += 1
+                    linked_bytes += info.size
+                    info.type = tarfile.LNKTYPE
+                    info.linkname = first_paths[file_hash]
+                    info.size = 0
+                    tar.addfile(info)
+                else:
+                    first_paths[file_hash] = path
+                    with open(full_path, "rb") as f:
+                        tar.addfile(info, f)
+            tar.close()
+        finally:
+            writer.close()
+    os.rename(temp_path, archive_path)
+
+    manifest_path = manifest_path or archive_path + ".sha1"
+    with open(manifest_path, "w") as f:
+        for path, file_hash in sorted(file_hashes):
+            f.write("{0}  {1}\n".format(file_hash, path))
+
+    return ArchiveSummary(len(file_hashes), linked_files, linked_bytes, input_bytes, os.path.getsize(archive_path),
+                          sha1_file(archive_path))
+
+
+def read_manifest(manifest_path):
+    """
+    Return {path: sha1} from a "<sha1>  <path>" manifest.
+    """
+    manifest = {}
+    with open(manifest_path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            file_hash, separator, path = line.partition("  ")
+            if not separator or len(file_hash) != 40:
+                raise ArchiveError("{0}:{1}: not a \"<sha1>  <path>\" line".format(manifest_path, line_number))
+            manifest[path] = file_hash
+    return manifest
+
+
+def verify_archive(in_file, manifest):
+    """
+    Check the archive read from in_file (a stream) against manifest, {path: sha1}.
+    Returns a message for every problem: members that differ, are missing from the archive, or are not in the manifest.
+    """
+    messages = []
+    expected = dict(manifest)
+    seen_hashes = {}
+    try:
+        tar = tarfile.open(fileobj=GzipMembersReader(in_file), mode="r|", encoding="utf-8")
+        for info in tar:
+            if info.isreg():
+                sha1 = hashlib.sha1()
+                member = tar.extractfile(info)
+                for chunk in iter(lambda: member.read(CHUNK_SIZE), b""):
+                    sha1.update(chunk)
+                file_hash = sha1.hexdigest()
+            elif info.islnk():
+                if info.linkname not in seen_hashes:
+                    messages.append("{0} links to {1}, which is not earlier in the archive".format(info.name, info.linkname))
+                    continue
+                file_hash = seen_hashes[info.linkname]
+            else:
+                continue
+            seen_hashes[info.name] = file_hash
+            if info.name not in expected:
+                messages.append("{0} is in the archive but not in the manifest".format(info.name))
+            elif expected.pop(info.name) != file_hash:
+                messages.append("{0} differs from the manifest".format(info.name))
+        tar.close()
+    except (tarfile.TarError, IOError, EOFError) as e:
+        messages.append("the archive is not a valid .tar.gz: {0}".format(e))
+    except ArchiveError as e:
+        messages.append(str(e))
+    for path in sorted(expected):
+        messages.append("{0} is missing from the archive".format(path))
+    return messages
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("archive", help="the .tar.gz to write or verify ('-' to verify standard input)")
+    parser.add_argument("directories", nargs="*", help="the SDK directories to pack, each stored under its own name")
+    parser.add_argument("--verify", action="store_true", help="check the archive against its manifest instead")
+    parser.add_argument("--manifest", help="the manifest to write or check (default: <archive>.sha1)")
+    parser.add_argument("-j", "--threads", type=int, default=DEFAULT_THREADS, help="compression threads (default {0})".format(DEFAULT_THREADS))
+    args = parser.parse_args(argv)
+
+    manifest_path = args.manifest or (None if args.archive == "-" else args.archive + ".sha1")
+
+    if args.verify:
+        if manifest_path is None:
+            parser.error("--manifest is needed to verify standard input")
+        try:
+            manifest = read_manifest(manifest_path)
+        except (ArchiveError, IOError) as e:
+            print "[{0}] cannot be read: {1}".format(manifest_path, e)
+            return 1
+        if args.archive == "-":
+            messages = verify_archive(sys.stdin, manifest)
+        else:
+            with open(args.archive, "rb") as f:
+                messages = verify_archive(f, manifest)
+        for message in messages:
+            print message
+        if messages:
+            return 1
+        print "[{0}] matches {1} ({2} files)".format(args.archive, manifest_path, len(manifest))
+        return 0
+
+    if not args.directories:
+        parser.error("no directories to pack")
+    start = time.time()
+    summary = write_archive(args.archive, [(os.path.basename(os.path.normpath(directory)), directory) for directory in args.directories],
+                            manifest_path, args.threads)
+    print "[{0}] {1} files ({2} bytes), {3} stored once as links ({4} bytes); {5} bytes in {6:.1f}s, sha1 {7}".format(
+        args.archive, summary.files, summary.input_bytes, summary.linked_files, summary.linked_bytes,
+        summary.archive_bytes, time.time() - start, summary.sha1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
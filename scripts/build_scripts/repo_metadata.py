@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Toolchain and repository metadata for the fabfile, looked up lazily, at most once per process, and cached
+on disk between processes, so that tasks which do not need it (e.g., `fab verbose`) never pay for it.
+
+  - developer_dir():  the Xcode developer dir, as `xcode-select -p` prints it (None where there is no Xcode)
+  - toplevel():       the repository root, as `git rev-parse --show-toplevel`
+  - describe():       `git describe --match='iOS_[0-9]*.[0-9]*' --tags --always`
+  - is_dirty():       whether tracked files differ from HEAD, as `git describe --dirty` would say
+
+The disk cache ($CARDIO_CACHE_DIR/repo_metadata.json) keeps each repository's describe() with the state it
+was computed in: HEAD (and the commit its branch points to), and the mtimes of the index and of the tags.
+Any commit, checkout, `git add` or new tag changes that state, and describe() is run again.
+is_dirty() is never cached on disk: editing a file does not touch the index, so no cheap state would notice.
+developer_dir() is cached against the xcode-select link, and $DEVELOPER_DIR overrides it, as for xcode-select.
+"""
+
+import json
+import os
+import subprocess
+
+from file_utils import cache_directory, write_json_cache
+
+
+METADATA_FILE_NAME = "repo_metadata.json"
+
+# The release tags that version strings are described from
+VERSION_TAG_PATTERN = "iOS_[0-9]*.[0-9]*"
+
+# Where `xcode-select -s` records the selected developer dir
+XCODE_SELECT_LINK = "/var/db/xcode_select_link"
+
+
+def _run(command, cwd=None):
+    """
+    Return command's stripped output, or None if it cannot be run or fails.
+    """
+    try:
+        with open(os.devnull, "w") as devnull:
+            return subprocess.check_output(command, cwd=cwd, stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _read(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except IOError:
+        return None
+
+
+def _mtime(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime, st.st_size]
+
+
+def find_git_dir(directory):
+    """
+    Return (working tree root, git dir, common git dir) for the repository containing directory, or None.
+    A .git file (as in a submodule or a linked worktree) is followed to the git dir it names.
+    """
+    directory = os.path.realpath(directory)
+    while True:
+        dot_git = os.path.join(directory, ".git")
+        if os.path.isdir(dot_git):
+            return directory, dot_git, dot_git
+        if os.path.isfile(dot_git):
+            gitdir = _read(dot_git) or ""
+            if gitdir.startswith("gitdir:"):
+                git_dir = os.path.normpath(os.path.join(directory, gitdir[len("gitdir:"):].strip()))
+                common_dir = _read(os.path.join(git_dir, "commondir"))
+                return directory, git_dir, os.path.normpath(os.path.join(git_dir, common_dir)) if common_dir else git_dir
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+class RepoMetadata(object):
+    """
+    Memoized metadata for the repository containing directory (default: the current directory).
+    Nothing is looked up until it is first asked for.
+    """
+
+    def __init__(self, directory=None, metadata_path=None):
+        self._directory = os.path.abspath(directory or os.curdir)
+        self._metadata_path = metadata_path
+        self._memo = {}
+
+    def _memoized(self, name, compute):
+        if name not in self._memo:
+            self._memo[name] = compute()
+        return self._memo[name]
+
+    @property
+    def metadata_path(self):
+        return self._metadata_path or os.path.join(cache_directory(), METADATA_FILE_NAME)
+
+    def _load(self):
+        try:
+            with open(self.metadata_path, "r") as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _cached(self, section, state, compute, still_valid=None):
+        """
+        Return the value stored under section for state, computing (and storing) it if state has changed
+        (or if still_valid(value) is false).
+        """
+        metadata = self._load()
+        entry = metadata.get(section, {})
+        if entry.get("state") == state and "value" in entry and (still_valid is None or still_valid(entry["value"])):
+            return entry["value"]
+        value = compute()
+        if value is not None:
+            metadata[section] = {"state": state, "value": value}
+            try:
+                write_json_cache(self.metadata_path, metadata)
+            except (IOError, OSError):
+                pass  # only a cache
+        return value
+
+    def _git_dirs(self):
+        return self._memoized("git_dirs", lambda: find_git_dir(self._directory))
+
+    def repository_state(self):
+        """
+        A JSON-able token that changes whenever HEAD, the index or the tags do; None outside of a git repository.
+        """
+        git_dirs = self._git_dirs()
+        if git_dirs is None:
+            return None
+        root, git_dir, common_dir = git_dirs
+        head = _read(os.path.join(git_dir, "HEAD"))
+        if head and head.startswith("ref:"):
+            ref = head[len("ref:"):].strip()
+            head = [head, _read(os.path.join(common_dir, ref))]  # None if the branch is in packed-refs
+        return [head, _mtime(os.path.join(git_dir, "index")), _mtime(os.path.join(common_dir, "refs", "tags")),
+                _mtime(os.path.join(common_dir, "packed-refs"))]
+
+    def toplevel(self):
+        def compute():
+            git_dirs = self._git_dirs()
+            if git_dirs is not None:
+                return git_dirs[0]
+            return _run(["git", "rev-parse", "--show-toplevel"], cwd=self._directory)
+        return self._memoized("toplevel", compute)
+
+    def describe(self):
+        """
+        The `git describe` of HEAD against the release tags (without -dirty; see is_dirty), or None.
+        """
+        def compute():
+            command = ["git", "describe", "--match=" + VERSION_TAG_PATTERN, "--tags", "--always"]
+            state = self.repository_state()
+            if state is None:
+                return _run(command, cwd=self._directory)
+            return self._cached("describe:" + self.toplevel(), state, lambda: _run(command, cwd=self.toplevel()))
+        return self._memoized("describe", compute)
+
+    def is_dirty(self):
+        def compute():
+            try:
+                with open(os.devnull, "w") as devnull:
+                    return subprocess.call(["git", "diff", "--quiet", "HEAD", "--"], cwd=self.toplevel() or self._directory,
+                                           stdout=devnull, stderr=devnull) == 1
+            except OSError:
+                return False
+        return self._memoized("is_dirty", compute)
+
+    def developer_dir(self):
+        """
+        $DEVELOPER_DIR if set, else the developer dir selected with xcode-select, or None if there is no Xcode.
+        """
+        def compute():
+            if os.environ.get("DEVELOPER_DIR"):
+                return os.environ["DEVELOPER_DIR"]
+            state = os.path.realpath(XCODE_SELECT_LINK) if os.path.lexists(XCODE_SELECT_LINK) else None
+            return self._cached("developer_dir", state, lambda: _run(["xcode-select", "-p"]), os.path.isdir)
+        return self._memoized("developer_dir", compute)
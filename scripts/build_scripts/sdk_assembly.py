@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+"""
+Assemble the release SDK directory from a declarative manifest.
+
+Each manifest entry is (source, destination, how):
+  source       a path or glob, relative to the repository root (or absolute, e.g. for the built library)
+  destination  a directory, relative to the SDK directory
+  how          STAMP: a public header; copied line by line, adding the version after its "//  CardIO*.h" line
+               LINK:  a binary; hardlinked when possible, otherwise copied in large chunks
+               COPY:  any other file; copied, keeping its mode and times
+               PNG:   an image; written as optimize_png.py losslessly re-encodes it, keeping its mode and times
+               TREE:  a directory; every file in it is COPYed (or, for a .png, PNG'd), except .DS_Store
+A source without wildcards must exist; a glob may match nothing (e.g. opencv_device/lib/*.a before OpenCV is built).
+
+The copies are independent, so they run on a pool of threads. The images are optimized beforehand, on a pool
+of processes (and through optimize_png.py's cache, so an unchanged image is only ever optimized once). Every file's SHA-1 is computed as it is written
+(or, for a hardlink, read once), and assemble_sdk writes them to a `shasum -c`-compatible manifest.
+"""
+
+import glob
+import hashlib
+import os
+import re
+import shutil
+import sys
+from multiprocessing.pool import ThreadPool
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))  # for asset_scripts
+from asset_scripts.optimize_png import PngCache, optimize_files
+from file_utils import sha1_file
+
+
+STAMP = "stamp"
+LINK = "link"
+COPY = "copy"
+PNG = "png"
+TREE = "tree"
+
+SDK_MANIFEST = (
+    ("CardIO_Public_API/*.h", "CardIO", STAMP),
+    ("opencv_device/lib/*.a", "CardIO", LINK),
+    ("Release/CardIO/CardIO.m", "CardIO", COPY),
+    ("Release/release_notes.txt", "", COPY),
+    ("Release/CardIO.podspec", "", COPY),
+    ("Release/acknowledgments.md", "", COPY),
+    ("Release/LICENSE.md", "", COPY),
+    ("Release/README.md", "", COPY),
+    ("Release/SampleApp", "SampleApp", TREE),
+    ("Release/SampleApp-Swift", "SampleApp-Swift", TREE),
+)
+
+IGNORED_FILE_NAMES = frozenset([".DS_Store"])
+
+HEADER_NAME_LINE_RE = re.compile("^(//\s+)CardIO.*\.h$")
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_THREADS = 8
+
+
+def stamp_header(source, destination, version_str):
+    """
+    Copy a public header, adding "//  Version <version_str>" after the line naming the header. Returns its SHA-1.
+    """
+    sha1 = hashlib.sha1()
+    with open(source, "r") as in_file:
+        with open(destination, "w") as out_file:
+            for line in in_file:
+                out_lines = [line]
+                m = HEADER_NAME_LINE_RE.match(line)
+                if m:
+                    out_lines.append("{0}Version {1}\n".format(m.groups()[0], version_str))
+                    out_lines.append("//\n")
+                for out_line in out_lines:
+                    out_file.write(out_line)
+                    sha1.update(out_line)
+    return sha1.hexdigest()
+
+
+def copy_file(source, destination):
+    """
+    Copy source to destination in large chunks, keeping its mode and times. Returns its SHA-1.
+    """
+    sha1 = hashlib.sha1()
+    with open(source, "rb") as in_file:
+        with open(destination, "wb") as out_file:
+            for chunk in iter(lambda: in_file.read(CHUNK_SIZE), b""):
+                out_file.write(chunk)
+                sha1.update(chunk)
+    shutil.copystat(source, destination)
+    return sha1.hexdigest()
+
+
+def link_file(source, destination):
+    """
+    Hardlink source at destination, falling back to copy_file (e.g. across file systems). Returns its SHA-1.
+    """
+    try:
+        os.link(source, destination)
+    except (AttributeError, OSError):
+        return copy_file(source, destination)
+    return sha1_file(destination)
+
+
+def write_file(data, source, destination):
+    """
+    Write data to destination, with the mode and times of source. Returns its SHA-1.
+    """
+    with open(destination, "wb") as out_file:
+        out_file.write(data)
+    shutil.copystat(source, destination)
+    return hashlib.sha1(data).hexdigest()
+
+
+def plan(manifest, root):
+    """
+    Expand the manifest into a sorted list of (source path, path relative to the SDK directory, how) file copies.
+    """
+    copies = []
+    for source, destination, how in manifest:
+        source_path = os.path.join(root, source)
+        matches = sorted(glob.glob(source_path))
+        if not matches and not glob.has_magic(source):
+            raise IOError("{0} is listed in the SDK manifest but does not exist".format(source_path))
+        for match in matches:
+            if how == TREE:
+                for directory, subdirectories, files in os.walk(match):
+                    subdirectories.sort()
+                    for filename in sorted(files):
+                        if filename not in IGNORED_FILE_NAMES:
+                            path = os.path.join(directory, filename)
+                            how = PNG if filename.endswith(".png") else COPY
+                            copies.append((path, os.path.join(destination, os.path.relpath(path, match)), how))
+            else:
+                copies.append((match, os.path.join(destination, os.path.basename(match)), how))
+    return sorted(copies, key=lambda copy: copy[1])
+
+
+def _perform(copy, sdk_dir, version_str, optimized_pngs):
+    source, relative_path, how = copy
+    destination = os.path.join(sdk_dir, relative_path)
+    if how == STAMP:
+        return stamp_header(source, destination, version_str)
+    if how == LINK:
+        return link_file(source, destination)
+    if how == PNG and source in optimized_pngs:
+        return write_file(optimized_pngs[source], source, destination)
+    return copy_file(source, destination)  # including an image that could not be optimized
+
+
+def assemble_sdk(sdk_dir, root, version_str, manifest=SDK_MANIFEST, manifest_path=None, threads=DEFAULT_THREADS):
+    """
+    Recreate sdk_dir from manifest, with version_str stamped into the public headers.
+
+    Writes "<sha1>  <path>" for every file in sdk_dir to manifest_path (default: sdk_dir + ".sha1"),
+    and returns [(path relative to sdk_dir, sha1)], sorted by path.
+    """
+    copies = plan(manifest, root)
+
+    if os.path.isdir(sdk_dir):
+        shutil.rmtree(sdk_dir)
+    os.makedirs(sdk_dir)
+    for directory in sorted(set(os.path.dirname(relative_path) for unused, relative_path, unused in copies)):
+        if directory and not os.path.isdir(os.path.join(sdk_dir, directory)):
+            os.makedirs(os.path.join(sdk_dir, directory))
+
+    optimized_pngs, unused = optimize_files([source for source, unused, how in copies if how == PNG], cache=PngCache())
+    optimized_pngs = dict((png.path, png.data) for png in optimized_pngs)
+
+    pool = ThreadPool(max(1, min(threads, len(copies))))
+    try:
+        hashes = pool.map(lambda copy: _perform(copy, sdk_dir, version_str, optimized_pngs), copies)
+    finally:
+        pool.close()
+        pool.join()
+
+    file_hashes = [(relative_path, file_hash) for (unused, relative_path, unused), file_hash in zip(copies, hashes)]
+
+    manifest_path = manifest_path or sdk_dir.rstrip(os.sep) + ".sha1"
+    with open(manifest_path, "w") as f:
+        for relative_path, file_hash in file_hashes:
+            f.write("{0}  {1}\n".format(file_hash, relative_path))
+
+    return file_hashes
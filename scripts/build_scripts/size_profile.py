@@ -0,0 +1,509 @@
+#!/usr/bin/env python
+"""
+Break down the size of what the SDK embeds in an app, and check it against a recorded baseline and budgets.
+
+Two kinds of input:
+  - static libraries (libCardIO.a, the OpenCV libraries): universal (fat) files are split into their slices,
+    each slice's `ar` archive into its members, and each Mach-O object into its sections, symbol tables,
+    relocations and headers. The parser is pure Python, so it runs anywhere, not just on a Mac.
+  - the asset bundle in a generated Objective-C file (Classes/CardIOBundle.m): its bytes are attributed to
+    each asset's stored payload, to the index, and to each locale (its share of the string table, as
+    `string_tables.py --report` computes it, plus its compressed .strings file).
+
+Every input becomes a flat set of named sizes ("metrics"):
+    libCardIO.a                                 the whole file
+    libCardIO.a:arm64                           one slice
+    libCardIO.a:arm64:section:__TEXT,__text     one section (or "(symbols)", "(relocations)", "(headers)"...), over all objects
+    libCardIO.a:arm64:object:CardIOView.o       one archive member
+    CardIOBundle                                the whole bundle
+    CardIOBundle:index                          header, index and names
+    CardIOBundle:asset:CreditCardLogos/...      one asset's payload (a payload shared by several assets counts once)
+    CardIOBundle:locale:en                      one locale
+
+A baseline (default: size_baseline.json, next to this script) records the metrics of a known-good build, under
+a label (one per build variant), and a list of budgets: [pattern, limit] pairs. The first pattern that matches a
+metric sets how much it may grow past its baseline: a number of bytes, or a percentage ("2%"). In a pattern, "*"
+matches within one level of the name (anything but ":") and "**" matches across levels. Metrics that no budget
+matches are reported, but never fail the check.
+
+Examples (from the top directory):
+    scripts/build_scripts/size_profile.py Classes/CardIOBundle.m ~/card.io_ios_sdk_5.4.1/CardIO/*.a
+    scripts/build_scripts/size_profile.py Classes/CardIOBundle.m --budget "CardIOBundle:asset:*=512"
+    scripts/build_scripts/size_profile.py Classes/CardIOBundle.m ~/card.io_ios_sdk_5.4.1/CardIO/*.a --update-baseline
+"""
+
+import argparse
+import collections
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))  # for asset_scripts
+from asset_scripts.asset_bundle import AssetBundleError, load_bundle
+from string_scripts.string_tables import STRING_TABLE_PATH, StringTableError, StringTables, size_report
+
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "size_baseline.json")
+DEFAULT_LABEL = "default"
+
+DEFAULT_BUDGETS = (
+    ("*.a", "2%"),
+    ("*.a:*", "2%"),  # each architecture
+    ("CardIOBundle", "2%"),
+    ("CardIOBundle:locale:*", "512"),
+    ("CardIOBundle:asset:*", "1024"),
+)
+
+BUNDLE_NAME = "CardIOBundle"
+
+# Universal files
+FAT_MAGIC = 0xcafebabe
+FAT_MAGIC_64 = 0xcafebabf
+FAT_HEADER_FORMAT = ">II"
+FAT_ARCH_FORMAT = ">iiIII"
+FAT_ARCH_64_FORMAT = ">iiQQII"
+
+# ar archives
+AR_MAGIC = "!<arch>\n"
+AR_HEADER_FORMAT = "16s12s6s6s8s10s2s"
+AR_HEADER_SIZE = struct.calcsize(AR_HEADER_FORMAT)
+AR_SYMBOL_TABLE_NAMES = frozenset(["__.SYMDEF", "__.SYMDEF SORTED", "__.SYMDEF_64", "__.SYMDEF_64 SORTED", "/", "/SYM64/"])
+
+# Mach-O
+MH_MAGIC = 0xfeedface
+MH_MAGIC_64 = 0xfeedfacf
+MACH_HEADER_FORMAT = "<IiiIIII"
+MACH_HEADER_64_SIZE = 32
+LC_SEGMENT = 0x1
+LC_SYMTAB = 0x2
+LC_SEGMENT_64 = 0x19
+SEGMENT_FORMAT = "<II16sIIIIiiII"
+SEGMENT_64_FORMAT = "<II16sQQQQiiII"
+SECTION_FORMAT = "<16s16sIIIIIIIII"
+SECTION_64_FORMAT = "<16s16sQQIIIIIIII"
+SYMTAB_FORMAT = "<IIIIII"
+NLIST_SIZE = 12
+NLIST_64_SIZE = 16
+RELOCATION_SIZE = 8
+SECTION_TYPE_MASK = 0xff
+ZEROFILL_SECTION_TYPES = frozenset([0x1, 0xc, 0x12])  # S_ZEROFILL, S_GB_ZEROFILL, S_THREAD_LOCAL_ZEROFILL
+
+SYMBOLS = "(symbols)"
+RELOCATIONS = "(relocations)"
+HEADERS = "(headers)"
+NOT_MACHO = "(not Mach-O)"
+SYMBOL_TABLE = "(archive symbol table)"
+
+CPU_TYPE_X86 = 7
+CPU_TYPE_ARM = 12
+CPU_ARCH_ABI64 = 0x01000000
+CPU_SUBTYPE_MASK = 0x00ffffff
+ARCH_NAMES = {
+    (CPU_TYPE_X86, None): "i386",
+    (CPU_TYPE_X86 | CPU_ARCH_ABI64, None): "x86_64",
+    (CPU_TYPE_ARM, 6): "armv6",
+    (CPU_TYPE_ARM, 9): "armv7",
+    (CPU_TYPE_ARM, 11): "armv7s",
+    (CPU_TYPE_ARM, None): "arm",
+    (CPU_TYPE_ARM | CPU_ARCH_ABI64, None): "arm64",
+}
+
+
+class SizeProfileError(ValueError):
+    pass
+
+
+class Regression(collections.namedtuple("Regression", "name baseline size limit")):
+    __slots__ = ()
+
+    @property
+    def growth(self):
+        return self.size - self.baseline
+
+
+def arch_name(cputype, cpusubtype):
+    return (ARCH_NAMES.get((cputype, cpusubtype & CPU_SUBTYPE_MASK)) or ARCH_NAMES.get((cputype, None)) or
+            "cpu{0}.{1}".format(cputype, cpusubtype & CPU_SUBTYPE_MASK))
+
+
+# --- Parsing ----------------------------------------------------------------
+
+def fat_slices(data):
+    """
+    Return [(arch, offset, size)] for a universal file, or None if data is not one.
+    """
+    if len(data) < 8:
+        return None
+    magic, count = struct.unpack_from(FAT_HEADER_FORMAT, data, 0)
+    if magic not in (FAT_MAGIC, FAT_MAGIC_64):
+        return None
+    arch_format = FAT_ARCH_64_FORMAT if magic == FAT_MAGIC_64 else FAT_ARCH_FORMAT
+    arch_size = struct.calcsize(arch_format)
+    if 8 + count * arch_size > len(data):
+        raise SizeProfileError("universal header lists {0} slices, past the end of the file".format(count))
+    slices = []
+    for index in range(count):
+        fields = struct.unpack_from(arch_format, data, 8 + index * arch_size)
+        cputype, cpusubtype, offset, size = fields[:4]
+        if offset + size > len(data):
+            raise SizeProfileError("the {0} slice extends past the end of the file".format(arch_name(cputype, cpusubtype)))
+        slices.append((arch_name(cputype, cpusubtype), offset, size))
+    return slices
+
+
+def ar_members(data, offset, size):
+    """
+    Return [(name, data offset, data size, header size)] for the members of the ar archive at data[offset:offset + size],
+    or None if it is not one. BSD ("#1/<length>") and GNU ("/<offset>") long names are resolved.
+    """
+    if data[offset:offset + len(AR_MAGIC)] != AR_MAGIC:
+        return None
+    members = []
+    long_names = ""
+    position = offset + len(AR_MAGIC)
+    end = offset + size
+    while position + AR_HEADER_SIZE <= end:
+        raw_name, unused, unused, unused, unused, raw_size, fmag = struct.unpack_from(AR_HEADER_FORMAT, data, position)
+        if fmag != "`\n":
+            raise SizeProfileError("corrupt archive member header at offset {0}".format(position - offset))
+        try:
+            member_size = int(raw_size.strip())
+        except ValueError:
+            raise SizeProfileError("corrupt archive member size at offset {0}".format(position - offset))
+        header_size = AR_HEADER_SIZE
+        name = raw_name.rstrip(" ")
+        if name.startswith("#1/"):
+            name_length = int(name[3:])
+            name = data[position + AR_HEADER_SIZE:position + AR_HEADER_SIZE + name_length].rstrip("\0")
+            header_size += name_length
+            member_size -= name_length
+        elif name == "//":
+            long_names = data[position + AR_HEADER_SIZE:position + AR_HEADER_SIZE + member_size]
+        elif name.startswith("/") and name[1:].isdigit():
+            start = int(name[1:])
+            name = long_names[start:long_names.find("\n", start) if "\n" in long_names[start:] else len(long_names)]
+        if name not in AR_SYMBOL_TABLE_NAMES and name != "//":
+            name = name.rstrip("/")
+        if position + header_size + member_size > end:
+            raise SizeProfileError("archive member {0} extends past the end of the archive".format(name))
+        members.append((name, position + header_size, member_size, header_size))
+        position += header_size + member_size + (header_size + member_size) % 2
+    return members
+
+
+def macho_object(data, offset, size):
+    """
+    Return (arch, {section or SYMBOLS/RELOCATIONS/HEADERS: bytes in the file}) for the Mach-O object at
+    data[offset:offset + size], or None if it is not one. Zero-fill sections take no bytes in the file.
+    """
+    if size < 28:
+        return None
+    magic, cputype, cpusubtype, unused, command_count, unused, unused = struct.unpack_from(MACH_HEADER_FORMAT, data, offset)
+    if magic not in (MH_MAGIC, MH_MAGIC_64):
+        return None
+    is_64 = magic == MH_MAGIC_64
+    segment_command, segment_format, section_format, nlist_size = (
+        (LC_SEGMENT_64, SEGMENT_64_FORMAT, SECTION_64_FORMAT, NLIST_64_SIZE) if is_64 else
+        (LC_SEGMENT, SEGMENT_FORMAT, SECTION_FORMAT, NLIST_SIZE))
+
+    sizes = collections.defaultdict(int)
+    position = offset + (MACH_HEADER_64_SIZE if is_64 else struct.calcsize(MACH_HEADER_FORMAT))
+    for unused in range(command_count):
+        if position + 8 > offset + size:
+            raise SizeProfileError("load commands extend past the end of the object")
+        command, command_size = struct.unpack_from("<II", data, position)
+        if command_size < 8:
+            raise SizeProfileError("corrupt load command")
+        if command == segment_command:
+            section_count = struct.unpack_from(segment_format, data, position)[9]
+            section_position = position + struct.calcsize(segment_format)
+            for unused in range(section_count):
+                fields = struct.unpack_from(section_format, data, section_position)
+                section_name, segment_name, section_size = fields[0], fields[1], fields[3]
+                relocation_count, flags = fields[7], fields[8]
+                if flags & SECTION_TYPE_MASK not in ZEROFILL_SECTION_TYPES:
+                    sizes["{0},{1}".format(segment_name.rstrip("\0"), section_name.rstrip("\0"))] += section_size
+                sizes[RELOCATIONS] += relocation_count * RELOCATION_SIZE
+                section_position += struct.calcsize(section_format)
+        elif command == LC_SYMTAB:
+            unused, unused, unused, symbol_count, unused, string_size = struct.unpack_from(SYMTAB_FORMAT, data, position)
+            sizes[SYMBOLS] += symbol_count * nlist_size + string_size
+        position += command_size
+
+    sizes[HEADERS] = size - sum(sizes.itervalues())  # headers, load commands and alignment padding
+    return arch_name(cputype, cpusubtype), dict(sizes)
+
+
+# --- Profiles ---------------------------------------------------------------
+
+def _slice_metrics(metrics, prefix, data, offset, size):
+    """
+    Add the metrics of one slice (an archive, or a single object) to metrics. Returns its arch, or None if unknown.
+    """
+    members = ar_members(data, offset, size)
+    if members is None:
+        members = [("", offset, size, 0)]
+        if macho_object(data, offset, size) is None:
+            return None
+    arch = None
+    objects = []
+    for name, member_offset, member_size, header_size in members:
+        if name in AR_SYMBOL_TABLE_NAMES or name == "//":
+            objects.append((name, None, {SYMBOL_TABLE: member_size, HEADERS: header_size}))
+            continue
+        parsed = macho_object(data, member_offset, member_size)
+        if parsed is None:
+            objects.append((name, None, {NOT_MACHO: member_size, HEADERS: header_size}))
+            continue
+        arch = arch or parsed[0]
+        sections = parsed[1]
+        sections[HEADERS] += header_size
+        objects.append((name, parsed[0], sections))
+
+    slice_prefix = "{0}:{1}".format(prefix, arch or "unknown")
+    metrics[slice_prefix] = metrics.get(slice_prefix, 0) + size
+    archive_overhead = size - sum(sum(sections.itervalues()) for unused, unused, sections in objects)
+    for name, unused, sections in objects:
+        if name:
+            object_name = "{0}:object:{1}".format(slice_prefix, name)
+            metrics[object_name] = metrics.get(object_name, 0) + sum(sections.itervalues())
+        for section, section_size in sections.iteritems():
+            section_name = "{0}:section:{1}".format(slice_prefix, section)
+            metrics[section_name] = metrics.get(section_name, 0) + section_size
+    if archive_overhead:
+        section_name = "{0}:section:{1}".format(slice_prefix, HEADERS)
+        metrics[section_name] = metrics.get(section_name, 0) + archive_overhead  # the magic and member padding
+    return arch
+
+
+def library_profile(path):
+    """
+    Return {metric: bytes} for a static library (or any Mach-O file), universal or not.
+    A file that is neither is measured only as a whole.
+    """
+    name = os.path.basename(path)
+    size = os.path.getsize(path)
+    metrics = {name: size}
+    if not size:
+        return metrics
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            slices = fat_slices(data)
+            if slices is None:
+                _slice_metrics(metrics, name, data, 0, size)
+            else:
+                for arch, offset, slice_size in slices:
+                    _slice_metrics(metrics, name, data, offset, slice_size)
+                # The fat header, and the alignment padding between slices
+                metrics[name + ":(headers)"] = size - sum(slice_size for unused, unused, slice_size in slices)
+        finally:
+            data.close()
+    return metrics
+
+
+def bundle_profile(path):
+    """
+    Return {metric: bytes} for the asset bundle in a generated Objective-C file (or a raw bundle file).
+    """
+    bundle = load_bundle(path)
+    metrics = {BUNDLE_NAME: len(bundle.data), BUNDLE_NAME + ":index": bundle.payload_offset}
+    counted_payloads = set()
+    stored_by_path = {}
+    for entry in bundle.entries():
+        stored = 0 if entry.payload_offset in counted_payloads else entry.stored_length
+        counted_payloads.add(entry.payload_offset)
+        stored_by_path[entry.path] = stored
+        metrics["{0}:asset:{1}".format(BUNDLE_NAME, entry.path)] = stored
+
+    if bundle.find(STRING_TABLE_PATH) is not None:
+        tables = StringTables(bundle.read(STRING_TABLE_PATH))
+        strings_by_language = dict((language, tables.resolved_strings(index)) for index, language in enumerate(tables.languages()))
+        report, unused = size_report(strings_by_language)
+        for language, unused, unused, table_bytes in report:
+            strings_file_bytes = stored_by_path.get("strings/{0}.strings".format(language), 0)
+            metrics["{0}:locale:{1}".format(BUNDLE_NAME, language)] = table_bytes + strings_file_bytes
+    return metrics
+
+
+def profile(paths):
+    """
+    Return {metric: bytes} for every path: generated Objective-C bundles (.m) and libraries (anything else).
+    """
+    metrics = {}
+    for path in paths:
+        try:
+            metrics.update(bundle_profile(path) if path.endswith((".m", ".mm")) else library_profile(path))
+        except (AssetBundleError, StringTableError, SizeProfileError, struct.error) as e:
+            raise SizeProfileError("{0}: {1}".format(path, e))
+    return metrics
+
+
+# --- Budgets ----------------------------------------------------------------
+
+def _pattern_re(pattern):
+    parts = re.split(r"(\*\*|\*)", pattern)
+    return re.compile("".join(".*" if part == "**" else "[^:]*" if part == "*" else re.escape(part) for part in parts) + "$")
+
+
+def parse_limit(limit):
+    """
+    Return (bytes, fraction) for a budget limit: "4096" is (4096, None) and "2%" is (None, 0.02).
+    """
+    limit = str(limit).strip()
+    try:
+        if limit.endswith("%"):
+            return None, float(limit[:-1]) / 100
+        return int(limit), None
+    except ValueError:
+        raise SizeProfileError("budget limit {0!r} is neither a number of bytes nor a percentage".format(limit))
+
+
+def budget_for(name, budgets):
+    """
+    Return the limit of the first budget whose pattern matches name, or None.
+    """
+    for pattern, limit in budgets:
+        if _pattern_re(pattern).match(name):
+            return limit
+    return None
+
+
+def regressions(metrics, baseline_metrics, budgets):
+    """
+    Return a Regression for every budgeted metric that grew past its baseline by more than its limit.
+    """
+    found = []
+    for name in sorted(metrics):
+        limit = budget_for(name, budgets)
+        if limit is None or name not in baseline_metrics:
+            continue
+        limit_bytes, fraction = parse_limit(limit)
+        allowed = limit_bytes if fraction is None else int(baseline_metrics[name] * fraction)
+        if metrics[name] - baseline_metrics[name] > allowed:
+            found.append(Regression(name, baseline_metrics[name], metrics[name], limit))
+    return found
+
+
+def load_baseline(path):
+    """
+    Return the baseline at path ({"budgets": [[pattern, limit]], "profiles": {label: {metric: bytes}}}), or an empty one.
+    """
+    try:
+        with open(path, "r") as f:
+            baseline = json.load(f)
+    except IOError:
+        baseline = {}
+    except ValueError as e:
+        raise SizeProfileError("{0} is not valid JSON: {1}".format(path, e))
+    baseline.setdefault("budgets", [list(budget) for budget in DEFAULT_BUDGETS])
+    baseline.setdefault("profiles", {})
+    return baseline
+
+
+def save_baseline(path, baseline):
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True, separators=(",", ": "))
+        f.write("\n")
+
+
+# --- Reporting --------------------------------------------------------------
+
+def report_lines(metrics, top=10):
+    """
+    Return the report of metrics: each file, then the largest parts of each of its levels.
+    """
+    lines = []
+    children = collections.defaultdict(list)
+    for name in metrics:
+        parent, separator, unused = name.rpartition(":")
+        if separator and parent.rsplit(":", 1)[-1] in ("section", "object", "asset", "locale"):
+            parent, unused, unused = parent.rpartition(":")
+            kind = name[len(parent) + 1:].split(":", 1)[0]
+            children[parent, kind].append(name)
+        elif separator:
+            children[parent, None].append(name)
+
+    def describe(name, depth):
+        lines.append("{0}{1:>10}  {2}".format("  " * depth, metrics[name], name))
+        for kind in (None, "section", "object", "asset", "locale"):
+            names = sorted(children.get((name, kind), []), key=lambda child: (-metrics[child], child))
+            shown = names if kind is None else names[:top]
+            for child in shown:
+                if kind is None:
+                    describe(child, depth + 1)
+                else:
+                    lines.append("{0}{1:>10}  {2}".format("  " * (depth + 1), metrics[child], child))
+            if len(names) > len(shown):
+                lines.append("{0}{1:>10}  ... {2} more {3}s".format("  " * (depth + 1), sum(metrics[child] for child in names[top:]),
+                                                                     len(names) - top, kind))
+
+    for name in sorted(name for name in metrics if ":" not in name):
+        describe(name, 0)
+    return lines
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="static libraries, and generated bundle sources (e.g., 'Classes/CardIOBundle.m')")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="the baseline to compare with (default: size_baseline.json next to this script)")
+    parser.add_argument("--label", default=DEFAULT_LABEL, help="which of the baseline's profiles to compare with (default '{0}')".format(DEFAULT_LABEL))
+    parser.add_argument("--budget", action="append", default=[], metavar="PATTERN=LIMIT",
+                        help="allow metrics matching PATTERN to grow by LIMIT (bytes, or a percentage); checked before the baseline's budgets")
+    parser.add_argument("--update-baseline", action="store_true", help="record these sizes as the baseline for the label")
+    parser.add_argument("--top", type=int, default=10, help="how many sections, objects, assets or locales to list for each (default 10)")
+    parser.add_argument("--json", metavar="PATH", help="also write the metrics to PATH")
+    args = parser.parse_args(argv)
+
+    try:
+        metrics = profile(args.paths)
+        baseline = load_baseline(args.baseline)
+        budgets = []
+        for budget in args.budget:
+            pattern, separator, limit = budget.rpartition("=")
+            if not separator or not pattern:
+                parser.error("--budget {0!r} is not PATTERN=LIMIT".format(budget))
+            parse_limit(limit)
+            budgets.append((pattern, limit))
+        budgets.extend(tuple(budget) for budget in baseline["budgets"])
+        found = regressions(metrics, baseline["profiles"].get(args.label, {}), budgets)
+    except (SizeProfileError, IOError) as e:
+        print "size_profile: {0}".format(e)
+        return 1
+
+    for line in report_lines(metrics, args.top):
+        print line
+
+    if args.json:
+        save_baseline(args.json, metrics)
+
+    if args.update_baseline:
+        baseline["profiles"][args.label] = metrics
+        save_baseline(args.baseline, baseline)
+        print "[{0}] recorded {1} metrics as the '{2}' baseline".format(args.baseline, len(metrics), args.label)
+        return 0
+
+    baseline_metrics = baseline["profiles"].get(args.label)
+    if baseline_metrics is None:
+        print "[{0}] has no '{1}' baseline to compare with; record one with --update-baseline".format(args.baseline, args.label)
+        return 0
+    for regression in found:
+        print "over budget: {0} grew by {1} bytes ({2} -> {3}; budget {4})".format(
+            regression.name, regression.growth, regression.baseline, regression.size, regression.limit)
+    checked = len([name for name in metrics if name in baseline_metrics and budget_for(name, budgets) is not None])
+    if found:
+        print "[{0}] {1} of {2} budgeted metrics are over budget against the '{3}' baseline".format(
+            args.baseline, len(found), checked, args.label)
+        return 1
+    print "[{0}] {1} budgeted metrics are within budget against the '{2}' baseline".format(args.baseline, checked, args.label)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Tests for artifact_cache.py: stored files come back intact, and a cache that cannot be written or read is only
+ever a miss, never a failed build.
+
+    python -m unittest discover -s scripts -p "test_*.py"
+"""
+
+import contextlib
+import os
+import resource
+import shutil
+import signal
+import tempfile
+import unittest
+
+from artifact_cache import ArtifactCache
+
+
+CONTENTS = "libCardIO.a " * 1000
+
+
+@contextlib.contextmanager
+def _file_size_limit(limit):
+    """
+    Make writes past limit bytes fail (with IOError EFBIG, rather than a SIGXFSZ) in the block.
+    """
+    previous_limits = resource.getrlimit(resource.RLIMIT_FSIZE)
+    previous_handler = signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+    resource.setrlimit(resource.RLIMIT_FSIZE, (limit, previous_limits[1]))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_FSIZE, previous_limits)
+        signal.signal(signal.SIGXFSZ, previous_handler)
+
+
+class ArtifactCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="test_artifact_cache_")
+        self.cache = ArtifactCache(os.path.join(self.temp_dir, "artifacts"))
+        self.library = os.path.join(self.temp_dir, "libCardIO.a")
+        with open(self.library, "wb") as f:
+            f.write(CONTENTS)
+        self.destination = os.path.join(self.temp_dir, "out")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, True)
+
+    def fetched(self):
+        with open(os.path.join(self.destination, "libCardIO.a"), "rb") as f:
+            return f.read()
+
+    def test_store_and_fetch(self):
+        self.assertFalse(self.cache.fetch("key", "libCardIO.a", self.destination))
+        self.cache.store("key", self.library)
+        self.assertTrue(self.cache.fetch("key", "libCardIO.a", self.destination))
+        self.assertEqual(self.fetched(), CONTENTS)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_failed_store_is_ignored(self):
+        with _file_size_limit(len(CONTENTS) // 2):
+            self.cache.store("key", self.library)
+        self.assertFalse(self.cache.fetch("key", "libCardIO.a", self.destination))
+        self.assertEqual(os.listdir(os.path.join(self.temp_dir, "artifacts", "key")), [])  # no partial file
+
+    def test_failed_fetch_is_a_miss(self):
+        self.cache.store("key", self.library)
+        with _file_size_limit(len(CONTENTS) // 2):
+            self.assertFalse(self.cache.fetch("key", "libCardIO.a", self.destination))
+        self.assertFalse(os.path.exists(os.path.join(self.destination, "libCardIO.a")))  # no partial file
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+        self.assertTrue(self.cache.fetch("key", "libCardIO.a", self.destination))
+        self.assertEqual(self.fetched(), CONTENTS)
+
+    def test_evict(self):
+        self.cache.store("old", self.library)
+        self.cache.store("new", self.library)
+        os.utime(os.path.join(self.temp_dir, "artifacts", "old"), (0, 0))
+        self.assertEqual(self.cache.evict(), len(CONTENTS))  # older than max_age_days
+        self.assertEqual(os.listdir(os.path.join(self.temp_dir, "artifacts")), ["new"])
+        self.cache.max_bytes = len(CONTENTS) - 1
+        self.assertEqual(self.cache.evict(), len(CONTENTS))
+        self.assertEqual(os.listdir(os.path.join(self.temp_dir, "artifacts")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
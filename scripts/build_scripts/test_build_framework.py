@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+Tests for opencv_device/doc/build_framework_2012_09_17.py, run with the stand-in build tools in shims/ on $PATH over
+a small stand-in OpenCV source tree: builds are cached (and keyed by the Xcode and SDK versions), <outputdir>/universal
+is kept in step with the headers, and a failing command fails the script.
+
+    python -m unittest discover -s scripts -p "test_*.py"
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir)
+SCRIPT_PATH = os.path.join(ROOT_PATH, "opencv_device", "doc", "build_framework_2012_09_17.py")
+SHIMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shims")
+
+HEADERS = {
+    "modules/core/include/opencv2/core/core.hpp": "// core\n",
+    "modules/core/include/opencv2/core/types_c.h": "// types\n",
+    "modules/imgproc/include/opencv2/imgproc/imgproc.hpp": "// imgproc\n",
+    "include/opencv2/opencv.hpp": "// opencv\n",
+}
+
+
+class BuildFrameworkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="test_build_framework_")
+        self.srcroot = os.path.join(self.temp_dir, "opencv")
+        self.outdir = os.path.join(self.temp_dir, "out")
+        self.universal = os.path.join(self.outdir, "universal")
+        for path, contents in HEADERS.items():
+            self.write(os.path.join(self.srcroot, path), contents)
+        self.env = dict(os.environ, PATH=SHIMS_PATH + os.pathsep + os.environ.get("PATH", ""),
+                        CARDIO_CACHE_DIR=os.path.join(self.temp_dir, "cache"))
+        for name in ("SHIM_FAIL", "SHIM_DELAY", "SHIM_SDK_VERSION", "SHIM_XCODE_VERSION", "DEVELOPER_DIR"):
+            self.env.pop(name, None)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, True)
+
+    def write(self, path, contents):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as f:
+            f.write(contents)
+
+    def build(self, *args, **env):
+        """
+        Run the script; returns (exit status, output).
+        """
+        process = subprocess.Popen([sys.executable, SCRIPT_PATH, "--srcroot", self.srcroot] + list(args) + [self.outdir],
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=dict(self.env, **env))
+        output = process.communicate()[0]
+        return process.returncode, output
+
+    def assert_builds(self, *args, **env):
+        returncode, output = self.build(*args, **env)
+        self.assertEqual(returncode, 0, output)
+        return output
+
+    def universal_files(self):
+        files = set()
+        for directory, unused, names in os.walk(self.universal):
+            files.update(os.path.relpath(os.path.join(directory, name), self.universal) for name in names)
+        return files
+
+    def test_builds_universal_libraries_and_headers(self):
+        output = self.assert_builds()
+        self.assertNotIn("Reusing cached", output)
+        self.assertEqual(self.universal_files(), set([
+            os.path.join("lib", "libopencv_core.a"),
+            os.path.join("lib", "libopencv_imgproc.a"),
+            os.path.join("include", "opencv2", "core", "core.hpp"),
+            os.path.join("include", "opencv2", "core", "types_c.h"),
+            os.path.join("include", "opencv2", "imgproc", "imgproc.hpp"),
+            os.path.join("include", "opencv2", "opencv.hpp"),
+        ]))
+        with open(os.path.join(self.universal, "lib", "libopencv_core.a")) as f:
+            library = f.read()
+        self.assertIn("ARCHS=armv7", library)
+        self.assertIn("ARCHS=armv7s", library)
+
+    def test_second_build_is_a_cache_hit(self):
+        self.assert_builds()
+        libraries = os.path.join(self.outdir, "build", "universal", "lib")
+        shutil.rmtree(libraries)
+        shutil.rmtree(os.path.join(self.outdir, "build", "armv7"))
+        output = self.assert_builds()
+        self.assertIn("Reusing cached universal libraries and headers", output)
+        self.assertIn("(0 files updated, 0 removed)", output)
+        self.assertNotIn("xcodebuild", output)
+        self.assertFalse(os.path.exists(os.path.join(self.outdir, "build", "armv7")))
+
+    def test_sources_and_toolchain_versions_are_in_the_key(self):
+        self.assert_builds()
+        self.assertNotIn("Reusing cached", self.assert_builds(SHIM_SDK_VERSION="8.0"))
+        self.assertNotIn("Reusing cached", self.assert_builds(SHIM_SDK_VERSION="8.0", SHIM_XCODE_VERSION="6.0"))
+        self.write(os.path.join(self.srcroot, "modules", "core", "src", "matrix.cpp"), "// changed\n")
+        self.assertNotIn("Reusing cached", self.assert_builds(SHIM_SDK_VERSION="8.0", SHIM_XCODE_VERSION="6.0"))
+        self.assertIn("Reusing cached", self.assert_builds(SHIM_SDK_VERSION="8.0", SHIM_XCODE_VERSION="6.0"))
+
+    def test_removed_and_stale_headers_are_removed(self):
+        self.assert_builds()
+        os.remove(os.path.join(self.srcroot, "modules", "core", "include", "opencv2", "core", "types_c.h"))
+        self.write(os.path.join(self.universal, "include", "opencv2", "imgproc", "stale", "old.hpp"), "// stale\n")
+        output = self.assert_builds()
+        self.assertNotIn("Reusing cached", output)  # the sources changed
+        self.assertIn("(0 files updated, 2 removed)", output)
+        self.assertNotIn(os.path.join("include", "opencv2", "core", "types_c.h"), self.universal_files())
+        self.assertFalse(os.path.exists(os.path.join(self.universal, "include", "opencv2", "imgproc", "stale")))
+
+    def test_changed_header_is_the_only_file_updated(self):
+        self.assert_builds()
+        self.write(os.path.join(self.srcroot, "include", "opencv2", "opencv.hpp"), "// opencv, changed\n")
+        output = self.assert_builds()
+        self.assertIn("(1 files updated, 0 removed)", output)
+        with open(os.path.join(self.universal, "include", "opencv2", "opencv.hpp")) as f:
+            self.assertEqual(f.read(), "// opencv, changed\n")
+
+    def test_failing_build_fails_the_script(self):
+        returncode, output = self.build(SHIM_FAIL="armv7s")
+        self.assertEqual(returncode, 1, output)
+        self.assertIn("BUILD FAILED:", output)
+        self.assertIn("error: failing as requested by SHIM_FAIL=armv7s", output)  # the tail of the failed job's log
+        self.assertFalse(os.path.exists(self.universal))
+        self.assertNotIn("Reusing cached", self.assert_builds())  # nothing of the failed build was cached
+        self.assertEqual(len(self.universal_files()), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
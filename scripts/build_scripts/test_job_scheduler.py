@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+Tests for job_scheduler.py, run with the stand-in build tools in shims/ on $PATH: per-arch xcodebuild jobs run
+side by side up to the limit, each logging to its own file, lipo starts only once its inputs are built, and the
+first failure stops the rest.
+
+    python -m unittest discover -s scripts -p "test_*.py"
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from job_scheduler import Job, JobFailed, run_jobs
+
+
+SHIMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shims")
+
+ARCHS = ("armv7", "armv7s", "arm64", "i386")
+DELAY = 0.3  # seconds each xcodebuild takes
+
+
+def _max_concurrency(jobs):
+    events = sorted([(job.start_time, 1) for job in jobs] + [(job.end_time, -1) for job in jobs])
+    running = peak = 0
+    for unused, change in events:
+        running += change
+        peak = max(peak, running)
+    return peak
+
+
+class RunJobsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="test_job_scheduler_")
+        self.log_dir = os.path.join(self.temp_dir, "logs")
+        self.env = dict(os.environ, PATH=SHIMS_PATH + os.pathsep + os.environ.get("PATH", ""), SHIM_DELAY=str(DELAY))
+        self.env.pop("SHIM_FAIL", None)
+        self.started = []
+        self.finished = []
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, True)
+
+    def build_dir(self, arch):
+        return os.path.join(self.temp_dir, "build", arch)
+
+    def jobs(self, archs=ARCHS, delays=None):
+        """
+        An xcodebuild job per arch, and a lipo job over their libraries.
+        """
+        jobs = []
+        for arch in archs:
+            delay = "SHIM_DELAY={0} ".format(delays[arch]) if delays and arch in delays else ""
+            jobs.append(Job("build " + arch, ["{0}xcrun xcodebuild -configuration Release ARCHS={1} CONFIGURATION_BUILD_DIR={2}".format(
+                delay, arch, self.build_dir(arch))]))
+        inputs = " ".join("-arch {0} {1}".format(arch, os.path.join(self.build_dir(arch), "libCardIO.a")) for arch in archs)
+        jobs.append(Job("lipo", ["xcrun -sdk iphoneos lipo -create {0} -output {1}".format(
+            inputs, os.path.join(self.temp_dir, "libCardIO.a"))], depends_on=[job.name for job in jobs]))
+        return jobs
+
+    def run_jobs(self, jobs, **kwargs):
+        return run_jobs(jobs, env=self.env, cwd=self.temp_dir, log_dir=self.log_dir,
+                        on_start=lambda job: self.started.append(job.name),
+                        on_finish=lambda job: self.finished.append(job.name), **kwargs)
+
+    def test_builds_run_concurrently(self):
+        jobs = self.run_jobs(self.jobs())
+        builds = jobs[:-1]
+        self.assertEqual(_max_concurrency(builds), len(ARCHS))
+        self.assertLess(max(job.end_time for job in builds) - min(job.start_time for job in builds), DELAY * len(ARCHS))
+        self.assertEqual(sorted(self.finished), sorted(job.name for job in jobs))
+
+    def test_concurrency_limit(self):
+        jobs = self.run_jobs(self.jobs(), max_jobs=2)
+        builds = jobs[:-1]
+        self.assertEqual(_max_concurrency(builds), 2)
+        self.assertGreaterEqual(max(job.end_time for job in builds) - min(job.start_time for job in builds), DELAY * 2)
+
+    def test_lipo_starts_after_its_inputs(self):
+        jobs = self.run_jobs(self.jobs())
+        lipo = jobs[-1]
+        self.assertEqual(self.started[-1], "lipo")
+        self.assertGreaterEqual(lipo.start_time, max(job.end_time for job in jobs[:-1]))
+        expected = ""
+        for arch in ARCHS:
+            with open(os.path.join(self.build_dir(arch), "libCardIO.a")) as f:
+                expected += f.read()
+        with open(os.path.join(self.temp_dir, "libCardIO.a")) as f:
+            self.assertEqual(f.read(), expected)
+
+    def test_each_job_has_its_own_log(self):
+        jobs = self.run_jobs(self.jobs())
+        self.assertEqual(len(set(job.log_path for job in jobs)), len(jobs))
+        self.assertEqual(sorted(os.listdir(self.log_dir)), sorted(os.path.basename(job.log_path) for job in jobs))
+        for job, arch in zip(jobs, ARCHS):
+            log = job.log_tail(None)
+            self.assertTrue(log.startswith("$ xcrun xcodebuild"), log)
+            self.assertIn("ARCHS=" + arch, log)
+            for other_arch in ARCHS:
+                if other_arch != arch:
+                    self.assertNotIn("ARCHS={0} ".format(other_arch), log)
+        self.assertIn("$ xcrun -sdk iphoneos lipo", jobs[-1].log_tail(None))
+
+    def test_failure_stops_everything(self):
+        self.env["SHIM_FAIL"] = "ARCHS=armv7s "
+        jobs = self.jobs(delays={"arm64": 10})
+        started = time.time()
+        with self.assertRaises(JobFailed) as context:
+            self.run_jobs(jobs)
+        self.assertLess(time.time() - started, 5)  # arm64 was stopped rather than waited for
+        failed = context.exception.job
+        self.assertEqual(failed.name, "build armv7s")
+        self.assertEqual(context.exception.returncode, 65)
+        self.assertIn("error: failing as requested by SHIM_FAIL", failed.log_tail())
+        jobs_by_name = dict((job.name, job) for job in jobs)
+        self.assertNotEqual(jobs_by_name["build arm64"].returncode, 0)
+        self.assertNotIn("lipo", self.started)
+        self.assertIsNone(jobs_by_name["lipo"].returncode)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "libCardIO.a")))
+
+    def test_failure_of_a_later_command(self):
+        job = Job("two steps", ["true", "false", "touch never"], cwd=self.temp_dir)
+        with self.assertRaises(JobFailed) as context:
+            self.run_jobs([job])
+        self.assertEqual(context.exception.returncode, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "never")))
+
+    def test_bad_dependencies(self):
+        with self.assertRaises(ValueError):
+            run_jobs([Job("a", ["true"], depends_on=["missing"])])
+        with self.assertRaises(ValueError):
+            run_jobs([Job("a", ["true"], depends_on=["b"]), Job("b", ["true"], depends_on=["a"])])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Benchmark the .strings validation scripts against synthetic corpora, and flag regressions against a saved baseline.
+
+Each corpus is generated from the words in assets/strings/en.strings, with a configurable number of locales
+and keys, value length, HTML-tag density and substitutions per value. For each corpus size this reports:
+  - keys:     confirm_keys_for_language over every locale
+  - content:  validate_strings_for_language over every locale, plus the cost of each content rule
+  - release:  confirm_ready_for_release end to end (uncached)
+as lines/s, locales/s and peak RSS. Every benchmark runs in its own process so that peak RSS is its own.
+
+Example:
+    ./benchmark_strings_scripts.py --sizes 28x35,200x2000,500x20000 --save-baseline
+    ./benchmark_strings_scripts.py --sizes 28x35,200x2000,500x20000 --compare
+"""
+
+import Queue
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+
+from confirm_keys_for_language import key_problems
+from confirm_ready_for_release import confirm_ready_for_release
+from strings_index import ROOT_PATH, list_strings_files, load_expected_keys, parse_strings_file
+from validate_strings_for_language import CONTENT_RULES, content_problems, tokenize_value
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))  # for build_scripts
+from build_scripts.file_utils import cache_directory
+
+
+SEED_STRINGS_FILE = os.path.join(ROOT_PATH, "assets", "strings", "en.strings")
+BASELINE_FILE_NAME = "strings_benchmark_baseline.json"
+DEFAULT_SIZES = "28x35,200x2000"
+DEFAULT_TOLERANCE = 0.25
+
+# How often to check that a benchmark's process is still alive while waiting for its result
+CHILD_POLL_SECONDS = 1
+
+
+# --- Corpus generation ------------------------------------------------------
+
+def seed_words(path=SEED_STRINGS_FILE):
+    """
+    Return the distinct words found in the values of the seed .strings file.
+    """
+    words = set()
+    for entry in parse_strings_file(path):
+        if entry.value is not None:
+            words.update(word for word in re.split(r"[\s.,;:!?\\/()]+", entry.value) if word and "%" not in word)
+    return sorted(words)
+
+
+def synthetic_value(rng, words, value_length, tag_density, substitutions):
+    """
+    Return a value of about value_length bytes that obeys every content rule.
+    """
+    parts = []
+    length = 0
+    while length < value_length:
+        word = rng.choice(words)
+        if rng.random() < tag_density:
+            word = "<b>{0}</b>".format(word)
+        parts.append(word)
+        length += len(word) + 1
+    for index in range(substitutions):
+        parts.insert(rng.randint(0, len(parts)), "%{0}$@".format(index + 1))
+    return " ".join(parts)
+
+
+def generate_corpus(directory, locales, keys, value_length=40, tag_density=0.1, substitutions=1, seed=0):
+    """
+    Write a corpus of `locales` .strings files with `keys` keys each into directory/strings,
+    and the matching expected keys into directory/expected_keys. Returns (strings_path, expected_keys_path).
+    """
+    rng = random.Random(seed)
+    words = seed_words()
+    key_names = ["synthetic_key_{0}".format(index) for index in range(keys)]
+
+    strings_path = os.path.join(directory, "strings")
+    expected_keys_path = os.path.join(directory, "expected_keys")
+    os.makedirs(strings_path)
+    os.makedirs(expected_keys_path)
+
+    with open(os.path.join(expected_keys_path, "synthetic_keys.txt"), "w") as keys_file:
+        keys_file.write("\n".join(key_names) + "\n")
+
+    for locale_index in range(locales):
+        with open(os.path.join(strings_path, "l{0:05d}.strings".format(locale_index)), "w") as strings_file:
+            strings_file.write("// Synthetic benchmark locale {0}\n\n".format(locale_index))
+            for key in key_names:
+                value = synthetic_value(rng, words, value_length, tag_density, substitutions)
+                strings_file.write('"{0}" = "{1}";\n'.format(key, value))
+
+    return strings_path, expected_keys_path
+
+
+# --- Benchmarks -------------------------------------------------------------
+
+def _parse_all(strings_path):
+    return [parse_strings_file(os.path.join(strings_path, filename)) for filename in list_strings_files(strings_path)]
+
+
+def bench_keys(strings_path, expected_keys_path, jobs):
+    expected_keys = load_expected_keys(expected_keys_path)
+    strings_files = _parse_all(strings_path)
+    start = time.time()
+    for strings_file in strings_files:
+        key_problems(strings_file, expected_keys)
+    return time.time() - start, {}
+
+
+def bench_content(strings_path, expected_keys_path, jobs):
+    strings_files = _parse_all(strings_path)
+    start = time.time()
+    for strings_file in strings_files:
+        content_problems(strings_file)
+    elapsed = time.time() - start
+
+    # Per-rule cost, measured separately so that the timing calls do not inflate the total above.
+    values = [entry.value for strings_file in strings_files for entry in strings_file if entry.value is not None]
+    rule_seconds = {}
+    start = time.time()
+    all_tokens = [tokenize_value(value) for value in values]
+    rule_seconds["tokenize"] = time.time() - start
+    for name, check, unused in CONTENT_RULES:
+        start = time.time()
+        for tokens in all_tokens:
+            check(tokens)
+        rule_seconds[name] = time.time() - start
+    return elapsed, rule_seconds
+
+
+def bench_release(strings_path, expected_keys_path, jobs):
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        start = time.time()
+        confirm_ready_for_release(strings_path, jobs=jobs, use_cache=False, expected_keys_path=expected_keys_path)
+        elapsed = time.time() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return elapsed, {}
+
+
+BENCHMARKS = (
+    ("keys", bench_keys),
+    ("content", bench_content),
+    ("release", bench_release),
+)
+
+
+def _peak_rss_kb():
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    if sys.platform == "darwin":
+        rss //= 1024  # bytes on OS X, kilobytes on Linux
+    return rss
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def _run_in_child(queue, benchmark, args):
+    try:
+        elapsed, rule_seconds = benchmark(*args)
+    except BaseException:
+        queue.put((False, traceback.format_exc()))
+    else:
+        queue.put((True, (elapsed, rule_seconds, _peak_rss_kb())))
+
+
+def run_benchmark(benchmark, strings_path, expected_keys_path, jobs):
+    """
+    Run benchmark in a fresh process; return (seconds, per-rule seconds, peak RSS in KB).
+    Raises BenchmarkError if the benchmark raises, or its process dies, instead of returning them.
+    """
+    queue = multiprocessing.Queue()
+    child = multiprocessing.Process(target=_run_in_child, args=(queue, benchmark, (strings_path, expected_keys_path, jobs)))
+    child.start()
+    while True:
+        try:
+            succeeded, result = queue.get(timeout=CHILD_POLL_SECONDS)
+            break
+        except Queue.Empty:
+            if child.is_alive():
+                continue
+            try:
+                succeeded, result = queue.get(timeout=CHILD_POLL_SECONDS)  # in case it was put just before the exit
+                break
+            except Queue.Empty:
+                child.join()
+                raise BenchmarkError("{0} exited with status {1} and no result".format(benchmark.__name__, child.exitcode))
+    child.join()
+    if not succeeded:
+        raise BenchmarkError("{0} failed:\n{1}".format(benchmark.__name__, result))
+    return result
+
+
+def run_suite(sizes, value_length, tag_density, substitutions, seed, jobs):
+    """
+    Return {"<locales>x<keys>": {benchmark name: measurements}} for every size.
+    """
+    results = {}
+    for locales, keys in sizes:
+        corpus_directory = tempfile.mkdtemp(prefix="strings_benchmark_")
+        try:
+            strings_path, expected_keys_path = generate_corpus(corpus_directory, locales, keys,
+                                                               value_length, tag_density, substitutions, seed)
+            lines = sum(strings_file.line_count for strings_file in _parse_all(strings_path))
+            size_results = {}
+            for name, benchmark in BENCHMARKS:
+                elapsed, rule_seconds, peak_rss_kb = run_benchmark(benchmark, strings_path, expected_keys_path, jobs)
+                elapsed = max(elapsed, 1e-6)
+                size_results[name] = {
+                    "seconds": elapsed,
+                    "lines_per_second": lines / elapsed,
+                    "locales_per_second": locales / elapsed,
+                    "peak_rss_kb": peak_rss_kb,
+                    "rule_seconds": rule_seconds,
+                }
+            results["{0}x{1}".format(locales, keys)] = size_results
+        finally:
+            shutil.rmtree(corpus_directory, True)
+    return results
+
+
+# --- Reporting --------------------------------------------------------------
+
+def print_results(results):
+    for size in sorted(results, key=lambda size: [int(n) for n in size.split("x")]):
+        print "{0} (locales x keys)".format(size)
+        for name, unused in BENCHMARKS:
+            measurement = results[size][name]
+            print "    {0:<8} {1:>9.4f} s {2:>12.0f} lines/s {3:>10.1f} locales/s {4:>8d} KB peak RSS".format(
+                name, measurement["seconds"], measurement["lines_per_second"],
+                measurement["locales_per_second"], measurement["peak_rss_kb"])
+            rule_seconds = measurement["rule_seconds"]
+            for rule in sorted(rule_seconds, key=rule_seconds.get, reverse=True):
+                print "        {0:<36} {1:>9.4f} s".format(rule, rule_seconds[rule])
+
+
+def regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Return a message for every benchmark that is more than `tolerance` slower (or bigger) than its baseline.
+    """
+    messages = []
+    for size in sorted(results):
+        for name in sorted(results[size]):
+            try:
+                before = baseline[size][name]
+            except KeyError:
+                continue
+            after = results[size][name]
+            for metric in ("seconds", "peak_rss_kb"):
+                if before[metric] > 0 and after[metric] > before[metric] * (1 + tolerance):
+                    messages.append("{0} {1}: {2} went from {3:.4g} to {4:.4g} (+{5:.0%})".format(
+                        size, name, metric, before[metric], after[metric], after[metric] / float(before[metric]) - 1))
+    return messages
+
+
+def parse_sizes(sizes):
+    try:
+        return [tuple(int(n) for n in size.split("x")) for size in sizes.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("sizes must look like 28x35,200x2000")
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=parse_sizes, default=parse_sizes(DEFAULT_SIZES), help="comma-separated <locales>x<keys> corpus sizes (default {0})".format(DEFAULT_SIZES))
+    parser.add_argument("--value-length", type=int, default=40, help="approximate length of each value, in bytes")
+    parser.add_argument("--tag-density", type=float, default=0.1, help="fraction of words wrapped in an HTML tag")
+    parser.add_argument("--substitutions", type=int, default=1, help="positional substitutions per value")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the corpus generator")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="jobs for the confirm_ready_for_release benchmark (0 = one per CPU)")
+    parser.add_argument("--baseline", default=os.path.join(cache_directory(), BASELINE_FILE_NAME), help="baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="save these results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="exit with an error if any benchmark regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown before --compare fails (default 0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    try:
+        results = run_suite(args.sizes, args.value_length, args.tag_density, args.substitutions, args.seed, args.jobs)
+    except BenchmarkError as e:
+        print e
+        return 1
+    print_results(results)
+
+    status = 0
+    if args.compare:
+        try:
+            with open(args.baseline, "r") as f:
+                baseline = json.load(f)
+        except (IOError, ValueError):
+            print "No baseline at {0}; run with --save-baseline first.".format(args.baseline)
+            return 1
+        messages = regressions(results, baseline, args.tolerance)
+        for message in messages:
+            print "REGRESSION: {0}".format(message)
+        if messages:
+            status = 1
+        else:
+            print "No regressions against {0}.".format(args.baseline)
+
+    if args.save_baseline:
+        directory = os.path.dirname(args.baseline)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print "Saved baseline to {0}".format(args.baseline)
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
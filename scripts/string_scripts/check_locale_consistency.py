@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Check the *.strings files against each other: the cross-locale half of +[CardIOLocalizer passesSelfTest:],
+done at build time rather than on a device or simulator.
+
+Each file is read once, into a language x key presence matrix, from which the checker reports:
+  - expected languages that have no (or an empty) .strings file,
+  - keys missing from, or extraneous in, a language relative to en (see below),
+  - each language's key count relative to en,
+  - substitution placeholders that do not match en's (e.g., "%1$@" in en, but not in de), and
+  - spot-check translations that do not resolve (through the compiled string table, as CardIOLocalizer would)
+    to the expected value.
+
+If we are between L10n cycles, then the content of en.strings might legitimately differ from all the other
+*.strings files. As in the self-test, this shows up as every other file having the same number of strings,
+and that number differing from en's; missing and extraneous keys are then not reported.
+
+The per-file rules (keys against expected_keys, and the content rules) are confirm_keys_for_language.py's
+and validate_strings_for_language.py's.
+
+Example:
+    ./check_locale_consistency.py assets/strings
+    ./check_locale_consistency.py assets/strings --matrix
+"""
+
+import argparse
+import collections
+import os
+import re
+import sys
+
+from strings_index import STRINGS_EXTENSION, list_strings_files, strings_directory_path, tokenize_line
+from string_tables import StringTableError, StringTables, build_tables, filtered_strings
+
+
+REFERENCE_LANGUAGE = "en"
+
+# As +[CardIOLocalizer allLanguages]
+EXPECTED_LANGUAGES = ("ar", "da", "de", "en", "en_AU", "en_GB", "es", "es_MX", "fi", "fr", "he", "is", "it", "ja",
+                      "ko", "ms", "nb", "nl", "pl", "pt", "pt_BR", "ru", "sv", "th", "tr",
+                      "zh-Hans", "zh-Hant", "zh-Hant_TW")
+
+# (requested language or locale, key, expected value), resolved as CardIOLocalizedString would
+SPOT_CHECKS = (
+    ("en_US", "camera", u"Camera"),
+    ("es", "camera", u"Cámara"),
+    ("zh-Hans", "camera", u"摄像头"),
+    ("zh_HK", "camera", u"相機"),
+    ("en_AU", "entry_postal_code", u"Postcode"),
+    ("fr_FR", "entry_postal_code", u"Code postal"),
+    ("en_XX", "entry_postal_code", u"Postal Code"),
+    ("xx", "entry_postal_code", u"Postal Code"),
+)
+
+# A printf-style substitution: an optional position, flags, width, precision, length and the conversion
+PLACEHOLDER_RE = re.compile(r"%(?:([0-9]+)\$)?[-+ #0']*[0-9]*(?:\.[0-9]+)?(?:hh|h|ll|l|q|L|z|t|j)?([@dDiuUxXoOfFeEgGcCsSpaA%])")
+
+
+class LocaleMatrix(object):
+    """
+    The values of every key in every language, read in one pass over the .strings files.
+
+    values:   {language: {key: raw value}}, for the well-formed lines
+    strings:  {language: {key: filtered value}}, as compiled into the string table (None if the file does not parse)
+    """
+
+    def __init__(self, values, strings):
+        self.values = values
+        self.strings = strings
+
+    @property
+    def languages(self):
+        return sorted(self.values)
+
+    @property
+    def keys(self):
+        return sorted(set(key for values in self.values.values() for key in values))
+
+    def has(self, language, key):
+        return key in self.values.get(language, {})
+
+
+def read_locale_matrix(strings_directory):
+    strings_path = strings_directory_path(strings_directory)
+    values = {}
+    strings = {}
+    for filename in list_strings_files(strings_directory):
+        if not filename.endswith(STRINGS_EXTENSION):
+            continue
+        language = filename[:-len(STRINGS_EXTENSION)]
+        with open(os.path.join(strings_path, filename), "rb") as f:
+            values[language], strings[language] = locale_row(f.read())
+    return LocaleMatrix(values, strings)
+
+
+def locale_row(data):
+    """
+    Return one language's (values, strings), as held by LocaleMatrix, from the contents of its .strings file.
+    """
+    entries = (tokenize_line(line_num, line) for line_num, line in enumerate(data.splitlines(), 1))
+    values = dict((entry.key, entry.value) for entry in entries if entry is not None and entry.problem is None)
+    try:
+        strings = filtered_strings(data)
+    except (StringTableError, UnicodeDecodeError):
+        strings = None
+    return values, strings
+
+
+def placeholder_signature(value):
+    """
+    Return the set of (position, conversion) of value's substitutions; unpositioned ones are numbered in order.
+    """
+    signature = set()
+    next_position = 1
+    for match in PLACEHOLDER_RE.finditer(value):
+        if match.group(2) == "%" or (match.start() > 0 and value[match.start() - 1] == "\\"):
+            continue
+        if match.group(1):
+            position = int(match.group(1))
+        else:
+            position = next_position
+            next_position += 1
+        signature.add((position, match.group(2)))
+    return frozenset(signature)
+
+
+def _format_signature(signature):
+    return ", ".join("%{0}${1}".format(position, conversion) for position, conversion in sorted(signature)) or "none"
+
+
+def between_l10n_cycles(matrix, reference=REFERENCE_LANGUAGE):
+    """
+    True if every language but the reference has the same number of strings, and that number differs from the reference's.
+    """
+    other_counts = set(len(values) for language, values in matrix.values.items() if language != reference)
+    return len(other_counts) == 1 and other_counts.pop() != len(matrix.values.get(reference, {}))
+
+
+def key_count_skew(matrix, reference=REFERENCE_LANGUAGE):
+    """
+    Return [(language, key count - the reference's key count)] for the languages whose counts differ.
+    """
+    reference_count = len(matrix.values.get(reference, {}))
+    return [(language, len(matrix.values[language]) - reference_count) for language in matrix.languages
+            if len(matrix.values[language]) != reference_count]
+
+
+def consistency_problems(matrix, expected_languages=EXPECTED_LANGUAGES, spot_checks=SPOT_CHECKS, reference=REFERENCE_LANGUAGE):
+    problems = []
+
+    for language in expected_languages:
+        if not matrix.values.get(language):
+            problems.append("[{0}{1}] is missing.".format(language, STRINGS_EXTENSION))
+
+    reference_values = matrix.values.get(reference, {})
+    if not between_l10n_cycles(matrix, reference):
+        for language in matrix.languages:
+            if language == reference:
+                continue
+            missing_keys = sorted(key for key in reference_values if not matrix.values[language].get(key))
+            extraneous_keys = sorted(key for key in matrix.values[language] if not reference_values.get(key))
+            if missing_keys:
+                problems.append("[{0}{1}] missing keys:\n    {2}".format(language, STRINGS_EXTENSION, missing_keys))
+            if extraneous_keys:
+                problems.append("[{0}{1}] extraneous keys:\n    {2}".format(language, STRINGS_EXTENSION, extraneous_keys))
+
+    for key, reference_value in sorted(reference_values.items()):
+        reference_signature = placeholder_signature(reference_value)
+        for language in matrix.languages:
+            value = matrix.values[language].get(key)
+            if language == reference or value is None:
+                continue
+            signature = placeholder_signature(value)
+            if signature != reference_signature:
+                problems.append("[{0}{1}] '{2}' has placeholders {3}, but {4} has {5}.".format(
+                    language, STRINGS_EXTENSION, key, _format_signature(signature), reference, _format_signature(reference_signature)))
+
+    unparsable = sorted(language for language, strings in matrix.strings.items() if strings is None)
+    for language in unparsable:
+        problems.append("[{0}{1}] could not be parsed as a property list.".format(language, STRINGS_EXTENSION))
+    if spot_checks and not unparsable and reference in matrix.strings:
+        problems.extend(spot_check_problems(matrix, spot_checks, reference))
+
+    return problems
+
+
+def spot_check_problems(matrix, spot_checks=SPOT_CHECKS, reference=REFERENCE_LANGUAGE):
+    """
+    Look each spot check up in the compiled string table, falling back to the reference language, as
+    CardIOLocalizedString does.
+    """
+    tables = StringTables(build_tables(matrix.strings))
+    reference_index = tables.find_name(reference)
+    problems = []
+    for language_or_locale, key, expected in spot_checks:
+        translation = tables.get(tables.resolve(language_or_locale), key) or tables.get(reference_index, key)
+        if translation != expected:
+            problems.append(u"The correct translation for '{0}' in {1} is '{2}'; received '{3}'".format(
+                key, language_or_locale, expected, translation).encode("utf-8"))
+    return problems
+
+
+def print_matrix(matrix):
+    """
+    One row per key and one column per language (named vertically): '.' if the language has the key, 'X' if not.
+    The last row holds each language's key count.
+    """
+    languages = matrix.languages
+    width = max([len(key) for key in matrix.keys] + [len("keys")])
+    for row in range(max(len(language) for language in languages)):
+        print " " * width + "  " + " ".join("{0:>3}".format(language[row] if row < len(language) else "") for language in languages)
+    for key in matrix.keys:
+        print key.ljust(width) + "  " + " ".join("  ." if matrix.has(language, key) else "  X" for language in languages)
+    print "keys".ljust(width) + "  " + " ".join("{0:>3}".format(len(matrix.values[language])) for language in languages)
+
+
+def check_locale_consistency(strings_directory, show_matrix=False):
+    matrix = read_locale_matrix(strings_directory)
+    if show_matrix:
+        print_matrix(matrix)
+
+    if between_l10n_cycles(matrix):
+        print "Between L10n cycles: {0} has {1} keys, every other language {2}; not comparing keys.".format(
+            REFERENCE_LANGUAGE, len(matrix.values.get(REFERENCE_LANGUAGE, {})),
+            len(matrix.values[[language for language in matrix.languages if language != REFERENCE_LANGUAGE][0]]))
+    for language, skew in key_count_skew(matrix):
+        print "[{0}{1}] has {2:+d} keys relative to {3}".format(language, STRINGS_EXTENSION, skew, REFERENCE_LANGUAGE)
+
+    problems = consistency_problems(matrix)
+    for problem in problems:
+        print problem
+    if problems:
+        return 1
+
+    print "All {0} *.strings files are consistent with each other.".format(len(matrix.languages))
+    return 0
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("strings_directory", help="path to strings folder (e.g., 'assets/strings')")
+    parser.add_argument("--matrix", action="store_true", help="print the language x key presence matrix")
+    args = parser.parse_args(argv)
+
+    return check_locale_consistency(args.strings_directory, args.matrix)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
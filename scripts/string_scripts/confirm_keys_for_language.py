@@ -6,67 +6,75 @@ There can be multiple .txt files in the expected_keys directory;
 e.g., one per platform, and/or one for UI strings and one for server-error strings.
 """
 
-import os
 import sys
 import argparse
-import inspect
 
+from strings_index import load_expected_keys, normalized_key, parse_strings_file, strings_file_path
 
-STRING_SCRIPTS_DIRECTORY = "string_scripts"
-EXPECTED_KEYS_DIRECTORY = "expected_keys"
 
+def confirm_keys_for_language(strings_directory, language_or_locale, strings_file=None, expected_keys=None):
+    """
+    strings_file (a parsed StringsFile) and expected_keys (the frozenset from load_expected_keys)
+    may be passed in by callers that check many languages, so that nothing is read twice.
+    """
+    if strings_file is None:
+        strings_file = parse_strings_file(strings_file_path(strings_directory, language_or_locale))
+    if expected_keys is None:
+        expected_keys = load_expected_keys()
 
-def confirm_keys_for_language(strings_directory, language_or_locale):
-    root_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))), STRING_SCRIPTS_DIRECTORY)
-    expected_keys_path = os.path.join(root_path, EXPECTED_KEYS_DIRECTORY)
-    strings_path = os.path.join(os.path.abspath(root_path + "../../.."), strings_directory)
-    strings_file_name = language_or_locale + ".strings"
-    
-    all_expected_keys = set()
-    expected_keys_files = os.listdir(expected_keys_path)
-    # filter out hidden files
-    for filename in expected_keys_files:
-        if filename.startswith("."):  # hidden file
-            continue
-        with open(os.path.join(expected_keys_path, filename), "r") as keys:
-            keys = keys.readlines()
-            for key in keys:
-                key = key.strip()
-                if key.isupper():  # we'll convert ALL_UPPER keys to all_lower, but leave mIxED_case keys alone
-                    key = key.lower()
-                if len(key) > 0 and not key.startswith("//") and not key in all_expected_keys:
-                    all_expected_keys.add(key)
-
-    with open(os.path.join(strings_path, strings_file_name), "r") as strings_file:
-        strings = strings_file.readlines()
-
-    strings_file_keys = set()
+    problems = key_problems(strings_file, expected_keys)
+    for problem in problems:
+        print problem
+
+    if len(problems) > 0:
+        return 1
+
+    # print "[{0}] keys are correct".format(strings_file.file_name)
+    return 0
+
+
+def key_problems(strings_file, expected_keys):
+    """
+    Return the list of messages describing missing, unexpected and duplicate keys in strings_file.
+    """
+    keys, duplicate_keys = strings_file_keys(strings_file)
+    return key_set_problems(strings_file.file_name, keys, duplicate_keys, expected_keys)
+
+
+def strings_file_keys(strings_file):
+    """
+    Return (the set of normalized, unadapted keys, the list of duplicate keys) of strings_file.
+    """
+    keys = set()
     duplicate_keys = []
-    for string in [s for s in strings if s.strip().startswith('"')]:
-        strings_file_key = string.split('"')[1]
-        if strings_file_key.isupper():  # we'll convert ALL_UPPER keys to all_lower, but leave mIxED_case keys alone
-            strings_file_key = strings_file_key.lower()
-        if strings_file_key in strings_file_keys:
+    for entry in strings_file:
+        if not entry.quoted:
+            continue
+        strings_file_key = normalized_key(entry.key)
+        if strings_file_key in keys:
             duplicate_keys.append(strings_file_key)
         else:
             unadapted_key = strings_file_key.split('|')[0]
-            strings_file_keys.add(unadapted_key)
+            keys.add(unadapted_key)
+    return keys, duplicate_keys
+
 
-    missing_keys = all_expected_keys - strings_file_keys
-    extraneous_keys = strings_file_keys - all_expected_keys
+def key_set_problems(strings_file_name, keys, duplicate_keys, expected_keys):
+    """
+    key_problems, for keys already collected by strings_file_keys; lets a caller that holds on to
+    the key sets re-diff them against new expected_keys without reparsing the files.
+    """
+    missing_keys = expected_keys - keys
+    extraneous_keys = keys - expected_keys
 
+    problems = []
     if len(missing_keys) > 0:
-        print "[{0}] missing keys:\n    {1}".format(strings_file_name, list(missing_keys))
+        problems.append("[{0}] missing keys:\n    {1}".format(strings_file_name, sorted(missing_keys)))
     if len(extraneous_keys) > 0:
-        print "[{0}] unexpected keys:\n    {1}".format(strings_file_name, list(extraneous_keys))
+        problems.append("[{0}] unexpected keys:\n    {1}".format(strings_file_name, sorted(extraneous_keys)))
     if len(duplicate_keys) > 0:
-        print "[{0}] duplicate keys:\n    {1}".format(strings_file_name, duplicate_keys)
-
-    if len(missing_keys) + len(extraneous_keys) + len(duplicate_keys) > 0:
-        return 1
-
-    # print "[{0}] keys are correct".format(strings_file_name)
-    return 0
+        problems.append("[{0}] duplicate keys:\n    {1}".format(strings_file_name, duplicate_keys))
+    return problems
 
 
 def main(argv=None):
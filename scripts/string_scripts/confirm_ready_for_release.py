@@ -3,31 +3,109 @@
 Validate all *.strings files for the given project, prior to allowing `fab build` to create a release build
 """
 
+import collections
+import multiprocessing
 import os
 import sys
 import argparse
-import inspect
 
-from confirm_keys_for_language import confirm_keys_for_language
-from validate_strings_for_language import validate_strings_for_language
+from check_locale_consistency import consistency_problems, read_locale_matrix
+from confirm_keys_for_language import key_problems
+from string_tables import check_strings_directory
+from strings_index import EXPECTED_KEYS_PATH, list_strings_files, load_expected_keys, parse_strings_file, strings_directory_path
+from validate_strings_for_language import content_problems
+from validation_cache import ValidationCache
 
-STRING_SCRIPTS_DIRECTORY = "string_scripts"
 
+# The outcome of checking one .strings file: status is 0 or 1, problems are the lines to report.
+LocaleResult = collections.namedtuple("LocaleResult", "language_or_locale status problems")
 
-def confirm_ready_for_release(strings_directory):
-    root_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))), STRING_SCRIPTS_DIRECTORY)
-    strings_path = os.path.join(os.path.abspath(root_path + "../../.."), strings_directory)
+
+def check_strings_file(path, expected_keys):
+    """
+    Run both the keys check and the content-rules check over the .strings file at path.
+    """
+    strings_file = parse_strings_file(path)
+    problems = key_problems(strings_file, expected_keys) + content_problems(strings_file)
+    return LocaleResult(strings_file.language_or_locale, 1 if problems else 0, problems)
+
+
+def _check_strings_file_star(args):
+    # Pool.map passes a single argument
+    return check_strings_file(*args)
+
+
+def check_all_strings_files(strings_directory, expected_keys, jobs=1, cache=None):
+    """
+    Return one LocaleResult per .strings file in strings_directory, in locale (file name) order.
+
+    With jobs > 1 the files are checked across a pool of that many processes;
+    jobs == 0 means one process per CPU.
+    If a ValidationCache is given, files whose verdict is cached are not checked again.
+    """
+    strings_path = strings_directory_path(strings_directory)
+    paths = [os.path.join(strings_path, filename) for filename in list_strings_files(strings_directory)]
+
+    results = [None] * len(paths)
+    cache_keys = [None] * len(paths)
+    if cache is not None:
+        for index, path in enumerate(paths):
+            cache_keys[index] = cache.key_for_file(path)
+            verdict = cache.lookup(cache_keys[index])
+            if verdict is not None:
+                status, problems = verdict
+                results[index] = LocaleResult(os.path.basename(path).split('.')[0], status, problems)
+
+    pending = [index for index, result in enumerate(results) if result is None]
+    work = [(paths[index], expected_keys) for index in pending]
+
+    if jobs == 0:
+        jobs = multiprocessing.cpu_count()
+    jobs = min(jobs, len(work))
+
+    if jobs <= 1:
+        checked = [_check_strings_file_star(args) for args in work]
+    else:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            checked = pool.map(_check_strings_file_star, work)
+        finally:
+            pool.close()
+            pool.join()
+
+    for index, result in zip(pending, checked):
+        results[index] = result
+        if cache is not None:
+            cache.store(cache_keys[index], result.status, result.problems)
+
+    return results
+
+
+def confirm_ready_for_release(strings_directory, jobs=1, use_cache=True, expected_keys_path=EXPECTED_KEYS_PATH):
+    expected_keys = load_expected_keys(expected_keys_path)
+    cache = ValidationCache.load(expected_keys_path=expected_keys_path) if use_cache else None
 
     error_encountered = False
 
-    strings_files = os.listdir(strings_path)
-    # filter out hidden files
-    for filename in strings_files:
-        if filename.startswith("."):  # hidden file
-            continue
-        with open(os.path.join(strings_path, filename), "r") as file:
-            error_encountered |= confirm_keys_for_language(strings_directory, filename.split('.')[0])
-            error_encountered |= validate_strings_for_language(strings_directory, filename.split('.')[0])
+    for result in check_all_strings_files(strings_directory, expected_keys, jobs, cache):
+        for problem in result.problems:
+            print problem
+        error_encountered |= result.status
+
+    # The cross-locale checks depend on every file at once, so they are not cached (they take one quick pass)
+    for problem in consistency_problems(read_locale_matrix(strings_directory)):
+        print problem
+        error_encountered = True
+
+    # The binary string table the bundle ships must give back exactly what the .strings files say, in every locale
+    unused, table_problems = check_strings_directory(strings_directory)
+    for problem in table_problems:
+        print problem
+        error_encountered = True
+
+    if cache is not None:
+        cache.save()
+        print cache.stats()
 
     if error_encountered:
         print "*** Fix the above .strings problems before building a release. ***"
@@ -43,9 +121,13 @@ def main(argv=None):
 
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("strings_directory", help="path to strings folder (e.g., 'assets/strings')")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of locales to check in parallel (0 = one per CPU)")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false", help="ignore and do not update the validation cache")
+    parser.add_argument("--expected-keys", metavar="DIRECTORY", default=EXPECTED_KEYS_PATH,
+                        help="the expected_keys directory to check the keys against (default scripts/string_scripts/expected_keys)")
     args = parser.parse_args(argv)
 
-    return confirm_ready_for_release(args.strings_directory)
+    return confirm_ready_for_release(args.strings_directory, args.jobs, args.use_cache, args.expected_keys)
 
 
 if __name__ == '__main__':
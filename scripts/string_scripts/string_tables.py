@@ -0,0 +1,674 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Compile the *.strings files into one binary string table, which CardIOLocalizer reads in place.
+
+The table holds every language's strings, ready to use: the values have already been through the same fixups
+as -[CardIOLocalizer filterOutCommonErrors:] (see filter_value), the keys are sorted, and a hash index per
+language finds a key without a search. A regional language (e.g., en_AU, whose base is en) holds only the keys
+whose values differ from its base's, and falls back to its base for the rest. Every key, value and name is
+stored once, however many languages share it. The names section also resolves aliases (e.g., zh_CN is
+zh-Hans), so the runtime has one lookup path. generate_asset_bundle.py puts the table, uncompressed, into
+CardIOBundle as strings/strings.table, so at runtime there is nothing to parse, sort, filter or copy.
+
+All integers are little-endian.
+
+    header   magic "CIST", u16 version, u16 header size, u32 language count, u32 name count,
+             u32 names offset, u32 languages offset, u32 entries offset, u32 buckets offset,
+             u32 strings offset, u32 strings length
+    names    one per language and alias, sorted by name (bytewise): u32 name offset, u32 name length,
+             u32 language index
+    languages  u32 name offset, u32 name length, u32 base language index (NO_BASE if none),
+             u32 first entry, u32 entry count, u32 first bucket, u32 bucket count
+    entries  per language, sorted by key (bytewise): u32 FNV-1a hash of the key, u32 key offset,
+             u32 key length, u32 value offset (ABSENT if the language lacks a key its base has), u32 value length
+    buckets  per language, u32 each: 1 + the index of an entry (counted from the language's first entry), or 0
+             if the bucket is empty. There are at least twice as many buckets as entries (a power of two); a key's
+             search starts at bucket hash & (bucket count - 1) and goes on to the next bucket until it finds
+             the key or an empty one.
+    strings  UTF-8 names, keys and values, each stored once and followed by a NUL
+
+String offsets are relative to the start of the strings section. A lookup tries the language's own entries,
+then its base's; a key found in neither is missing (and CardIOLocalizedString falls back to en).
+
+Example:
+    ./string_tables.py assets/strings --check
+    ./string_tables.py assets/strings --report
+    ./string_tables.py assets/strings --output /tmp/strings.table
+    ./string_tables.py /tmp/strings.table --dump
+"""
+
+import argparse
+import os
+import struct
+import sys
+
+from strings_index import STRINGS_EXTENSION, list_strings_files, parse_strings_file, strings_directory_path
+
+
+MAGIC = "CIST"
+VERSION = 2
+
+HEADER_FORMAT = "<4sHHIIIIIIII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+NAME_FORMAT = "<III"
+NAME_SIZE = struct.calcsize(NAME_FORMAT)
+LANGUAGE_FORMAT = "<IIIIIII"
+LANGUAGE_SIZE = struct.calcsize(LANGUAGE_FORMAT)
+ENTRY_FORMAT = "<IIIII"
+ENTRY_SIZE = struct.calcsize(ENTRY_FORMAT)
+
+NO_BASE = 0xFFFFFFFF
+ABSENT = 0xFFFFFFFF
+
+STRING_TABLE_PATH = "strings/strings.table"  # in CardIOBundle
+
+FALLBACK_LANGUAGE = "en"
+
+# Requested languages or locales (lowercased) that are served by another language's strings
+LANGUAGE_ALIASES = {
+    "zh_cn": "zh-Hans",
+    "zh_tw": "zh-Hant_TW",
+    "zh_hk": "zh-Hant",
+    "en_uk": "en_GB",
+    "en_ie": "en_GB",
+    "no": "nb",
+}
+
+FNV_OFFSET_BASIS = 0x811C9DC5
+FNV_PRIME = 0x01000193
+
+# What [NSCharacterSet whitespaceCharacterSet] holds: the space separators (Zs), and tab.
+# Spelled out (as of Python 2.7's Unicode 5.2) rather than found by scanning the BMP on every import.
+WHITESPACE = (u"\t\u0020\u00a0\u1680\u180e\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a"
+              u"\u202f\u205f\u3000")
+
+# Single-character escapes in a quoted property list string
+ESCAPES = {"a": u"\a", "b": u"\b", "f": u"\f", "n": u"\n", "r": u"\r", "t": u"\t", "v": u"\v"}
+
+# Characters allowed in an unquoted property list string
+UNQUOTED_CHARACTERS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$+/:.-")
+
+
+class StringTableError(ValueError):
+    pass
+
+
+def fnv1a(data):
+    """
+    The 32-bit FNV-1a hash of a byte string.
+    """
+    value = FNV_OFFSET_BASIS
+    for byte in bytearray(data):
+        value = ((value ^ byte) * FNV_PRIME) & 0xFFFFFFFF
+    return value
+
+
+def filter_value(value):
+    """
+    Return value with the fixups that -[CardIOLocalizer filterOutCommonErrors:] applies:
+    trim whitespace, collapse double spaces (one pass, as NSString does), and turn "..." into an ellipsis.
+    """
+    value = value.strip(WHITESPACE)
+    value = value.replace(u"  ", u" ")
+    value = value.replace(u"...", u"…")
+    return value
+
+
+# --- Parsing ----------------------------------------------------------------
+
+class _StringsParser(object):
+    """
+    Parses a .strings file as NSPropertyListSerialization does: `key = value;` pairs of quoted or
+    unquoted strings, with `key;` standing for `key = key;`, and // and /* */ comments.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.position = 0
+
+    def error(self, message):
+        line = self.text.count(u"\n", 0, self.position) + 1
+        raise StringTableError("{0} at line {1}".format(message, line))
+
+    def skip_whitespace_and_comments(self):
+        text = self.text
+        while self.position < len(text):
+            if text[self.position].isspace():
+                self.position += 1
+            elif text.startswith(u"//", self.position):
+                end = text.find(u"\n", self.position)
+                self.position = len(text) if end < 0 else end + 1
+            elif text.startswith(u"/*", self.position):
+                end = text.find(u"*/", self.position + 2)
+                if end < 0:
+                    self.error("unterminated comment")
+                self.position = end + 2
+            else:
+                return
+
+    def parse_quoted(self):
+        text = self.text
+        self.position += 1
+        characters = []
+        while self.position < len(text):
+            character = text[self.position]
+            self.position += 1
+            if character == u'"':
+                return u"".join(characters)
+            if character != u"\\":
+                characters.append(character)
+                continue
+            if self.position >= len(text):
+                break
+            escape = text[self.position]
+            self.position += 1
+            if escape in ESCAPES:
+                characters.append(ESCAPES[escape])
+            elif escape == u"U":
+                digits = u""
+                while len(digits) < 4 and self.position < len(text) and text[self.position] in u"0123456789abcdefABCDEF":
+                    digits += text[self.position]
+                    self.position += 1
+                characters.append(unichr(int(digits, 16)) if digits else u"U")
+            elif escape in u"01234567":
+                digits = escape
+                while len(digits) < 3 and self.position < len(text) and text[self.position] in u"01234567":
+                    digits += text[self.position]
+                    self.position += 1
+                characters.append(unichr(int(digits, 8) & 0xFF))
+            else:
+                characters.append(escape)
+        self.error("unterminated string")
+
+    def parse_string(self):
+        if self.position >= len(self.text):
+            self.error("unexpected end of file")
+        if self.text[self.position] == u'"':
+            return self.parse_quoted()
+        start = self.position
+        while self.position < len(self.text) and self.text[self.position] in UNQUOTED_CHARACTERS:
+            self.position += 1
+        if self.position == start:
+            self.error("unexpected character {0!r}".format(self.text[start]))
+        return self.text[start:self.position]
+
+    def expect(self, character):
+        self.skip_whitespace_and_comments()
+        if self.position >= len(self.text) or self.text[self.position] != character:
+            self.error("expected {0!r}".format(character))
+        self.position += 1
+
+    def parse(self):
+        strings = {}
+        while True:
+            self.skip_whitespace_and_comments()
+            if self.position >= len(self.text):
+                return strings
+            key = self.parse_string()
+            self.skip_whitespace_and_comments()
+            if self.position < len(self.text) and self.text[self.position] == u";":
+                self.position += 1
+                strings[key] = key
+                continue
+            self.expect(u"=")
+            self.skip_whitespace_and_comments()
+            strings[key] = self.parse_string()
+            self.expect(u";")
+
+
+def parse_strings(data):
+    """
+    Return {key: value} (as unicode) for the contents of a .strings file (UTF-8, or UTF-16 with a BOM).
+    """
+    if data.startswith(("\xff\xfe", "\xfe\xff")):
+        text = data.decode("utf-16")
+    else:
+        text = data.decode("utf-8")
+        if text.startswith(u"﻿"):
+            text = text[1:]
+    return _StringsParser(text).parse()
+
+
+# --- Writing ----------------------------------------------------------------
+
+def _utf8(string):
+    return string.encode("utf-8") if isinstance(string, unicode) else string
+
+
+def base_language(language, languages):
+    """
+    Return the language that language (e.g., "pt_BR" or "zh-Hant_TW") is a regional variant of, if there is
+    one among languages ("pt", "zh-Hant"), else None.
+    """
+    if "_" not in language:
+        return None
+    base = language.rsplit("_", 1)[0]
+    return base if base in languages else None
+
+
+def overlays(strings_by_language):
+    """
+    Return {language: (base or None, {key: value, or None if the language lacks the key})}: a base language
+    keeps all its strings, a regional one only those that differ from its base's.
+    """
+    result = {}
+    for language, strings in strings_by_language.items():
+        base = base_language(language, strings_by_language)
+        if base is None:
+            result[language] = (None, dict(strings))
+            continue
+        base_strings = strings_by_language[base]
+        overlay = dict((key, value) for key, value in strings.items() if base_strings.get(key) != value)
+        overlay.update((key, None) for key in base_strings if key not in strings)
+        result[language] = (base, overlay)
+    return result
+
+
+class _StringPool(object):
+    """
+    Each distinct string is stored once; owners records which language first needed it (for the report).
+    """
+
+    def __init__(self):
+        self.offsets = {}
+        self.chunks = []
+        self.length = 0
+        self.owners = {}
+
+    def add(self, string, owner=None):
+        string = _utf8(string)
+        if string not in self.offsets:
+            self.offsets[string] = self.length
+            self.chunks.extend([string, "\0"])
+            self.length += len(string) + 1
+            self.owners[owner] = self.owners.get(owner, 0) + len(string) + 1
+        return self.offsets[string], len(string)
+
+
+def _bucket_count(entry_count):
+    bucket_count = 1
+    while bucket_count < 2 * entry_count:
+        bucket_count *= 2
+    return bucket_count
+
+
+def build_tables(strings_by_language, aliases=LANGUAGE_ALIASES):
+    """
+    Return the table (a byte string) for strings_by_language, {language: {key: value}}, values used as they are.
+    """
+    languages = sorted(strings_by_language, key=_utf8)
+    language_indexes = dict((language, index) for index, language in enumerate(languages))
+    language_overlays = overlays(strings_by_language)
+    pool = _StringPool()
+
+    names = [(_utf8(language), index) for index, language in enumerate(languages)]
+    for alias, language in aliases.items():
+        if language in language_indexes and alias not in strings_by_language:
+            names.append((_utf8(alias), language_indexes[language]))
+    names.sort()
+    name_records = [struct.pack(NAME_FORMAT, *(pool.add(name) + (index,))) for name, index in names]
+
+    language_records = []
+    entries = []
+    buckets = []
+    for language in languages:
+        base, overlay = language_overlays[language]
+        items = sorted((_utf8(key), value) for key, value in overlay.items())
+        bucket_count = _bucket_count(len(items))
+        language_buckets = [0] * bucket_count
+        first_entry = len(entries)
+        for index, (key, value) in enumerate(items):
+            key_hash = fnv1a(key)
+            bucket = key_hash & (bucket_count - 1)
+            while language_buckets[bucket]:
+                bucket = (bucket + 1) & (bucket_count - 1)
+            language_buckets[bucket] = index + 1
+
+            key_offset, key_length = pool.add(key, language)
+            value_offset, value_length = pool.add(value, language) if value is not None else (ABSENT, 0)
+            entries.append(struct.pack(ENTRY_FORMAT, key_hash, key_offset, key_length, value_offset, value_length))
+
+        name_offset, name_length = pool.add(language)
+        base_index = language_indexes[base] if base is not None else NO_BASE
+        language_records.append(struct.pack(LANGUAGE_FORMAT, name_offset, name_length, base_index,
+                                            first_entry, len(items), len(buckets), bucket_count))
+        buckets.extend(language_buckets)
+
+    names_offset = HEADER_SIZE
+    languages_offset = names_offset + NAME_SIZE * len(name_records)
+    entries_offset = languages_offset + LANGUAGE_SIZE * len(language_records)
+    buckets_offset = entries_offset + ENTRY_SIZE * len(entries)
+    strings_offset = buckets_offset + 4 * len(buckets)
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, HEADER_SIZE, len(languages), len(name_records),
+                         names_offset, languages_offset, entries_offset, buckets_offset, strings_offset, pool.length)
+    return "".join([header] + name_records + language_records + entries +
+                   [struct.pack("<{0}I".format(len(buckets)), *buckets)] + pool.chunks)
+
+
+def filtered_strings(data):
+    """
+    Return {key: value} for the contents of a .strings file, with every value filtered.
+    """
+    return dict((key, filter_value(value)) for key, value in parse_strings(data).items())
+
+
+def read_strings_directory(strings_directory):
+    """
+    Return {language or locale: filtered strings} for every .strings file in strings_directory.
+    """
+    strings_by_language = {}
+    for filename in sorted(os.listdir(strings_directory)):
+        if filename.endswith(STRINGS_EXTENSION) and not filename.startswith("."):
+            with open(os.path.join(strings_directory, filename), "rb") as f:
+                strings_by_language[filename[:-len(STRINGS_EXTENSION)]] = filtered_strings(f.read())
+    return strings_by_language
+
+
+def compile_strings_directory(strings_directory):
+    """
+    Return the table for every .strings file in strings_directory.
+    """
+    return build_tables(read_strings_directory(strings_directory))
+
+
+# --- Reading ----------------------------------------------------------------
+
+class StringTables(object):
+    """
+    Lookups in a table, the way CardIOLocalizer does them.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        if len(data) < HEADER_SIZE:
+            raise StringTableError("table is too short for its header")
+        (magic, version, header_size, self.language_count, self.name_count, self.names_offset,
+         self.languages_offset, self.entries_offset, self.buckets_offset, self.strings_offset,
+         self.strings_length) = struct.unpack_from(HEADER_FORMAT, data, 0)
+        if magic != MAGIC:
+            raise StringTableError("not a string table (magic {0!r})".format(magic))
+        if version != VERSION or header_size != HEADER_SIZE:
+            raise StringTableError("unsupported string table version {0}".format(version))
+        if (self.names_offset + NAME_SIZE * self.name_count > len(data) or
+                self.languages_offset + LANGUAGE_SIZE * self.language_count > len(data) or
+                self.entries_offset > len(data) or self.buckets_offset > len(data) or
+                self.strings_offset + self.strings_length > len(data)):
+            raise StringTableError("string table sections extend past its end")
+
+    def _string(self, offset, length):
+        if offset + length > self.strings_length:
+            raise StringTableError("string extends past the table")
+        start = self.strings_offset + offset
+        return self.data[start:start + length]
+
+    def _language(self, index):
+        if index >= self.language_count:
+            raise StringTableError("no language {0}".format(index))
+        return struct.unpack_from(LANGUAGE_FORMAT, self.data, self.languages_offset + LANGUAGE_SIZE * index)
+
+    def _entry(self, index):
+        if self.entries_offset + ENTRY_SIZE * (index + 1) > self.buckets_offset:
+            raise StringTableError("no entry {0}".format(index))
+        key_hash, key_offset, key_length, value_offset, value_length = struct.unpack_from(
+            ENTRY_FORMAT, self.data, self.entries_offset + ENTRY_SIZE * index)
+        value = None if value_offset == ABSENT else self._string(value_offset, value_length)
+        return key_hash, self._string(key_offset, key_length), value
+
+    def language_name(self, index):
+        name_offset, name_length = self._language(index)[:2]
+        return self._string(name_offset, name_length)
+
+    def languages(self):
+        return [self.language_name(index) for index in range(self.language_count)]
+
+    def base(self, index):
+        """
+        Return the index of the language's base, or None.
+        """
+        base_index = self._language(index)[2]
+        return None if base_index == NO_BASE else base_index
+
+    def find_name(self, name):
+        """
+        Return the index of the language with that name (or alias), or None.
+        """
+        name = _utf8(name)
+        low, high = 0, self.name_count
+        while low < high:
+            middle = (low + high) // 2
+            name_offset, name_length, index = struct.unpack_from(NAME_FORMAT, self.data, self.names_offset + NAME_SIZE * middle)
+            found = self._string(name_offset, name_length)
+            if name == found:
+                return index
+            if name < found:
+                high = middle
+            else:
+                low = middle + 1
+        return None
+
+    def resolve(self, language_or_locale):
+        """
+        Return the index of the language that serves language_or_locale: the exact name, an alias (regardless
+        of case), just the language (for <language>_<COUNTRY>), or else FALLBACK_LANGUAGE.
+        """
+        index = self.find_name(language_or_locale)
+        if index is None:
+            lowercased = _utf8(language_or_locale.lower())
+            index = self.find_name(lowercased)
+            if index is not None and self.language_name(index) == lowercased:
+                index = None  # only aliases match regardless of case
+        if index is None and "_" in language_or_locale:
+            index = self.find_name(language_or_locale.split("_", 1)[0])
+        if index is None:
+            index = self.find_name(FALLBACK_LANGUAGE)
+        return index
+
+    def _own_lookup(self, index, key):
+        """
+        Return (found, value) from just the language's own entries.
+        """
+        unused, unused, unused, first_entry, entry_count, first_bucket, bucket_count = self._language(index)
+        if bucket_count == 0:
+            return False, None
+        key_hash = fnv1a(key)
+        bucket = key_hash & (bucket_count - 1)
+        for unused in range(bucket_count):
+            slot, = struct.unpack_from("<I", self.data, self.buckets_offset + 4 * (first_bucket + bucket))
+            if slot == 0:
+                break
+            if slot > entry_count:
+                raise StringTableError("bucket refers to entry {0} of {1}".format(slot - 1, entry_count))
+            entry_hash, entry_key, value = self._entry(first_entry + slot - 1)
+            if entry_hash == key_hash and entry_key == key:
+                return True, value
+            bucket = (bucket + 1) & (bucket_count - 1)
+        return False, None
+
+    def get(self, index, key, default=None):
+        """
+        Return the value (unicode) for key in the language at index (or its base), or default.
+        """
+        key = _utf8(key)
+        for unused in range(self.language_count):
+            found, value = self._own_lookup(index, key)
+            if found:
+                return value.decode("utf-8") if value is not None else default
+            index = self.base(index)
+            if index is None:
+                break
+        return default
+
+    def own_items(self, index):
+        """
+        Return [(key, value or None)] (unicode) of the language's own entries, in the table's (sorted) order.
+        """
+        unused, unused, unused, first_entry, entry_count, unused, unused = self._language(index)
+        items = []
+        for entry_index in range(first_entry, first_entry + entry_count):
+            unused, key, value = self._entry(entry_index)
+            items.append((key.decode("utf-8"), value.decode("utf-8") if value is not None else None))
+        return items
+
+    def resolved_strings(self, index):
+        """
+        Return {key: value} for every key the language at index has, its own or its base's.
+        """
+        chain = []
+        while index is not None and index not in chain:
+            chain.append(index)
+            index = self.base(index)
+        strings = {}
+        for index in reversed(chain):
+            for key, value in self.own_items(index):
+                if value is None:
+                    strings.pop(key, None)
+                else:
+                    strings[key] = value
+        return strings
+
+
+# --- Checking and reporting -------------------------------------------------
+
+def table_problems(strings_by_language, table_data, aliases=LANGUAGE_ALIASES):
+    """
+    Return a message for every way in which table_data does not behave like looking each key up in the
+    language's own (filtered) strings, the runtime's behavior before tables.
+    """
+    try:
+        tables = StringTables(table_data)
+        languages = tables.languages()
+    except StringTableError as e:
+        return ["invalid table: {0}".format(e)]
+
+    problems = []
+    if sorted(languages) != sorted(_utf8(language) for language in strings_by_language):
+        problems.append("table languages {0} differ from the .strings files".format(languages))
+    for language, strings in sorted(strings_by_language.items()):
+        index = tables.resolve(language)
+        if index is None or tables.language_name(index) != _utf8(language):
+            problems.append("[{0}] does not resolve to itself".format(language))
+            continue
+        own_keys = [key for key, unused in tables.own_items(index)]
+        if own_keys != sorted(own_keys, key=_utf8):
+            problems.append("[{0}] table keys are not sorted".format(language))
+        if tables.resolved_strings(index) != strings:
+            problems.append("[{0}] table contents differ from the filtered .strings values".format(language))
+        for key, value in sorted(strings.items()):
+            if tables.get(index, key) != value:
+                problems.append("[{0}] lookup of '{1}' returns {2!r} rather than {3!r}".format(language, key, tables.get(index, key), value))
+        for strings_of_other_language in strings_by_language.values():
+            for key in set(strings_of_other_language) - set(strings):
+                if tables.get(index, key) is not None:
+                    problems.append("[{0}] lookup of absent key '{1}' found a value".format(language, key))
+        if tables.get(index, u"missing_key_for_check") is not None:
+            problems.append("[{0}] lookup of an unknown key found a value".format(language))
+    for alias, language in sorted(aliases.items()):
+        if language in strings_by_language:
+            language_part, separator, region = alias.partition("_")
+            for name in (alias, language_part + separator + region.upper()):
+                index = tables.resolve(name)
+                if index is None or tables.language_name(index) != language:
+                    problems.append("alias '{0}' does not resolve to {1}".format(name, language))
+    return problems
+
+
+def check_strings_directory(strings_directory):
+    strings_path = strings_directory_path(strings_directory)
+    strings_by_language = read_strings_directory(strings_path)
+    problems = table_problems(strings_by_language, build_tables(strings_by_language))
+
+    # The line-based tokenizer the other string scripts use should find the same keys
+    for filename in list_strings_files(strings_directory):
+        if filename.endswith(STRINGS_EXTENSION):
+            language = filename[:-len(STRINGS_EXTENSION)]
+            tokenized_keys = set(entry.key.decode("utf-8") for entry in parse_strings_file(os.path.join(strings_path, filename))
+                                 if entry.problem is None)
+            if tokenized_keys != set(strings_by_language[language]):
+                problems.append("[{0}] keys differ from strings_index's: {1}".format(
+                    filename, sorted(tokenized_keys ^ set(strings_by_language[language]))))
+    return len(strings_by_language), problems
+
+
+def _standalone_size(strings):
+    """
+    The bytes a language would take as a full copy of its strings: its entries, buckets and own strings.
+    """
+    string_bytes = sum(len(_utf8(key)) + 1 + len(_utf8(value)) + 1 for key, value in strings.items())
+    return ENTRY_SIZE * len(strings) + 4 * _bucket_count(len(strings)) + string_bytes
+
+
+def size_report(strings_by_language):
+    """
+    Return [(language, base, bytes as a full copy, bytes in the table)], and the table's total size.
+    A language's bytes in the table are its entries and buckets, plus the strings it was the first to need.
+    """
+    language_overlays = overlays(strings_by_language)
+    pool = _StringPool()
+    report = []
+    for language in sorted(strings_by_language, key=_utf8):
+        base, overlay = language_overlays[language]
+        for key, value in sorted(overlay.items()):
+            pool.add(key, language)
+            if value is not None:
+                pool.add(value, language)
+        table_bytes = (LANGUAGE_SIZE + ENTRY_SIZE * len(overlay) + 4 * _bucket_count(len(overlay)) +
+                       pool.owners.get(language, 0))
+        report.append((language, base, _standalone_size(strings_by_language[language]), table_bytes))
+    return report, len(build_tables(strings_by_language))
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="path to strings folder (e.g., 'assets/strings'), or to a table (with --dump)")
+    parser.add_argument("--check", action="store_true", help="confirm the compiled table matches the parsed and filtered .strings files")
+    parser.add_argument("--report", action="store_true", help="print the bytes each language takes, and saves, in the table")
+    parser.add_argument("--output", metavar="PATH", help="write the compiled table to PATH")
+    parser.add_argument("--dump", action="store_true", help="print the languages, keys and values of a table")
+    args = parser.parse_args(argv)
+
+    if args.dump:
+        try:
+            with open(args.path, "rb") as f:
+                tables = StringTables(f.read())
+            for index, language in enumerate(tables.languages()):
+                base = tables.base(index)
+                print "[{0}]{1}".format(language, " (overlay on {0})".format(tables.language_name(base)) if base is not None else "")
+                for key, value in tables.own_items(index):
+                    print u"    {0} = {1}".format(key, repr(value) if value is not None else "<absent>").encode("utf-8")
+        except (IOError, StringTableError) as e:
+            print "[{0}] is not a valid string table: {1}".format(args.path, e)
+            return 1
+        print "{0} languages, {1} names, {2} bytes".format(tables.language_count, tables.name_count, len(tables.data))
+        return 0
+
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(compile_strings_directory(strings_directory_path(args.path)))
+
+    if args.report:
+        report, table_size = size_report(read_strings_directory(strings_directory_path(args.path)))
+        print "{0:<12} {1:<10} {2:>10} {3:>10} {4:>10}".format("language", "base", "full copy", "in table", "saved")
+        for language, base, standalone_bytes, table_bytes in report:
+            print "{0:<12} {1:<10} {2:>10} {3:>10} {4:>10}".format(language, base or "-", standalone_bytes, table_bytes,
+                                                                 standalone_bytes - table_bytes)
+        standalone_total = sum(standalone_bytes for unused, unused, standalone_bytes, unused in report)
+        print "{0} languages: {1} bytes as full copies, {2} bytes as one table ({3} saved)".format(
+            len(report), standalone_total, table_size, standalone_total - table_size)
+
+    if args.check:
+        checked, problems = check_strings_directory(args.path)
+        for problem in problems:
+            print problem
+        if problems:
+            return 1
+        print "The string table matches all {0} .strings files".format(checked)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""
+Single-pass tokenizer for *.strings files, plus the expected-keys manifest.
+
+Each .strings file is streamed exactly once into a StringsFile, which holds one
+StringsEntry per key/value line in file order. confirm_keys_for_language and
+validate_strings_for_language both work from that index, so neither of them
+has to reopen or resplit the file.
+"""
+
+import collections
+import os
+
+
+STRING_SCRIPTS_PATH = os.path.dirname(os.path.abspath(__file__))
+EXPECTED_KEYS_PATH = os.path.join(STRING_SCRIPTS_PATH, "expected_keys")
+ROOT_PATH = os.path.dirname(os.path.dirname(STRING_SCRIPTS_PATH))
+
+STRINGS_EXTENSION = ".strings"
+
+# Values for StringsEntry.problem; None means the line is a well-formed <"key" = "value";> pair.
+ESCAPED_QUOTE = "escaped_quote"  # line contains \" rather than a curly double-quote
+BAD_FORMAT = "bad_format"        # line is not in <"keystring" = "value";> format
+EXTRA_QUOTE = "extra_quote"      # line contains a non-curly double-quote
+
+
+class StringsEntry(collections.namedtuple("StringsEntry", "line_num key value adaptation problem quoted")):
+    """
+    One key/value line of a .strings file.
+
+    line_num:   1-based line number
+    key:        the key exactly as written, including any "|adaptation" suffix
+    value:      the value, or None if the line is malformed (see problem)
+    adaptation: the text after "|" in the key, or None
+    problem:    None, ESCAPED_QUOTE, BAD_FORMAT or EXTRA_QUOTE
+    quoted:     True if the line starts with the key's opening double-quote
+    """
+    __slots__ = ()
+
+    @property
+    def unadapted_key(self):
+        return self.key.split("|")[0]
+
+
+class StringsFile(object):
+    """
+    The parsed contents of a single .strings file.
+    """
+
+    def __init__(self, path, entries, line_count):
+        self.path = path
+        self.file_name = os.path.basename(path)
+        self.language_or_locale = self.file_name[:-len(STRINGS_EXTENSION)] if self.file_name.endswith(STRINGS_EXTENSION) else self.file_name
+        self.entries = entries
+        self.line_count = line_count
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def normalized_key(key):
+    """
+    ALL_UPPER keys are treated as all_lower; mIxED_case keys are left alone.
+    """
+    if key.isupper():
+        return key.lower()
+    return key
+
+
+def tokenize_line(line_num, line):
+    """
+    Return a StringsEntry for the given raw line, or None if the line holds no key/value pair
+    (blank lines, comments, lines without any double-quote).
+    """
+    line = line.strip()
+    if len(line) == 0 or line.startswith("//") or line.startswith("/*") or '"' not in line:
+        return None
+
+    line = line.split(" // ")[0]
+    splits = line.split('"')
+    key = splits[1] if len(splits) > 1 else ""
+    adaptation = key.split("|", 1)[1] if "|" in key else None
+    quoted = len(splits[0]) == 0
+
+    value = None
+    if '\\"' in line:
+        problem = ESCAPED_QUOTE
+    elif len(splits) < 5 or not quoted or splits[4] != ";":
+        problem = BAD_FORMAT
+    elif len(splits) > 5:
+        problem = EXTRA_QUOTE
+    else:
+        problem = None
+        value = splits[3]
+
+    return StringsEntry(line_num, key, value, adaptation, problem, quoted)
+
+
+def parse_strings_file(path):
+    """
+    Stream the .strings file at path into a StringsFile, reading it exactly once.
+    """
+    entries = []
+    line_count = 0
+    with open(path, "r") as strings_file:
+        for line_count, line in enumerate(strings_file, 1):
+            entry = tokenize_line(line_count, line)
+            if entry is not None:
+                entries.append(entry)
+    return StringsFile(path, entries, line_count)
+
+
+def parse_strings_data(path, data):
+    """
+    As parse_strings_file, for the contents of the file at path that the caller has already read.
+    """
+    lines = data.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    entries = []
+    for line_num, line in enumerate(lines, 1):
+        entry = tokenize_line(line_num, line)
+        if entry is not None:
+            entries.append(entry)
+    return StringsFile(path, entries, len(lines))
+
+
+def strings_directory_path(strings_directory):
+    """
+    Resolve strings_directory (e.g., 'assets/strings') relative to the repository root.
+    """
+    return os.path.join(ROOT_PATH, strings_directory)
+
+
+def strings_file_path(strings_directory, language_or_locale):
+    return os.path.join(strings_directory_path(strings_directory), language_or_locale + STRINGS_EXTENSION)
+
+
+def list_strings_files(strings_directory):
+    """
+    Return the sorted, non-hidden file names in strings_directory.
+    """
+    strings_path = strings_directory_path(strings_directory)
+    return sorted(filename for filename in os.listdir(strings_path) if not filename.startswith("."))
+
+
+def expected_keys_files(expected_keys_path=EXPECTED_KEYS_PATH):
+    """
+    Return the sorted paths of the non-hidden files in the expected_keys directory.
+    """
+    return [os.path.join(expected_keys_path, filename)
+            for filename in sorted(os.listdir(expected_keys_path))
+            if not filename.startswith(".")]
+
+
+def load_expected_keys(expected_keys_path=EXPECTED_KEYS_PATH):
+    """
+    Load every expected_keys/*.txt file into a single frozenset of normalized keys.
+
+    There can be multiple .txt files in the expected_keys directory;
+    e.g., one per platform, and/or one for UI strings and one for server-error strings.
+    """
+    all_expected_keys = set()
+    for path in expected_keys_files(expected_keys_path):
+        with open(path, "r") as keys:
+            for key in keys:
+                key = normalized_key(key.strip())
+                if len(key) > 0 and not key.startswith("//"):
+                    all_expected_keys.add(key)
+    return frozenset(all_expected_keys)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Tests for benchmark_strings_scripts.py: a benchmark that raises, or whose process dies, fails the suite rather
+than hanging it.
+
+    python -m unittest discover -s scripts -p "test_*.py"
+"""
+
+import os
+import sys
+import unittest
+from StringIO import StringIO
+
+from benchmark_strings_scripts import BenchmarkError, main, run_benchmark
+
+
+def bench_ok(strings_path, expected_keys_path, jobs):
+    return 0.5, {"rule": 0.25}
+
+
+def bench_raises(strings_path, expected_keys_path, jobs):
+    raise ValueError("a regression that throws")
+
+
+def bench_dies(strings_path, expected_keys_path, jobs):
+    os._exit(3)
+
+
+class RunBenchmarkTest(unittest.TestCase):
+
+    def test_result(self):
+        seconds, rule_seconds, peak_rss_kb = run_benchmark(bench_ok, "strings", "expected_keys", 1)
+        self.assertEqual((seconds, rule_seconds), (0.5, {"rule": 0.25}))
+        self.assertGreater(peak_rss_kb, 0)
+
+    def test_exception_in_the_benchmark(self):
+        with self.assertRaises(BenchmarkError) as context:
+            run_benchmark(bench_raises, "strings", "expected_keys", 1)
+        self.assertIn("bench_raises failed", str(context.exception))
+        self.assertIn("ValueError: a regression that throws", str(context.exception))
+
+    def test_benchmark_process_dies(self):
+        with self.assertRaises(BenchmarkError) as context:
+            run_benchmark(bench_dies, "strings", "expected_keys", 1)
+        self.assertIn("bench_dies exited with status 3", str(context.exception))
+
+    def test_suite_runs(self):
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            self.assertEqual(main(["--sizes", "2x3", "--baseline", os.devnull]), 0)
+            self.assertIn("2x3 (locales x keys)", sys.stdout.getvalue())
+        finally:
+            sys.stdout = stdout
+
+
+if __name__ == "__main__":
+    unittest.main()
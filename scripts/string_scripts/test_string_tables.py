@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Tests for string_tables.py: the compiled table gives, for every language and locale in assets/strings, exactly the
+strings that parsing (and filtering) its .strings file gives.
+
+    python -m unittest discover -s scripts -p "test_*.py"
+"""
+
+import os
+import unittest
+
+from string_tables import (LANGUAGE_ALIASES, StringTables, base_language, build_tables, check_strings_directory,
+                           filtered_strings, read_strings_directory, table_problems)
+from strings_index import ROOT_PATH, STRINGS_EXTENSION
+
+
+STRINGS_PATH = os.path.join(ROOT_PATH, "assets", "strings")
+
+
+def _strings_files():
+    return sorted(filename for filename in os.listdir(STRINGS_PATH) if filename.endswith(STRINGS_EXTENSION))
+
+
+class AssetsTableTest(unittest.TestCase):
+    """
+    The table compiled from assets/strings, against each .strings file parsed on its own.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.parsed = {}
+        for filename in _strings_files():
+            with open(os.path.join(STRINGS_PATH, filename), "rb") as f:
+                cls.parsed[filename[:-len(STRINGS_EXTENSION)]] = filtered_strings(f.read())
+        cls.tables = StringTables(build_tables(read_strings_directory(STRINGS_PATH)))
+
+    def test_every_locale_is_in_the_table(self):
+        self.assertEqual(len(self.parsed), 28)
+        self.assertEqual(sorted(self.tables.languages()), sorted(self.parsed))
+
+    def test_every_key_resolves_to_its_parsed_value(self):
+        for language, strings in sorted(self.parsed.items()):
+            index = self.tables.resolve(language)
+            self.assertEqual(self.tables.language_name(index), language)
+            for key, value in strings.items():
+                self.assertEqual(self.tables.get(index, key), value, "[{0}] {1}".format(language, key))
+            self.assertEqual(self.tables.resolved_strings(index), strings, language)
+
+    def test_keys_a_language_lacks_are_missing(self):
+        all_keys = set(key for strings in self.parsed.values() for key in strings)
+        for language, strings in sorted(self.parsed.items()):
+            index = self.tables.resolve(language)
+            for key in all_keys - set(strings):
+                self.assertIsNone(self.tables.get(index, key), "[{0}] {1}".format(language, key))
+
+    def test_regional_locales_are_overlays(self):
+        regional = [language for language in self.parsed if base_language(language, self.parsed)]
+        self.assertEqual(sorted(regional), ["en_AU", "en_GB", "es_MX", "pt_BR", "zh-Hant_TW"])
+        for language in regional:
+            index = self.tables.resolve(language)
+            base = base_language(language, self.parsed)
+            self.assertEqual(self.tables.language_name(self.tables.base(index)), base)
+            strings, base_strings = self.parsed[language], self.parsed[base]
+            differing = set(key for key in strings if base_strings.get(key) != strings[key])
+            differing |= set(base_strings) - set(strings)
+            self.assertEqual(set(key for key, unused in self.tables.own_items(index)), differing, language)
+
+    def test_locales_and_aliases_resolve(self):
+        cases = [("fr_CA", "fr"), ("pt_PT", "pt"), ("xx", "en"), ("zh_CN", "zh-Hans"), ("zh_cn", "zh-Hans"),
+                 ("zh_TW", "zh-Hant_TW"), ("zh_HK", "zh-Hant"), ("en_UK", "en_GB"), ("no", "nb")]
+        for alias, language in LANGUAGE_ALIASES.items():
+            self.assertIn(language, self.parsed, alias)
+        for name, language in cases:
+            self.assertEqual(self.tables.language_name(self.tables.resolve(name)), language, name)
+
+    def test_check_strings_directory(self):
+        self.assertEqual(check_strings_directory(STRINGS_PATH), (len(self.parsed), []))
+
+
+class OverlayTest(unittest.TestCase):
+    """
+    Small tables, for the cases assets/strings may not have.
+    """
+
+    STRINGS = {
+        "en": {u"ok": u"OK", u"cancel": u"Cancel", u"done": u"Done"},
+        "en_AU": {u"ok": u"OK", u"cancel": u"Cancel, mate"},  # lacks "done"
+        "fr": {u"ok": u"D’accord", u"cancel": u"Annuler", u"done": u"OK"},
+    }
+
+    def setUp(self):
+        self.tables = StringTables(build_tables(self.STRINGS))
+
+    def test_no_problems(self):
+        self.assertEqual(table_problems(self.STRINGS, build_tables(self.STRINGS)), [])
+
+    def test_overlay_holds_only_differences(self):
+        index = self.tables.resolve("en_AU")
+        self.assertEqual(sorted(self.tables.own_items(index)), [(u"cancel", u"Cancel, mate"), (u"done", None)])
+        self.assertEqual(self.tables.get(index, u"ok"), u"OK")  # from en
+        self.assertIsNone(self.tables.get(index, u"done"))  # en has it, en_AU does not
+
+    def test_mismatched_table_is_reported(self):
+        changed = dict(self.STRINGS)
+        changed["fr"] = dict(self.STRINGS["fr"], ok=u"Oui")
+        self.assertEqual(table_problems(changed, build_tables(self.STRINGS)),
+                         ["[fr] table contents differ from the filtered .strings values",
+                          "[fr] lookup of 'ok' returns u'D\\u2019accord' rather than u'Oui'"])
+
+
+if __name__ == "__main__":
+    unittest.main()
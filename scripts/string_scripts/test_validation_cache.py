@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Tests for validation_cache.py: verdicts survive a save and load, and one that cannot be saved does not keep the
+others from being saved.
+
+    python -m unittest discover -s scripts -p "test_*.py"
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from validation_cache import ValidationCache
+
+
+class ValidationCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="test_validation_cache_")
+        self.path = os.path.join(self.temp_dir, "cache", "strings_validation_cache.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, True)
+
+    def test_round_trip(self):
+        cache = ValidationCache.load(self.path)
+        self.assertIsNone(cache.lookup("clean"))
+        cache.store("clean", 0, [])
+        cache.store("problems", 1, ["[fr] ‘ok’ has a problem", "[fr] another"])
+        cache.save()
+
+        cache = ValidationCache.load(self.path)
+        self.assertEqual(cache.lookup("clean"), (0, []))
+        self.assertEqual(cache.lookup("problems"), (1, ["[fr] ‘ok’ has a problem", "[fr] another"]))
+        self.assertEqual(cache.stats(), "Validation cache: 2 hits, 0 misses")
+
+    def test_problem_that_is_not_utf8(self):
+        cache = ValidationCache.load(self.path)
+        cache.store("latin-1", 1, ["[de] value contains \xfc"])
+        cache.store("clean", 0, [])
+        cache.save()
+
+        cache = ValidationCache.load(self.path)
+        self.assertIsNone(cache.lookup("latin-1"))
+        self.assertEqual(cache.lookup("clean"), (0, []))
+
+    def test_prune_keeps_the_most_recently_used(self):
+        cache = ValidationCache.load(self.path)
+        for index in range(5):
+            cache.store(str(index), 0, [])
+            cache.entries[str(index)]["used"] = index
+        cache.prune(max_entries=2)
+        self.assertEqual(sorted(cache.entries), ["3", "4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
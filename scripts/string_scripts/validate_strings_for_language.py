@@ -4,22 +4,30 @@
 Confirm that each string in the specified .strings file obeys our rules.
 """
 
-import inspect
-import os
+import collections
 import re
 import sys
 
 import argparse
 
-STRING_SCRIPTS_DIRECTORY = "string_scripts"
-EXPECTED_KEYS_DIRECTORY = "expected_keys"
+from strings_index import BAD_FORMAT, ESCAPED_QUOTE, EXTRA_QUOTE, parse_strings_file, strings_file_path
 
 
-def next_percent_location(string, starting_location):
-    next_percent_location = string.find("%", starting_location)
-    while next_percent_location > 0 and next_percent_location < len(string) - 1 and string[next_percent_location - 1] == "\\":
-        next_percent_location = string.find("%", next_percent_location + 1)
-    return next_percent_location
+SPECIAL_CHARACTER_RE = re.compile("[<>%]")
+SUSPICIOUS_PLACEHOLDER_RE = re.compile("%[0-9][^$]")
+SUSPICIOUS_POSITIONAL_PLACEHOLDER_RE = re.compile("%[0-9]*\$[0-9]*[^0-9ds@]")
+
+
+class ValueTokens(collections.namedtuple("ValueTokens", "value outside inside specifiers")):
+    """
+    A value, tokenized once for all of the content rules.
+
+    outside:     the text outside of HTML tags, i.e., the value with every <...> tag removed
+    inside:      the text inside HTML tags, i.e., everything following an unclosed '<' up to the next '>';
+                 separate tags are joined with '>' so that no needle can match across two tags
+    specifiers:  (location, is_positional) for each unescaped '%'
+    """
+    __slots__ = ()
 
 
 def is_positional_specifier(string, location):
@@ -33,97 +41,149 @@ def is_positional_specifier(string, location):
     return is_positional_specifier
 
 
-def validate_strings_for_language(strings_directory, language_or_locale):
-    root_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))), STRING_SCRIPTS_DIRECTORY)
-    expected_keys_path = os.path.join(root_path, EXPECTED_KEYS_DIRECTORY)
-    strings_path = os.path.join(os.path.abspath(root_path + "../../.."), strings_directory)
-    strings_file_name = language_or_locale + ".strings"
-    
-    errors = []
-    with open(os.path.join(strings_path, strings_file_name), "r") as file:
-        for line_num, line in enumerate(file.readlines()):
-            line = line.strip()
-            if len(line) > 0 and not line.startswith('//') and not line.startswith('/*') and '"' in line:
-                line = line.split(" // ")[0]
-                splits = line.split('"')
-                key_string = splits[1]
-
-                if '\\"' in line:
-                    errors.append("Line {0} contains '\\\"' rather than a curly double-quote.".format(line_num + 1))
-                elif len(splits) < 5 or len(splits[0]) > 0 or splits[4] != ";":
-                    errors.append("Line {0} does not appear to be in <\"keystring\" = \"value\";> format.".format(line_num + 1))
-                elif len(splits) > 5:
-                    errors.append("'{0}' contains a non-curly double-quote.".format(key_string))
+def tokenize_value(value):
+    """
+    Split value into its outside-tag text, inside-tag text and substitution specifiers in a single linear pass.
+    """
+    length = len(value)
+    outside = []
+    inside = []
+    specifiers = []
+
+    text_start = 0         # start of the current run of outside-tag text
+    tag_end = -1           # position of the '>' closing the <...> tag that starts at the current '<', if any
+    no_more_closers = False
+    open_start = -1        # position just after the '<' that opened the current inside-tag span, or -1
+
+    for match in SPECIAL_CHARACTER_RE.finditer(value):
+        location = match.start()
+        character = value[location]
+        if character == "<":
+            if open_start < 0:
+                open_start = location + 1
+            # a tag is '<', at least one character other than '>', then '>'
+            if location > tag_end and not no_more_closers and location + 1 < length and value[location + 1] != ">":
+                tag_end = value.find(">", location + 1)
+                if tag_end < 0:
+                    no_more_closers = True
                 else:
-                    value_string = splits[3]
-
-                    if value_found_outside_html_tags(value_string, "'"):
-                        errors.append("'{0}' contains a non-curly apostophe.".format(key_string))
-
-                    if value_found_outside_html_tags(value_string, '"'):
-                        errors.append("'{0}' contains a non-curly double-quote.".format(key_string))
-
-                    if value_found_outside_html_tags(value_string, "..."):
-                        errors.append("'{0}' contains three dots rather than an ellipsis.".format(key_string))
-
-                    if value_found_outside_html_tags(value_string, "  "):
-                        errors.append("'{0}' contains two spaces rather than a single space.".format(key_string))
-
-                    if value_string[0] == " ":
-                        errors.append("'{0}' contains a leading space.".format(key_string))
-
-                    if value_string[-1] == " ":
-                        errors.append("'{0}' contains a trailing space.".format(key_string))
-
-                    if value_found_inside_html_tags(value_string, "<"):
-                        errors.append("'{0}' contains an unmatched '<'. Did you mean '&lt;'?".format(key_string))
-
-                    if value_found_outside_html_tags(value_string, "<"):
-                        errors.append("'{0}' contains an unmatched '<'. Did you mean '&lt;'?".format(key_string))
+                    outside.append(value[text_start:location])
+                    text_start = tag_end + 1
+        elif character == ">":
+            if open_start >= 0:
+                inside.append(value[open_start:location])
+                open_start = -1
+        elif character == "%":
+            if not (location > 0 and location < length - 1 and value[location - 1] == "\\"):
+                specifiers.append((location, is_positional_specifier(value, location + 1)))
+
+    outside.append(value[text_start:])
+    if open_start >= 0:
+        inside.append(value[open_start:])
+
+    return ValueTokens(value, "".join(outside), ">".join(inside), specifiers)
+
+
+def _has_unpositioned_multiple_substitutions(tokens):
+    specifiers = tokens.specifiers
+    last_location = len(tokens.value) - 1
+    for (first_location, first_positional), (unused, second_positional) in zip(specifiers, specifiers[1:]):
+        if first_location >= last_location:
+            break
+        if not first_positional or not second_positional:
+            return True
+    return False
+
+
+# The content rules, in reporting order: (name, predicate over ValueTokens, message).
+# Messages are formatted with the key string and a continuation-line indent.
+CONTENT_RULES = (
+    ("non_curly_apostrophe", lambda tokens: "'" in tokens.outside,
+     "'{0}' contains a non-curly apostophe."),
+    ("non_curly_double_quote", lambda tokens: '"' in tokens.outside,
+     "'{0}' contains a non-curly double-quote."),
+    ("three_dots", lambda tokens: "..." in tokens.outside,
+     "'{0}' contains three dots rather than an ellipsis."),
+    ("two_spaces", lambda tokens: "  " in tokens.outside,
+     "'{0}' contains two spaces rather than a single space."),
+    ("leading_space", lambda tokens: tokens.value.startswith(" "),
+     "'{0}' contains a leading space."),
+    ("trailing_space", lambda tokens: tokens.value.endswith(" "),
+     "'{0}' contains a trailing space."),
+    ("unmatched_lt_inside_tag", lambda tokens: "<" in tokens.inside,
+     "'{0}' contains an unmatched '<'. Did you mean '&lt;'?"),
+    ("unmatched_lt", lambda tokens: "<" in tokens.outside,
+     "'{0}' contains an unmatched '<'. Did you mean '&lt;'?"),
+    ("unmatched_gt", lambda tokens: ">" in tokens.outside,
+     "'{0}' contains an unmatched '>'. Did you mean '&gt;'?"),
+    ("curly_apostrophe_inside_tag", lambda tokens: "‘" in tokens.inside or "’" in tokens.inside,
+     "'{0}' contains a curly apostophe within an HTML tag."),
+    ("curly_quote_inside_tag", lambda tokens: "“" in tokens.inside or "”" in tokens.inside,
+     "'{0}' contains a curly quote within an HTML tag."),
+    ("unpositioned_substitutions", _has_unpositioned_multiple_substitutions,
+     "'{0}' contains contains multiple substitutions,\n{1}not all with positional specifiers."),
+    ("suspicious_placeholder", lambda tokens: SUSPICIOUS_PLACEHOLDER_RE.search(tokens.value) is not None,
+     "'{0}' contains a suspicious substitution placeholder."),
+    ("suspicious_positional_placeholder", lambda tokens: SUSPICIOUS_POSITIONAL_PLACEHOLDER_RE.search(tokens.value) is not None,
+     "'{0}' contains a suspicious substitution placeholder."),
+)
+
+
+def validate_strings_for_language(strings_directory, language_or_locale, strings_file=None):
+    """
+    strings_file (a parsed StringsFile) may be passed in by callers that have already read the file.
+    """
+    if strings_file is None:
+        strings_file = parse_strings_file(strings_file_path(strings_directory, language_or_locale))
+
+    problems = content_problems(strings_file)
+    for problem in problems:
+        print problem
+
+    if len(problems) > 0:
+        return 1
 
-                    if value_found_outside_html_tags(value_string, ">"):
-                        errors.append("'{0}' contains an unmatched '>'. Did you mean '&gt;'?".format(key_string))
+    # print "[{0}] obeys content rules".format(strings_file.file_name)
+    return 0
 
-                    if value_found_inside_html_tags(value_string, "‘") or value_found_inside_html_tags(value_string, "’"):
-                        errors.append("'{0}' contains a curly apostophe within an HTML tag.".format(key_string))
 
-                    if value_found_inside_html_tags(value_string, "“") or value_found_inside_html_tags(value_string, "”"):
-                        errors.append("'{0}' contains a curly quote within an HTML tag.".format(key_string))
+def value_errors(key_string, value_string, rules=CONTENT_RULES):
+    """
+    Return the content-rule errors for a single well-formed value.
+    """
+    tokens = tokenize_value(value_string)
+    indent = " " * (len(key_string) + 5)
+    return [message.format(key_string, indent) for unused, check, message in rules if check(tokens)]
 
-                    first_percent_location = next_percent_location(value_string, 0)
-                    while first_percent_location >= 0 and first_percent_location < len(value_string) - 1:
-                        second_percent_location = next_percent_location(value_string, first_percent_location + 1)
-                        if second_percent_location < 0:
-                            break
-                        if (not is_positional_specifier(value_string, first_percent_location + 1)) or \
-                           (not is_positional_specifier(value_string, second_percent_location + 1)):
-                            errors.append("'{0}' contains contains multiple substitutions,\n{1}not all with positional specifiers.".format(key_string, " " * (len(key_string) + 5)))
-                            break
-                        first_percent_location = second_percent_location
 
-                    if re.search("%[0-9][^$]", value_string) is not None:
-                        errors.append("'{0}' contains a suspicious substitution placeholder.".format(key_string))
+def content_problems(strings_file):
+    """
+    Return the lines of the content-rules report for strings_file, or an empty list if it obeys every rule.
+    """
+    errors = []
+    for entry in strings_file:
+        key_string = entry.key
 
-                    if re.search("%[0-9]*\$[0-9]*[^0-9ds@]", value_string) is not None:
-                        errors.append("'{0}' contains a suspicious substitution placeholder.".format(key_string))
+        if entry.problem == ESCAPED_QUOTE:
+            errors.append("Line {0} contains '\\\"' rather than a curly double-quote.".format(entry.line_num))
+        elif entry.problem == BAD_FORMAT:
+            errors.append("Line {0} does not appear to be in <\"keystring\" = \"value\";> format.".format(entry.line_num))
+        elif entry.problem == EXTRA_QUOTE:
+            errors.append("'{0}' contains a non-curly double-quote.".format(key_string))
+        else:
+            errors.extend(value_errors(key_string, entry.value))
 
-    if len(errors) > 0:
-        print "[{0}] does not obey content rules:".format(strings_file_name)
-        for error in errors:
-            print "    {0}".format(error)
-        return 1
-    else:
-        # print "[{0}] obeys content rules".format(strings_file_name)
-        return 0
+    if len(errors) == 0:
+        return []
+    return ["[{0}] does not obey content rules:".format(strings_file.file_name)] + ["    {0}".format(error) for error in errors]
 
 
 def value_found_outside_html_tags(s, value):
-    s = re.sub("<[^>]+>", "", s)
-    return value in s
+    return value in tokenize_value(s).outside
 
 
 def value_found_inside_html_tags(s, value):
-    return re.search("<[^>]*" + value, s) is not None
+    return value in tokenize_value(s).inside
 
 
 def main(argv=None):
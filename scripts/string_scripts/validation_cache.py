@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Persistent cache of .strings validation verdicts, so that `fab build` only re-checks the locales that changed.
+
+Each verdict is keyed by:
+  - the .strings file's name and content hash,
+  - the hash of the expected_keys manifest, and
+  - the rules fingerprint: RULES_VERSION plus a hash of the checker sources.
+Changing a .strings file, an expected_keys file, or any of the checkers therefore misses the cache.
+
+The cache lives in $CARDIO_CACHE_DIR (default ~/.cache/card.io) and keeps at most MAX_ENTRIES verdicts,
+discarding the least recently used ones first.
+"""
+
+import hashlib
+import os
+import sys
+import time
+
+from strings_index import EXPECTED_KEYS_PATH, STRING_SCRIPTS_PATH, expected_keys_files
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))  # for build_scripts
+from build_scripts.file_utils import cache_directory, read_json_cache, write_json_cache
+
+
+# Bump this when the meaning of a cached verdict changes in a way the source hash below would not catch.
+RULES_VERSION = 1
+
+RULES_SOURCE_FILES = ("strings_index.py", "confirm_keys_for_language.py", "validate_strings_for_language.py")
+
+CACHE_FILE_NAME = "strings_validation_cache.json"
+MAX_ENTRIES = 1024
+
+
+def _hash_files(paths, initial=""):
+    sha1 = hashlib.sha1(initial)
+    for path in paths:
+        sha1.update(os.path.basename(path))
+        sha1.update("\0")
+        with open(path, "rb") as f:
+            sha1.update(hashlib.sha1(f.read()).hexdigest())
+    return sha1.hexdigest()
+
+
+def rules_fingerprint():
+    return _hash_files([os.path.join(STRING_SCRIPTS_PATH, filename) for filename in RULES_SOURCE_FILES],
+                       "rules-v{0}".format(RULES_VERSION))
+
+
+def expected_keys_fingerprint(expected_keys_path=EXPECTED_KEYS_PATH):
+    return _hash_files(expected_keys_files(expected_keys_path))
+
+
+class ValidationCache(object):
+    """
+    Maps the content of a .strings file (plus the rules and expected keys) to its (status, problems) verdict.
+    Use load() to create one, lookup()/store() while checking, and save() once at the end.
+    """
+
+    def __init__(self, path, entries, expected_keys_path=EXPECTED_KEYS_PATH):
+        self.path = path
+        self.entries = entries
+        self.context = "{0}:{1}".format(rules_fingerprint(), expected_keys_fingerprint(expected_keys_path))
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path=None, expected_keys_path=EXPECTED_KEYS_PATH):
+        path = path or os.path.join(cache_directory(), CACHE_FILE_NAME)
+        return cls(path, read_json_cache(path), expected_keys_path)
+
+    def key_for_file(self, path):
+        with open(path, "rb") as f:
+            content_hash = hashlib.sha1(f.read()).hexdigest()
+        return hashlib.sha1("{0}:{1}:{2}".format(self.context, os.path.basename(path), content_hash)).hexdigest()
+
+    def lookup(self, key):
+        """
+        Return (status, problems) for key, or None on a miss.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry["used"] = time.time()
+        self.dirty = True
+        problems = [problem if isinstance(problem, str) else problem.encode("utf-8") for problem in entry["problems"]]
+        return entry["status"], problems
+
+    def store(self, key, status, problems):
+        """
+        Remember the verdict for key, unless a problem is not UTF-8 (it could not be saved as JSON, and with it
+        the rest of the cache): that file will just be checked again next time.
+        """
+        try:
+            for problem in problems:
+                if isinstance(problem, str):
+                    problem.decode("utf-8")
+        except UnicodeDecodeError:
+            return
+        self.entries[key] = {"status": status, "problems": problems, "used": time.time()}
+        self.dirty = True
+
+    def prune(self, max_entries=MAX_ENTRIES):
+        if len(self.entries) > max_entries:
+            by_age = sorted(self.entries, key=lambda key: self.entries[key].get("used", 0), reverse=True)
+            for key in by_age[max_entries:]:
+                del self.entries[key]
+            self.dirty = True
+
+    def save(self):
+        self.prune()
+        if not self.dirty:
+            return
+        write_json_cache(self.path, self.entries)  # the cache is only an optimization: failures are ignored
+        self.dirty = False
+
+    def stats(self):
+        return "Validation cache: {0} hits, {1} misses".format(self.hits, self.misses)
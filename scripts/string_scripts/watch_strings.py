@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+"""
+Watch the *.strings files and expected_keys/*.txt, and revalidate them incrementally as they change.
+
+Every .strings file is parsed and checked once at startup (as confirm_ready_for_release.py would), and the
+parsed state is kept in memory. After that:
+  - when a .strings file changes, only that file is reparsed and rechecked (its keys and the content rules),
+    and only its row of the cross-locale matrix is replaced before the consistency checks are rerun;
+  - when an expected_keys file changes, the expected keys are reloaded and diffed against the key set kept
+    for each language; no .strings file is reparsed.
+
+Changes are noticed through inotify where it is available (Linux), and otherwise by polling the files'
+stat() every POLL_INTERVAL seconds. A burst of changes (an editor's save, a `git checkout`) is coalesced:
+nothing is reported until no change has arrived for DEBOUNCE_INTERVAL seconds. Each report shows the
+problems (or OK) of the files that changed, the cross-locale problems if they changed, and a summary line.
+
+Example:
+    ./watch_strings.py assets/strings
+    ./watch_strings.py assets/strings --poll
+"""
+
+import argparse
+import collections
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from check_locale_consistency import LocaleMatrix, consistency_problems, locale_row
+from confirm_keys_for_language import key_set_problems, strings_file_keys
+from strings_index import (EXPECTED_KEYS_PATH, STRINGS_EXTENSION, list_strings_files, load_expected_keys,
+                           parse_strings_data, strings_directory_path)
+from validate_strings_for_language import content_problems
+
+
+DEBOUNCE_INTERVAL = 0.1   # seconds without a change before reporting
+MAX_COALESCE_DELAY = 1.0  # report after this many seconds even if changes keep arriving
+POLL_INTERVAL = 0.25      # seconds between stat() passes, when inotify is not available
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; followed by len bytes of NUL-padded name
+
+
+class LocaleState(collections.namedtuple("LocaleState", "data keys duplicate_keys content_problems")):
+    """
+    What is kept in memory for one .strings file.
+
+    data:             the file's bytes, so that a save without changes is not rechecked
+    keys:             the normalized, unadapted keys, and
+    duplicate_keys:   the duplicates, as from confirm_keys_for_language.strings_file_keys
+    content_problems: from validate_strings_for_language.content_problems, which do not depend on expected_keys
+    """
+    __slots__ = ()
+
+
+class WatchReport(collections.namedtuple("WatchReport", "files consistency added_keys removed_keys")):
+    """
+    The outcome of StringsWatch.update.
+
+    files:        [(file name, problems)] for each .strings file that was rechecked, or whose key problems
+                  changed; problems is None if the file was removed
+    consistency:  the cross-locale problems, or None if they did not change
+    added_keys, removed_keys: the changes to the expected keys
+    """
+    __slots__ = ()
+
+
+class StringsWatch(object):
+    """
+    The parsed and checked state of a strings directory, updated a file at a time.
+    """
+
+    def __init__(self, strings_directory, expected_keys_path=EXPECTED_KEYS_PATH):
+        self.strings_path = os.path.abspath(strings_directory_path(strings_directory))
+        self.expected_keys_path = os.path.abspath(expected_keys_path)
+        self.expected_keys = load_expected_keys(self.expected_keys_path)
+        self.locales = {}   # {file name: LocaleState}
+        self.problems = {}  # {file name: problems}
+        self.matrix = LocaleMatrix({}, {})
+        for filename in list_strings_files(strings_directory):
+            if filename.endswith(STRINGS_EXTENSION):
+                self._update_strings_file(filename)
+        self.consistency = consistency_problems(self.matrix)
+
+    def all_problems(self):
+        return [problem for filename in sorted(self.problems) for problem in self.problems[filename]] + self.consistency
+
+    def _update_strings_file(self, filename):
+        """
+        Reread filename; return False if its contents did not change (or it is still missing).
+        """
+        try:
+            with open(os.path.join(self.strings_path, filename), "rb") as f:
+                data = f.read()
+        except IOError:
+            data = None
+
+        previous = self.locales.get(filename)
+        if data == (previous.data if previous else None):
+            return False
+
+        language = filename[:-len(STRINGS_EXTENSION)]
+        if data is None:
+            del self.locales[filename], self.problems[filename]
+            del self.matrix.values[language], self.matrix.strings[language]
+            return True
+
+        strings_file = parse_strings_data(os.path.join(self.strings_path, filename), data)
+        keys, duplicate_keys = strings_file_keys(strings_file)
+        locale = LocaleState(data, keys, duplicate_keys, content_problems(strings_file))
+        self.locales[filename] = locale
+        self.problems[filename] = self._problems(filename, locale)
+        self.matrix.values[language], self.matrix.strings[language] = locale_row(data)
+        return True
+
+    def _problems(self, filename, locale):
+        return key_set_problems(filename, locale.keys, locale.duplicate_keys, self.expected_keys) + locale.content_problems
+
+    def update(self, paths):
+        """
+        Revalidate what depends on the changed paths; return a WatchReport.
+        """
+        changed_files = set()
+        reload_keys = False
+        for path in paths:
+            directory, filename = os.path.split(os.path.abspath(path))
+            if filename.startswith("."):
+                continue
+            if directory == self.expected_keys_path:
+                reload_keys = True
+            elif directory == self.strings_path and filename.endswith(STRINGS_EXTENSION):
+                if self._update_strings_file(filename):
+                    changed_files.add(filename)
+        reparsed = bool(changed_files)
+
+        added_keys = removed_keys = frozenset()
+        if reload_keys:
+            expected_keys = load_expected_keys(self.expected_keys_path)
+            added_keys = expected_keys - self.expected_keys
+            removed_keys = self.expected_keys - expected_keys
+            self.expected_keys = expected_keys
+            if added_keys or removed_keys:
+                for filename, locale in self.locales.items():
+                    problems = self._problems(filename, locale)
+                    if problems != self.problems[filename]:
+                        self.problems[filename] = problems
+                        changed_files.add(filename)
+
+        # The cross-locale checks depend only on the .strings files (not on expected_keys)
+        consistency = None
+        if reparsed:
+            problems = consistency_problems(self.matrix)
+            if problems != self.consistency:
+                self.consistency = consistency = problems
+
+        files = [(filename, self.problems.get(filename)) for filename in sorted(changed_files)]
+        return WatchReport(files, consistency, added_keys, removed_keys)
+
+
+class InotifyWatcher(object):
+    """
+    Changes to the files directly inside the given directories, from inotify(7) (Linux only).
+    """
+    name = "inotify"
+
+    def __init__(self, directories):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = libc.inotify_init()
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        self._directories = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(self._fd, directory, INOTIFY_MASK)
+            if wd < 0:
+                os.close(self._fd)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed", directory)
+            self._directories[wd] = directory
+
+    def changes(self, timeout=None):
+        """
+        Wait up to timeout seconds (forever if None) for changes; return the set of changed paths.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        events = os.read(self._fd, 65536)
+        paths = set()
+        offset = 0
+        while offset < len(events):
+            wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(events, offset)
+            offset += INOTIFY_EVENT.size
+            name = events[offset:offset + length].rstrip("\0")
+            offset += length
+            if name and wd in self._directories:
+                paths.add(os.path.join(self._directories[wd], name))
+        return paths
+
+
+class PollingWatcher(object):
+    """
+    Changes to the files directly inside the given directories, from comparing their stat() every interval seconds.
+    """
+    name = "polling"
+
+    def __init__(self, directories, interval=POLL_INTERVAL):
+        self._directories = directories
+        self._interval = interval
+        self._snapshot = self._stat_all()
+
+    def _stat_all(self):
+        snapshot = {}
+        for directory in self._directories:
+            for filename in os.listdir(directory):
+                path = os.path.join(directory, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_mtime, st.st_size, st.st_ino)
+        return snapshot
+
+    def changes(self, timeout=None):
+        """
+        Wait up to timeout seconds (forever if None) for changes; return the set of changed paths.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            snapshot = self._stat_all()
+            paths = set(path for path in set(snapshot) | set(self._snapshot) if snapshot.get(path) != self._snapshot.get(path))
+            self._snapshot = snapshot
+            if paths:
+                return paths
+            if deadline is None:
+                time.sleep(self._interval)
+            else:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return set()
+                time.sleep(min(self._interval, remaining))
+
+
+def file_watcher(directories, polling=False):
+    """
+    Return an InotifyWatcher for directories if inotify is available (and polling is not asked for), else a PollingWatcher.
+    """
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directories)
+
+
+def coalesced_changes(watcher, debounce=DEBOUNCE_INTERVAL, max_delay=MAX_COALESCE_DELAY):
+    """
+    Wait for a change, then keep collecting changes until none arrives for debounce seconds (or max_delay passes).
+    """
+    paths = watcher.changes()
+    started = time.time()
+    while time.time() - started < max_delay:
+        more = watcher.changes(debounce)
+        if not more:
+            break
+        paths |= more
+    return paths
+
+
+def print_report(report, watch, elapsed):
+    if report.added_keys or report.removed_keys:
+        print "[expected_keys] {0} keys (+{1} -{2})".format(len(watch.expected_keys), len(report.added_keys), len(report.removed_keys))
+    for filename, problems in report.files:
+        if problems is None:
+            print "[{0}] removed".format(filename)
+        elif not problems:
+            print "[{0}] OK".format(filename)
+        for problem in problems or ():
+            print problem
+    if report.consistency is not None:
+        for problem in report.consistency:
+            print problem
+        if not report.consistency:
+            print "All {0} *.strings files are consistent with each other.".format(len(watch.locales))
+    print_summary(watch, "checked {0} file(s) in {1:.1f} ms".format(len(report.files), elapsed * 1000))
+
+
+def print_summary(watch, activity):
+    problem_count = len(watch.all_problems())
+    print "{0} {1}; {2}".format(time.strftime("%H:%M:%S"), activity,
+                                "{0} problem(s)".format(problem_count) if problem_count else "all *.strings files appear to be correct")
+    sys.stdout.flush()
+
+
+def watch_strings(strings_directory, expected_keys_path=EXPECTED_KEYS_PATH, polling=False, debounce=DEBOUNCE_INTERVAL):
+    # Start watching before the initial pass, so that nothing saved during it is missed
+    started = time.time()
+    watcher = file_watcher([os.path.abspath(strings_directory_path(strings_directory)), os.path.abspath(expected_keys_path)], polling)
+    watch = StringsWatch(strings_directory, expected_keys_path)
+    for problem in watch.all_problems():
+        print problem
+    print_summary(watch, "checked {0} file(s) in {1:.1f} ms".format(len(watch.locales), (time.time() - started) * 1000))
+    print "Watching {0} and {1} ({2}); Ctrl-C to stop.".format(strings_directory, expected_keys_path, watcher.name)
+    sys.stdout.flush()
+
+    try:
+        while True:
+            paths = coalesced_changes(watcher, debounce)
+            started = time.time()
+            report = watch.update(paths)
+            if report.files or report.added_keys or report.removed_keys:
+                print_report(report, watch, time.time() - started)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("strings_directory", help="path to strings folder (e.g., 'assets/strings')")
+    parser.add_argument("--expected-keys", default=EXPECTED_KEYS_PATH, help="path to the expected_keys folder")
+    parser.add_argument("--poll", action="store_true", help="poll for changes even where inotify is available")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE_INTERVAL,
+                        help="seconds without a change before reporting (default {0})".format(DEBOUNCE_INTERVAL))
+    args = parser.parse_args(argv)
+
+    return watch_strings(args.strings_directory, args.expected_keys, args.poll, args.debounce)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))